@@ -1,19 +1,32 @@
 from aiogram import Bot, Dispatcher, Router, F
 from aiogram.types import (
-    Message, BufferedInputFile, InlineKeyboardMarkup, InlineKeyboardButton,
+    Message, InlineKeyboardMarkup, InlineKeyboardButton,
     CallbackQuery, ReplyKeyboardRemove
 )
-from aiogram.filters import CommandStart, Command
+from aiogram.filters import CommandStart, Command, CommandObject
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
-from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiogram.webhook.aiohttp_server import setup_application
 from aiohttp import web
 from decouple import config
-import csv
+from storage import CLOSED_STATUSES, STATUSES, open_store
+from archive import ARCHIVE_INTERVAL_HOURS, Archive
+from writer import GroupCommitWriter, run_read
+from notify import NOTIFY_RATE, NotificationDispatcher
+from fsm_storage import SQLiteStorage
+from export import ExportFilter, ExportInputFile, export_file
+from throttle import DuplicateDetector, ThrottleMiddleware
+from webhook import QueuedRequestHandler, make_handler
+from events import EVENTS_KEEPALIVE, EventBus
+from stats import TIME_BUCKETS
+from aiogram.fsm.storage.memory import MemoryStorage
+import metrics
 import os
 import logging
 import asyncio
+import html
+import json
 import re
 from datetime import datetime
 
@@ -24,21 +37,118 @@ logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 BOT_TOKEN = config("BOT_TOKEN")
 ADMIN_ID = config("ADMIN_ID", default=None, cast=int)
+ADMIN_PAGE_SIZE = config("ADMIN_PAGE_SIZE", default=20, cast=int)
+WEB_PAGE_SIZE = config("WEB_PAGE_SIZE", default=50, cast=int)
+WEB_PAGE_MAX = 500
+WEB_ROW_CHUNK = 50  # строк таблицы в одном чанке ответа
+FIND_LIMIT = 20
+BULK_CHUNK = 500  # строк за одно чтение при выборе заявок по диапазону id
+STATS_DAYS = 14
+STATS_DAYS_MAX = 366
+FSM_STORAGE = config("FSM_STORAGE", default="sqlite")  # sqlite | memory
+# Процессов на одном /data (общий порт через SO_REUSEPORT). При WORKERS > 1
+# кэш FSM отключается: следующий апдейт диалога может прийти в другой процесс.
+WORKERS = config("WORKERS", default=1, cast=int)
 bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher()
+if FSM_STORAGE == "sqlite":
+    dp = Dispatcher(storage=SQLiteStorage(**({"cache_size": 0} if WORKERS > 1 else {})))
+else:
+    dp = Dispatcher()
 router = Router()
+notifier = NotificationDispatcher(bot, ADMIN_ID, rate=NOTIFY_RATE / WORKERS)
+throttle = ThrottleMiddleware(exempt={ADMIN_ID} if ADMIN_ID else set())
+duplicates = DuplicateDetector()
+# Изменения заявок для открытых страниц веб-панели (/events, см. events.py).
+# Шина внутрипроцессная: при WORKERS > 1 страница видит изменения своего процесса.
+changes = EventBus()
 
 # ----------------------------------------------------------------------
-# CSV-файл с заявками
+# Хранилище заявок (CSV или SQLite, см. storage.py)
 # ----------------------------------------------------------------------
-DATA_DIR = "/data"
-os.makedirs(DATA_DIR, exist_ok=True)
-CSV_FILE = os.path.join(DATA_DIR, "repair_requests.csv")
-if not os.path.exists(CSV_FILE):
-    with open(CSV_FILE, 'w', encoding='utf-8', newline='') as f:
-        csv.writer(f).writerow(
-            ["ID", "Имя", "Телефон", "Устройство", "Проблема", "Время", "Дата создания"]
-        )
+# CSV читается в пуле потоков после запуска сервера, а не при импорте:
+# webhook отвечает сразу, обработчики ждут окончания загрузки. Перед каждым
+# апдейтом и запросом подхватываются записи других процессов (store.refresh_async).
+store = open_store(lazy=True)
+writer = GroupCommitWriter(store)
+store_loading: asyncio.Task | None = None
+NO_STORE_ROUTES = {"/", "/webhook", "/metrics"}
+
+def start_store_loading() -> asyncio.Task:
+    global store_loading
+    if store_loading is None:
+        store_loading = asyncio.get_running_loop().create_task(run_read(store.ensure_loaded))
+    return store_loading
+
+async def store_ready_middleware(handler, event, data):
+    await asyncio.shield(start_store_loading())
+    await store.refresh_async()
+    return await handler(event, data)
+
+@web.middleware
+async def store_ready_web_middleware(request, handler):
+    if request.path not in NO_STORE_ROUTES:
+        await asyncio.shield(start_store_loading())
+        await store.refresh_async()
+    return await handler(request)
+
+async def load_store_on_startup(app: web.Application):
+    start_store_loading()
+
+# ----------------------------------------------------------------------
+# Архив закрытых заявок (см. archive.py)
+# ----------------------------------------------------------------------
+# Переносом занимается только основной процесс; остальные видят новые
+# сегменты по каталогу, а удаление из рабочего хранилища — через refresh.
+archive = Archive()
+archiver_task: asyncio.Task | None = None
+is_primary = True
+
+async def delete_many(ids: list[int]) -> int:
+    # Одна мутация на всю пачку: индексы и кэши меняются сразу, в журнал
+    # записи уходят одной групповой фиксацией, а не по записи на заявку
+    return await commit_deletes(store.stage_deletes(ids))
+
+async def commit_deletes(staged: dict[int, list]) -> int:
+    for rid in staged:
+        duplicates.forget(rid)
+        changes.publish("delete", rid)
+    if staged:
+        await writer.submit_many(list(staged.values()))
+    return len(staged)
+
+async def archive_closed() -> int:
+    # Надгробия готовятся раньше записи сегмента — в одном шаге цикла со
+    # сверкой статусов, так что в архив попадают только действительно
+    # удаляемые заявки. Не записался сегмент — удаление откатывается.
+    await asyncio.shield(start_store_loading())
+    await writer.flush()
+    ids = await run_read(store.ids_with_status, *CLOSED_STATUSES)
+    if not ids:
+        return 0
+    rows = [row for row in await run_read(store.rows_for, ids) if store.status(row[0]) == row[7]]
+    staged = store.stage_deletes([row[0] for row in rows])
+    try:
+        await run_read(archive.write, [row for row in rows if row[0] in staged])
+    except Exception:
+        store.unstage_deletes(staged)
+        raise
+    moved = await commit_deletes(staged)
+    await writer.flush()
+    logging.info(f"В архив перенесено заявок: {moved}")
+    return moved
+
+async def archive_loop() -> None:
+    while True:
+        await asyncio.sleep(ARCHIVE_INTERVAL_HOURS * 3600)
+        try:
+            await archive_closed()
+        except Exception as e:
+            logging.error(f"Ошибка переноса в архив: {e}")
+
+async def start_archiver(app: web.Application):
+    global archiver_task
+    if is_primary:
+        archiver_task = asyncio.create_task(archive_loop())
 
 # ----------------------------------------------------------------------
 # Клавиатуры
@@ -71,28 +181,8 @@ class RepairRequest(StatesGroup):
 # ----------------------------------------------------------------------
 # Глобальные переменные
 # ----------------------------------------------------------------------
-request_counter = 0
-requests_data: dict[int, list[str]] = {}
 LOGIN_URL = "https://t.me/placeholder_bot?start=login"  # будет переопределён
 
-# ----------------------------------------------------------------------
-# Загрузка заявок из CSV
-# ----------------------------------------------------------------------
-def load_requests() -> None:
-    global request_counter, requests_data
-    requests_data.clear()
-    if os.path.exists(CSV_FILE):
-        with open(CSV_FILE, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            next(reader, None)
-            for row in reader:
-                if len(row) >= 6 and row[0].isdigit():
-                    rid = int(row[0])
-                    requests_data[rid] = row[1:6]
-                    request_counter = max(request_counter, rid)
-    request_counter = max(requests_data.keys(), default=0)
-load_requests()
-
 # ----------------------------------------------------------------------
 # Валидация телефона
 # ----------------------------------------------------------------------
@@ -100,25 +190,6 @@ def is_valid_phone(phone: str) -> bool:
     cleaned = re.sub(r"[^\d+]", "", phone)
     return bool(re.fullmatch(r"\+?\d{10,15}", cleaned)) and len(cleaned.lstrip('+')) >= 10
 
-# ----------------------------------------------------------------------
-# Перезапись CSV
-# ----------------------------------------------------------------------
-def _rewrite_csv() -> None:
-    tmp_file = CSV_FILE + ".tmp"
-    with open(tmp_file, 'w', encoding='utf-8', newline='') as tf:
-        writer = csv.writer(tf)
-        writer.writerow(["ID", "Имя", "Телефон", "Устройство", "Проблема", "Время", "Дата создания"])
-        for rid, data in sorted(requests_data.items()):
-            created = "Неизвестно"
-            if os.path.exists(CSV_FILE):
-                with open(CSV_FILE, 'r', encoding='utf-8') as rf:
-                    for row in csv.reader(rf):
-                        if row and len(row) >= 7 and row[0] == str(rid):
-                            created = row[6]
-                            break
-            writer.writerow([rid] + data + [created])
-    os.replace(tmp_file, CSV_FILE)
-
 # ----------------------------------------------------------------------
 # Хендлеры
 # ----------------------------------------------------------------------
@@ -240,18 +311,25 @@ async def get_preferred_time(message: Message, state: FSMContext):
 
 @router.message(RepairRequest.confirm, F.text == "Да")
 async def confirm_yes(message: Message, state: FSMContext):
-    global request_counter
     data = await state.get_data()
-    request_counter += 1
+    # Та же заявка повторно в пределах окна — без новой строки и уведомления
+    duplicate_key = duplicates.key(data['phone'], data['device_type'], data['problem_description'])
+    previous = duplicates.check(duplicate_key)
+    if previous is not None and previous in store:
+        await message.answer(
+            f"Такая заявка уже принята (#{previous}). Мы свяжемся с вами в указанное время.",
+            reply_markup=main_keyboard
+        )
+        await state.clear()
+        return
     created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    row = [
-        request_counter, data['name'], data['phone'],
-        data['device_type'], data['problem_description'],
-        data['preferred_time'], created_at
-    ]
-    requests_data[request_counter] = row[1:6]
-    with open(CSV_FILE, 'a', encoding='utf-8', newline='') as f:
-        csv.writer(f).writerow(row)
+    rid, record = store.stage_add([
+        data['name'], data['phone'], data['device_type'],
+        data['problem_description'], data['preferred_time']
+    ], created_at)
+    duplicates.remember(duplicate_key, rid)
+    changes.publish("add", rid)
+    await writer.submit(record)
     await message.answer(
         "**Заявка успешно отправлена!**\n\n"
         "Мы свяжемся с вами в указанное время.\n"
@@ -260,7 +338,7 @@ async def confirm_yes(message: Message, state: FSMContext):
     )
     if ADMIN_ID:
         admin_text = (
-            f"НОВАЯ ЗАЯВКА #{request_counter}\n\n"
+            f"НОВАЯ ЗАЯВКА #{rid}\n\n"
             f"Имя: {data['name']}\n"
             f"Телефон: {data['phone']} \n"
             f"Устройство: {data['device_type']}\n"
@@ -268,7 +346,7 @@ async def confirm_yes(message: Message, state: FSMContext):
             f"Время: {data['preferred_time']}\n"
             f"Создано: {created_at}"
         )
-        await bot.send_message(ADMIN_ID, admin_text)
+        notifier.notify(admin_text)
     await state.clear()
 
 @router.message(RepairRequest.confirm, F.text == "Нет")
@@ -285,68 +363,355 @@ async def cmd_admin(message: Message):
     if message.from_user.id != ADMIN_ID:
         await message.answer("Доступ запрещён")
         return
-    if not requests_data:
+    kb = await run_read(admin_keyboard)
+    if kb is None:
         await message.answer("Нет заявок", reply_markup=main_keyboard)
         return
+    await message.answer("**Админ-панель:**", reply_markup=kb)
+
+# Курсор страницы — id, после которого она начинается: удаления не сдвигают
+# соседние страницы, а построение стоит O(размер страницы). selected — режим
+# выбора: кнопки заявок отмечают их для массового удаления.
+def admin_keyboard(after: int = 0, before: int | None = None,
+                   selected: set[int] | None = None) -> InlineKeyboardMarkup | None:
+    if before is not None:
+        rows = store.page_before(before, ADMIN_PAGE_SIZE)
+    else:
+        rows = store.page(after, ADMIN_PAGE_SIZE)
+        if not rows and after:
+            # Страница опустела после удалений — показываем предыдущую
+            rows = store.page_before(after + 1, ADMIN_PAGE_SIZE)
+    if not rows:
+        return None
+    cursor = rows[0][0] - 1
+    mode = "page" if selected is None else "sel"
     kb = InlineKeyboardMarkup(inline_keyboard=[])
-    for rid, data in sorted(requests_data.items()):
+    for rid, *data in rows:
+        label = f"#{rid} {data[0]} · {STATUSES[data[6]]}"
+        if selected is None:
+            kb.inline_keyboard.append([
+                InlineKeyboardButton(text=label, callback_data=f"view_{rid}"),
+                InlineKeyboardButton(text="Удалить", callback_data=f"delete_{rid}_{cursor}")
+            ])
+        else:
+            mark = "☑" if rid in selected else "☐"
+            kb.inline_keyboard.append([
+                InlineKeyboardButton(text=f"{mark} {label}", callback_data=f"pick_{rid}_{cursor}")
+            ])
+    nav = []
+    if store.page_before(rows[0][0], 1):
+        nav.append(InlineKeyboardButton(text="« Назад", callback_data=f"{mode}_b_{rows[0][0]}"))
+    if store.page(rows[-1][0], 1):
+        nav.append(InlineKeyboardButton(text="Вперёд »", callback_data=f"{mode}_a_{rows[-1][0]}"))
+    if nav:
+        kb.inline_keyboard.append(nav)
+    if selected is None:
+        kb.inline_keyboard.append([InlineKeyboardButton(text="Выбрать несколько", callback_data=f"sel_a_{cursor}")])
+    else:
         kb.inline_keyboard.append([
-            InlineKeyboardButton(text=f"#{rid} {data[0]}", callback_data=f"view_{rid}"),
-            InlineKeyboardButton(text="Удалить", callback_data=f"delete_{rid}")
+            InlineKeyboardButton(text=f"Удалить выбранные ({len(selected)})", callback_data="bulk_ask"),
+            InlineKeyboardButton(text="Готово", callback_data=f"page_a_{cursor}")
         ])
-    await message.answer("**Админ-панель:**", reply_markup=kb)
+    return kb
+
+@router.callback_query(F.data.startswith("page_") | F.data.startswith("sel_"))
+async def admin_page(callback: CallbackQuery, state: FSMContext):
+    if callback.from_user.id != ADMIN_ID:
+        await callback.answer("Доступ запрещён", show_alert=True)
+        return
+    mode, direction, cursor = callback.data.split("_")
+    picked = (await state.get_data()).get("selected", [])
+    if mode == "sel":
+        selected = set(picked)
+    else:
+        selected = None
+        if picked:
+            await state.update_data(selected=[])
+    if direction == "b":
+        kb = await run_read(admin_keyboard, 0, int(cursor), selected)
+    else:
+        kb = await run_read(admin_keyboard, int(cursor), None, selected)
+    if kb is None:
+        await callback.answer("Нет заявок", show_alert=True)
+        return
+    await callback.message.edit_reply_markup(reply_markup=kb)
+    await callback.answer()
+
+# ------------------- Массовые операции -------------------
+# Выбор накапливается в данных FSM администратора; удаление — одной пачкой
+# (delete_many) после подтверждения, затем одна перерисовка панели.
+@router.callback_query(F.data.startswith("pick_"))
+async def pick_request(callback: CallbackQuery, state: FSMContext):
+    if callback.from_user.id != ADMIN_ID:
+        await callback.answer("Доступ запрещён", show_alert=True)
+        return
+    _, rid, cursor = callback.data.split("_")
+    selected = set((await state.get_data()).get("selected", []))
+    selected ^= {int(rid)}
+    await state.update_data(selected=sorted(selected))
+    kb = await run_read(admin_keyboard, int(cursor), None, selected)
+    if kb is not None:
+        await callback.message.edit_reply_markup(reply_markup=kb)
+    await callback.answer()
+
+_BULK_RANGE_RE = re.compile(r"(\d+)\s*-\s*(\d+)")
+_BULK_BEFORE_RE = re.compile(r"(?:до|<)\s*(\d{4}-\d{2}-\d{2})")
+
+def ids_between(id_from: int, id_to: int) -> list[int]:
+    ids, after = [], id_from - 1
+    while True:
+        rows = store.page(after, BULK_CHUNK)
+        for row in rows:
+            if row[0] > id_to:
+                return ids
+            ids.append(row[0])
+        if len(rows) < BULK_CHUNK:
+            return ids
+        after = rows[-1][0]
+
+def bulk_targets(ids: list[int] = (), id_range: tuple[int, int] | None = None, before: str = "") -> list[int]:
+    # Явно выбранные id плюс заявки, подходящие под фильтр; диапазон id и
+    # «создано до» вместе сужают друг друга
+    found = {rid for rid in ids if rid in store}
+    if id_range is not None or before:
+        matched = set(ids_between(*sorted(id_range))) if id_range is not None else None
+        if before:
+            dated = set(store.created_between("", before))
+            matched = dated if matched is None else matched & dated
+        found |= matched
+    return sorted(found)
+
+def parse_bulk(text: str) -> tuple[list[int], tuple[int, int] | None, str] | None:
+    # «12 15 20», «12,15,20», «100-200», «до 2024-01-01» (или «<2024-01-01»)
+    text = text.strip()
+    before = _BULK_BEFORE_RE.search(text)
+    if before:
+        text = text[:before.start()] + text[before.end():]
+    id_range = _BULK_RANGE_RE.search(text)
+    if id_range:
+        text = text[:id_range.start()] + text[id_range.end():]
+    ids = [part for part in re.split(r"[\s,;]+", text) if part]
+    if not all(part.isdigit() for part in ids) or not (ids or id_range or before):
+        return None
+    return ([int(part) for part in ids],
+            (int(id_range.group(1)), int(id_range.group(2))) if id_range else None,
+            before.group(1) if before else "")
+
+bulk_confirm_keyboard = InlineKeyboardMarkup(inline_keyboard=[[
+    InlineKeyboardButton(text="Да, удалить", callback_data="bulk_yes"),
+    InlineKeyboardButton(text="Отмена", callback_data="bulk_no")
+]])
+
+async def ask_bulk_delete(message: Message, state: FSMContext, spec: tuple) -> None:
+    # В FSM хранится разобранный запрос, а не список id: диапазон может
+    # раскрыться в сотни тысяч заявок. Он разрешается заново при «Да».
+    ids = await run_read(bulk_targets, *spec)
+    if not ids:
+        await message.answer("Нет подходящих заявок")
+        return
+    await state.update_data(bulk=list(spec))
+    shown = ", ".join(f"#{rid}" for rid in ids[:FIND_LIMIT]) + (" …" if len(ids) > FIND_LIMIT else "")
+    await message.answer(f"**Удалить заявок: {len(ids)}?**\n\n{shown}", reply_markup=bulk_confirm_keyboard)
+
+@router.message(Command("delete"))
+async def cmd_delete(message: Message, command: CommandObject, state: FSMContext):
+    if message.from_user.id != ADMIN_ID:
+        await message.answer("Доступ запрещён")
+        return
+    spec = parse_bulk(command.args or "")
+    if spec is None:
+        await message.answer("Использование: /delete 12,15,20 | /delete 100-200 | /delete до 2024-01-01")
+        return
+    await ask_bulk_delete(message, state, spec)
+
+@router.callback_query(F.data.startswith("bulk_"))
+async def bulk_delete(callback: CallbackQuery, state: FSMContext):
+    if callback.from_user.id != ADMIN_ID:
+        await callback.answer("Доступ запрещён", show_alert=True)
+        return
+    action = callback.data.split("_")[1]
+    data = await state.get_data()
+    if action == "ask":
+        await callback.answer()
+        await ask_bulk_delete(callback.message, state, (data.get("selected", []), None, ""))
+        return
+    await state.update_data(bulk=None, selected=[])
+    if action == "no" or not data.get("bulk"):
+        await callback.message.edit_text("Удаление отменено", reply_markup=None)
+        await callback.answer()
+        return
+    deleted = await delete_many(await run_read(bulk_targets, *data["bulk"]))
+    await callback.message.edit_text(f"**Удалено заявок: {deleted}**", reply_markup=None)
+    await callback.answer()
+    kb = await run_read(admin_keyboard)
+    if kb is None:
+        await callback.message.answer("Нет заявок", reply_markup=main_keyboard)
+    else:
+        await callback.message.answer("**Админ-панель:**", reply_markup=kb)
+
+def request_card(row: list, archived: bool = False) -> str:
+    return (
+        f"**Заявка #{row[0]}**{' (архив)' if archived else ''}\n\n"
+        f"**Имя:** {row[1]}\n"
+        f"**Телефон:** `{row[2]}`\n"
+        f"**Устройство:** {row[3]}\n"
+        f"**Проблема:** {row[4]}\n"
+        f"**Время:** {row[5]}\n"
+        f"**Создано:** {row[6]}\n"
+        f"**Статус:** {STATUSES.get(row[7], row[7])}"
+    )
+
+def status_keyboard(rid: int, status: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text=label, callback_data=f"status_{rid}_{code}")
+        for code, label in STATUSES.items() if code != status
+    ]])
 
 @router.callback_query(F.data.startswith("view_"))
 async def view_request(callback: CallbackQuery):
     rid = int(callback.data.split("_")[1])
-    data = requests_data.get(rid)
-    if not data:
+    rows = await run_read(store.rows_for, [rid])
+    if rows:
+        await callback.message.answer(request_card(rows[0]), reply_markup=status_keyboard(rid, rows[0][7]))
+    elif (row := await run_read(archive.get, rid)) is not None:
+        await callback.message.answer(request_card(row, archived=True))
+    else:
         await callback.answer("Заявка не найдена", show_alert=True)
         return
-    created = "Неизвестно"
-    if os.path.exists(CSV_FILE):
-        with open(CSV_FILE, 'r', encoding='utf-8') as f:
-            for row in csv.reader(f):
-                if row and len(row) >= 7 and row[0] == str(rid):
-                    created = row[6]
-                    break
-    text = (
-        f"**Заявка #{rid}**\n\n"
-        f"**Имя:** {data[0]}\n"
-        f"**Телефон:** `{data[1]}`\n"
-        f"**Устройство:** {data[2]}\n"
-        f"**Проблема:** {data[3]}\n"
-        f"**Время:** {data[4]}\n"
-        f"**Создано:** {created}"
-    )
-    await callback.message.answer(text)
     await callback.answer()
 
+@router.callback_query(F.data.startswith("status_"))
+async def change_status(callback: CallbackQuery):
+    if callback.from_user.id != ADMIN_ID:
+        await callback.answer("Доступ запрещён", show_alert=True)
+        return
+    _, rid, status = callback.data.split("_", 2)
+    rid = int(rid)
+    record = store.stage_status(rid, status)
+    if record is None:
+        await callback.answer("Заявка не найдена", show_alert=True)
+        return
+    changes.publish("change", rid)
+    await writer.submit(record)
+    rows = await run_read(store.rows_for, [rid])
+    if rows:
+        await callback.message.edit_text(request_card(rows[0]), reply_markup=status_keyboard(rid, status))
+    await callback.answer(f"Статус: {STATUSES[status]}")
+
 @router.callback_query(F.data.startswith("delete_"))
 async def delete_request(callback: CallbackQuery):
-    rid = int(callback.data.split("_")[1])
-    if rid in requests_data:
-        del requests_data[rid]
-        _rewrite_csv()
+    parts = callback.data.split("_")
+    rid = int(parts[1])
+    after = int(parts[2]) if len(parts) > 2 else 0
+    record = store.stage_delete(rid)
+    if record is not None:
+        duplicates.forget(rid)
+        changes.publish("delete", rid)
+        await writer.submit(record)
         await callback.message.edit_text(
             f"**Заявка #{rid} удалена**",
             reply_markup=None
         )
-        await cmd_admin(callback.message)
+        kb = await run_read(admin_keyboard, after)
+        if kb is None:
+            await callback.message.answer("Нет заявок", reply_markup=main_keyboard)
+        else:
+            await callback.message.answer("**Админ-панель:**", reply_markup=kb)
     else:
         await callback.answer("Заявка не найдена", show_alert=True)
 
+@router.message(Command("find"))
+async def cmd_find(message: Message, command: CommandObject):
+    if message.from_user.id != ADMIN_ID:
+        await message.answer("Доступ запрещён")
+        return
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("Использование: /find <телефон, слово или дата ГГГГ-ММ-ДД>")
+        return
+    rows = await run_read(store.rows_for, store.search(query, FIND_LIMIT))
+    if not rows:
+        await message.answer("Ничего не найдено")
+        return
+    kb = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=f"#{row[0]} {row[1]} — {row[3]}", callback_data=f"view_{row[0]}")]
+        for row in rows
+    ])
+    await message.answer(f"Найдено: {len(rows)}", reply_markup=kb)
+
+@router.message(Command("archive"))
+async def cmd_archive(message: Message, command: CommandObject):
+    if message.from_user.id != ADMIN_ID:
+        await message.answer("Доступ запрещён")
+        return
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("Использование: /archive <телефон, слово или дата ГГГГ-ММ-ДД> — поиск по архиву")
+        return
+    # Заявка, вернувшаяся в работу, показывается из рабочего хранилища
+    rows = [row for row in await run_read(archive.search, query, FIND_LIMIT) if row[0] not in store]
+    if not rows:
+        await message.answer("В архиве ничего не найдено")
+        return
+    kb = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=f"#{row[0]} {row[1]} — {row[3]}", callback_data=f"view_{row[0]}")]
+        for row in rows
+    ])
+    await message.answer(f"Найдено в архиве: {len(rows)}", reply_markup=kb)
+
+def request_stats(days: int) -> dict:
+    # Рабочее хранилище + архив; обе сводки ведутся при записи
+    return store.stats().merge(archive.stats()).report(days)
+
+@router.message(Command("stats"))
+async def cmd_stats(message: Message, command: CommandObject):
+    if message.from_user.id != ADMIN_ID:
+        await message.answer("Доступ запрещён")
+        return
+    days = STATS_DAYS
+    if command.args and command.args.strip().isdigit():
+        days = max(1, min(int(command.args.strip()), STATS_DAYS_MAX))
+    report = await run_read(request_stats, days)
+    lines = [
+        "**Статистика заявок**\n",
+        f"Всего: {report['total']}",
+        f"В работе и новых (бэклог): {report['backlog']}",
+        "",
+        "По статусам:",
+        *(f"  {label}: {report['by_status'].get(code, 0)}" for code, label in STATUSES.items()),
+        "",
+        f"По дням (последние {days}):",
+        *(f"  {day}: {count}" for day, count in report["per_day"].items()),
+        "",
+        "По устройствам:",
+        *(f"  {kind}: {count}" for kind, count in report["by_device"].items()),
+        "",
+        "Удобное время звонка:",
+        *(f"  {TIME_BUCKETS[bucket]}: {count}" for bucket, count in report["by_time"].items()),
+    ]
+    await message.answer("\n".join(lines))
+
 @router.message(Command("get_csv"))
-async def cmd_get_csv(message: Message):
+async def cmd_get_csv(message: Message, command: CommandObject):
     if message.from_user.id != ADMIN_ID:
         await message.answer("Доступ запрещён")
         return
-    if not os.path.exists(CSV_FILE):
-        await message.answer("Нет заявок")
+    try:
+        export_filter = ExportFilter.parse(command.args)
+    except ValueError as e:
+        await message.answer(
+            f"{e}\nПримеры: /get_csv 100.. gz, /get_csv 2024-01-01..2024-01-31 zip, /get_csv 10..20, "
+            "/get_csv archive 2023-01-01..2023-12-31"
+        )
         return
-    with open(CSV_FILE, 'rb') as f:
-        file = BufferedInputFile(f.read(), filename="repair_requests.csv")
-    await message.answer_document(file, caption="Все заявки")
+    await writer.flush()
+    # Всё, что добавят после этой границы, попадёт в следующую выгрузку
+    next_from = store.counter + 1
+    caption = "Все заявки" if command.args is None else f"Заявки: {command.args}"
+    await message.answer_document(
+        ExportInputFile(store, export_filter, archive),
+        caption=f"{caption}\nНовые после этой выгрузки: /get_csv {next_from}.."
+    )
 
 # ------------------- Эхо для админа -------------------
 @router.message(lambda m: m.from_user.id == ADMIN_ID)
@@ -385,14 +750,8 @@ async def login_page(request):
         content_type="text/html"
     )
     
-async def admin_panel(request):
-    user_id = request.query.get("user")
-    if not user_id or int(user_id) != ADMIN_ID:
-        return web.Response(text="Доступ запрещён", status=403)
-    if not requests_data:
-        return web.Response(text="<h2>Нет заявок</h2>", content_type="text/html")
-
-    html = f"""
+def _admin_head(user_id: str, query: str = "", in_archive: bool = False) -> str:
+    return f"""
     <!DOCTYPE html>
     <html><head><title>Админ-панель</title><meta charset="utf-8">
     <style>
@@ -402,46 +761,296 @@ async def admin_panel(request):
         th {{background:#3498db; color:white;}}
         .btn {{padding:8px 16px; margin:4px; background:#e74c3c; color:white; text-decoration:none; border-radius:4px;}}
         .download {{background:#27ae60;}}
+        .nav {{background:#3498db;}}
+        input {{padding:8px; width:320px;}}
     </style></head><body>
     <h2>Заявки на ремонт</h2>
     <a href="/download_csv?user={user_id}" class="btn download">Скачать CSV</a>
+    <a href="/download_csv?user={user_id}&archive=1" class="btn download">CSV с архивом</a>
+    <form action="/search" method="get" style="display:inline; margin-left:20px;">
+        <input type="hidden" name="user" value="{user_id}">
+        <input type="text" name="q" value="{html.escape(query)}" placeholder="Телефон, слово или дата ГГГГ-ММ-ДД">
+        <label><input type="checkbox" name="archive" value="1" style="width:auto"{" checked" if in_archive else ""}> в архиве</label>
+    </form>
     <table>
-    <tr><th>ID</th><th>Имя</th><th>Телефон</th><th>Устройство</th><th>Проблема</th><th>Время</th><th>Создано</th><th>Действие</th></tr>
+    <tr><th>ID</th><th>Имя</th><th>Телефон</th><th>Устройство</th><th>Проблема</th><th>Время</th><th>Создано</th><th>Статус</th><th>Действие</th></tr>
     """
-    with open(CSV_FILE, 'r', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        next(reader, None)
-        for row in reader:
-            if len(row) >= 7:
-                rid = row[0]
-                html += (
-                    f"<tr><td>{rid}</td><td>{row[1]}</td><td>{row[2]}</td>"
-                    f"<td>{row[3]}</td><td>{row[4]}</td><td>{row[5]}</td><td>{row[6]}</td>"
-                    f"<td><a href='/delete/{rid}?user={user_id}' class='btn'>Удалить</a></td></tr>"
-                )
-    html += "</table></body></html>"
-    return web.Response(text=html, content_type="text/html")
+
+def _admin_row(row: list, user_id: str, cursor: int, limit: int = WEB_PAGE_SIZE, archived: bool = False) -> str:
+    # Всё, что ввёл клиент, экранируется: строка уходит и в страницу, и в /events
+    cells = "".join(f"<td>{html.escape(str(value))}</td>" for value in row[:7])
+    status = f"<b>{html.escape(STATUSES.get(row[7], row[7]))}</b>"
+    if archived:
+        action = "архив"
+    else:
+        status += "<br>" + " ".join(
+            f"<a href='/status/{row[0]}?to={code}&user={user_id}&after={cursor}&limit={limit}'>{label}</a>"
+            for code, label in STATUSES.items() if code != row[7]
+        )
+        action = (f"<input type='checkbox' name='id' value='{row[0]}' form='bulk' style='width:auto'> "
+                  f"<a href='/delete/{row[0]}?user={user_id}&after={cursor}&limit={limit}' class='btn'>Удалить</a>")
+    return (
+        f"<tr id='r{row[0]}'>{cells}<td>{status}</td><td>{action}</td></tr>"
+    )
+
+def _bulk_form(user_id: str, cursor: int, limit: int = WEB_PAGE_SIZE) -> str:
+    # Отмеченные в таблице строки и/или фильтр: диапазон id, «создано до»
+    return f"""
+    <form id="bulk" action="/bulk_delete?user={user_id}&after={cursor}&limit={limit}" method="post"
+          onsubmit="return confirm('Удалить выбранные заявки?')">
+        Выбранные, а также id с <input type="number" name="from" style="width:90px">
+        по <input type="number" name="to" style="width:90px">
+        созданные до <input type="date" name="before" style="width:auto">
+        <button type="submit" class="btn">Удалить</button>
+    </form>"""
+
+# Живое обновление: страница подписывается на /events и правит таблицу по
+# событиям вместо перезагрузок. Новые заявки дописываются только на
+# последней странице — на остальных они всё равно не видны. since — номер
+# последнего события на момент чтения страницы: события между отдачей
+# страницы и подпиской догоняются из кольца, а не теряются.
+def _live_script(user_id: str, cursor: int, limit: int, append: bool, since: str) -> str:
+    return f"""<script>
+    const live = new EventSource("/events?user={user_id}&after={cursor}&limit={limit}&since={since}");
+    const row = (e) => JSON.parse(e.data);
+    live.addEventListener("add", (e) => {{
+        const d = row(e), table = document.querySelector("table tbody");
+        if (!table) location.reload();
+        else if ({str(append).lower()} && !document.getElementById("r" + d.id)) table.insertAdjacentHTML("beforeend", d.html);
+    }});
+    live.addEventListener("change", (e) => {{
+        const d = row(e), tr = document.getElementById("r" + d.id);
+        if (tr) tr.outerHTML = d.html;
+    }});
+    live.addEventListener("delete", (e) => {{
+        const tr = document.getElementById("r" + row(e).id);
+        if (tr) tr.remove();
+    }});
+    live.addEventListener("reload", () => location.reload());
+    </script>"""
+
+async def admin_panel(request):
+    user_id = request.query.get("user")
+    if not user_id or int(user_id) != ADMIN_ID:
+        return web.Response(text="Доступ запрещён", status=403)
+    since = changes.event_id(changes.last)
+    after = int(request.query.get("after", 0))
+    before = request.query.get("before")
+    limit = max(1, min(int(request.query.get("limit", WEB_PAGE_SIZE)), WEB_PAGE_MAX))
+    if not len(store):
+        return web.Response(
+            text="<h2>Нет заявок</h2>" + _live_script(user_id, 0, limit, True, since), content_type="text/html"
+        )
+    # Операторы постоянно жмут F5: если с прошлого раза ничего не менялось,
+    # отвечаем 304 без чтения хранилища.
+    etag = store.etag(after, before, limit)
+    if request.headers.get("If-None-Match") == etag:
+        return web.Response(status=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    if before:
+        rows = await run_read(store.page_before, int(before), limit)
+    else:
+        rows = await run_read(store.page, after, limit)
+        if not rows and after:
+            # Страница опустела после удалений — показываем предыдущую
+            rows = await run_read(store.page_before, after + 1, limit)
+    cursor = rows[0][0] - 1 if rows else after
+
+    resp = web.StreamResponse(headers={"ETag": etag, "Cache-Control": "no-cache"})
+    resp.content_type = "text/html"
+    resp.charset = "utf-8"
+    resp.enable_chunked_encoding()
+    await resp.prepare(request)
+    await resp.write(_admin_head(user_id).encode('utf-8'))
+    for i in range(0, len(rows), WEB_ROW_CHUNK):
+        await resp.write("".join(
+            _admin_row(row, user_id, cursor, limit) for row in rows[i:i + WEB_ROW_CHUNK]
+        ).encode('utf-8'))
+    footer = ["</table>", _bulk_form(user_id, cursor, limit)]
+    if rows and store.page_before(rows[0][0], 1):
+        footer.append(f"<a href='/admin?user={user_id}&before={rows[0][0]}&limit={limit}' class='btn nav'>« Назад</a>")
+    has_next = bool(rows and store.page(rows[-1][0], 1))
+    if has_next:
+        footer.append(f"<a href='/admin?user={user_id}&after={rows[-1][0]}&limit={limit}' class='btn nav'>Далее »</a>")
+    footer.append(_live_script(user_id, cursor, limit, not has_next, since))
+    footer.append("</body></html>")
+    await resp.write("".join(footer).encode('utf-8'))
+    await resp.write_eof()
+    return resp
+
+async def search_web(request):
+    user_id = request.query.get("user")
+    if not user_id or int(user_id) != ADMIN_ID:
+        return web.Response(text="Доступ запрещён", status=403)
+    query = request.query.get("q", "").strip()
+    limit = max(1, min(int(request.query.get("limit", WEB_PAGE_SIZE)), WEB_PAGE_MAX))
+    in_archive = request.query.get("archive") == "1"
+    if in_archive:
+        rows = [row for row in await run_read(archive.search, query, limit) if row[0] not in store] if query else []
+    else:
+        rows = await run_read(store.rows_for, store.search(query, limit) if query else [])
+    body = [_admin_head(user_id, query, in_archive)]
+    body.extend(_admin_row(row, user_id, 0, archived=in_archive) for row in rows)
+    body.append("</table>")
+    if rows and not in_archive:
+        body.append(_bulk_form(user_id, 0))
+    body.append(f"<p>Найдено: {len(rows)}</p><a href='/admin?user={user_id}' class='btn nav'>Все заявки</a></body></html>")
+    return web.Response(text="".join(body), content_type="text/html")
 
 async def delete_web(request):
     user_id = request.query.get("user")
     if not user_id or int(user_id) != ADMIN_ID:
         return web.Response(text="Доступ запрещён", status=403)
     rid = int(request.match_info["id"])
-    if rid in requests_data:
-        del requests_data[rid]
-        _rewrite_csv()
-    return web.HTTPFound(f"/admin?user={user_id}")
+    record = store.stage_delete(rid)
+    if record is not None:
+        duplicates.forget(rid)
+        changes.publish("delete", rid)
+        await writer.submit(record)
+    after = int(request.query.get("after", 0))
+    limit = int(request.query.get("limit", WEB_PAGE_SIZE))
+    return web.HTTPFound(f"/admin?user={user_id}&after={after}&limit={limit}")
+
+async def bulk_delete_web(request):
+    user_id = request.query.get("user")
+    if not user_id or int(user_id) != ADMIN_ID:
+        return web.Response(text="Доступ запрещён", status=403)
+    form = await request.post()
+    ids = [int(rid) for rid in form.getall("id", []) if rid.isdigit()]
+    id_from, id_to = form.get("from", "").strip(), form.get("to", "").strip()
+    id_range = None
+    if id_from.isdigit() or id_to.isdigit():
+        id_range = (int(id_from or 1), int(id_to) if id_to.isdigit() else store.counter)
+    deleted = await delete_many(await run_read(bulk_targets, ids, id_range, form.get("before", "").strip()))
+    logging.info(f"Массовое удаление из веб-панели: {deleted} заявок")
+    after = int(request.query.get("after", 0))
+    limit = int(request.query.get("limit", WEB_PAGE_SIZE))
+    return web.HTTPFound(f"/admin?user={user_id}&after={after}&limit={limit}")
+
+async def status_web(request):
+    user_id = request.query.get("user")
+    if not user_id or int(user_id) != ADMIN_ID:
+        return web.Response(text="Доступ запрещён", status=403)
+    rid = int(request.match_info["id"])
+    record = store.stage_status(rid, request.query.get("to", ""))
+    if record is not None:
+        changes.publish("change", rid)
+        await writer.submit(record)
+    after = int(request.query.get("after", 0))
+    limit = int(request.query.get("limit", WEB_PAGE_SIZE))
+    return web.HTTPFound(f"/admin?user={user_id}&after={after}&limit={limit}")
+
+async def events_web(request):
+    # Server-Sent Events: на каждое изменение — одна готовая строка таблицы
+    # (или только id для удаления); между событиями — комментарий-пинг
+    user_id = request.query.get("user")
+    if not user_id or int(user_id) != ADMIN_ID:
+        return web.Response(text="Доступ запрещён", status=403)
+    cursor = int(request.query.get("after", 0))
+    limit = max(1, min(int(request.query.get("limit", WEB_PAGE_SIZE)), WEB_PAGE_MAX))
+    # При переподключении браузер шлёт Last-Event-ID, при первом — берём
+    # позицию, с которой была прочитана страница
+    sub, missed = changes.subscribe(request.headers.get("Last-Event-ID") or request.query.get("since"))
+    resp = web.StreamResponse(headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    resp.content_type = "text/event-stream"
+    resp.charset = "utf-8"
+    try:
+        await resp.prepare(request)
+        await resp.write(b"retry: 2000\n\n")
+        if missed is None:
+            await resp.write(b"event: reload\ndata: {}\n\n")
+            return resp
+        pending = list(missed)
+        while True:
+            if not pending:
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    await resp.write(b": ping\n\n")
+                    continue
+                if event is None:
+                    if sub.overflowed:
+                        await resp.write(b"event: reload\ndata: {}\n\n")
+                    break
+                pending.append(event)
+            number, kind, rid = pending.pop(0)
+            data = {"id": rid}
+            if kind != "delete":
+                rows = store.rows_for([rid])
+                if not rows:
+                    continue
+                data["html"] = _admin_row(rows[0], user_id, cursor, limit)
+            await resp.write(
+                f"id: {changes.event_id(number)}\nevent: {kind}\n"
+                f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8')
+            )
+    except ConnectionResetError:
+        pass
+    finally:
+        changes.unsubscribe(sub)
+    return resp
+
+async def stats_web(request):
+    # Для дашбордов: JSON той же сводки, что у /stats в боте
+    user_id = request.query.get("user")
+    if not user_id or int(user_id) != ADMIN_ID:
+        return web.Response(text="Доступ запрещён", status=403)
+    days = max(1, min(int(request.query.get("days", STATS_DAYS)), STATS_DAYS_MAX))
+    report = await run_read(request_stats, days)
+    return web.json_response(report, dumps=lambda data: json.dumps(data, ensure_ascii=False),
+                             headers={"Cache-Control": "no-cache"})
 
 async def download_csv_web(request):
     user_id = request.query.get("user")
     if not user_id or int(user_id) != ADMIN_ID:
         return web.Response(text="Доступ запрещён", status=403)
-    if not os.path.exists(CSV_FILE):
-        return web.Response(text="Нет заявок", status=404)
-    return web.FileResponse(
-        CSV_FILE,
-        headers={"Content-Disposition": "attachment; filename=repair_requests.csv"}
-    )
+    # ?from_id=&to_id=&since=ГГГГ-ММ-ДД&until=ГГГГ-ММ-ДД&compress=gzip|zip&archive=1
+    try:
+        export_filter = ExportFilter.from_query(request.query)
+    except ValueError as e:
+        return web.Response(text=str(e), status=400)
+    await writer.flush()
+    path, etag = await run_read(export_file, store, export_filter, archive)
+    return await send_export(request, path, etag, export_filter)
+
+async def send_export(request, path: str, etag: str, export_filter: ExportFilter) -> web.StreamResponse:
+    # Условные запросы (If-None-Match, If-Range) и один диапазон Range
+    headers = {
+        "ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "private, no-cache",
+        "Content-Disposition": f"attachment; filename={export_filter.filename()}",
+    }
+    if any(tag.value in ("*", etag.strip('"')) for tag in request.if_none_match or ()):
+        return web.Response(status=304, headers=headers)
+    size = os.path.getsize(path)
+    start, stop, status = 0, size, 200
+    if "Range" in request.headers and request.headers.get("If-Range", etag) == etag:
+        try:
+            rng = request.http_range
+        except ValueError:
+            return web.Response(status=416, headers={"Content-Range": f"bytes */{size}"})
+        if rng.start is not None and rng.start < 0:
+            start = max(0, size + rng.start)
+        else:
+            start = rng.start or 0
+            stop = min(rng.stop, size) if rng.stop is not None else size
+        if start >= size or start >= stop:
+            return web.Response(status=416, headers={"Content-Range": f"bytes */{size}"})
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+    response = web.StreamResponse(status=status, headers=headers)
+    response.content_type = export_filter.content_type()
+    response.content_length = stop - start
+    await response.prepare(request)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = stop - start
+        while remaining:
+            chunk = await run_read(f.read, min(256 * 1024, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            await response.write(chunk)
+    await response.write_eof()
+    return response
 
 # ----------------------------------------------------------------------
 # on_startup
@@ -455,37 +1064,107 @@ async def on_startup(app: web.Application):
     except Exception as e:
         logging.error(f"Ошибка получения username: {e}")
 
+# ----------------------------------------------------------------------
+# Метрики (/metrics, см. metrics.py)
+# ----------------------------------------------------------------------
+loop_lag_task: asyncio.Task | None = None
+
+async def start_metrics(app: web.Application):
+    global loop_lag_task
+    loop_lag_task = asyncio.create_task(metrics.watch_loop_lag())
+
+@metrics.registry.collector
+async def collect_gauges():
+    metrics.REQUESTS_TOTAL.set(len(store))
+    metrics.QUEUE_DEPTH.set(writer.queue.qsize(), "write")
+    metrics.QUEUE_DEPTH.set(len(notifier.pending), "notify")
+    if isinstance(webhook_handler, QueuedRequestHandler):
+        metrics.QUEUE_DEPTH.set(webhook_handler.pending, "webhook")
+    metrics.SSE_CLIENTS.set(len(changes.subscribers))
+    if isinstance(dp.storage, SQLiteStorage):
+        counts = await dp.storage.state_counts()
+    elif isinstance(dp.storage, MemoryStorage):
+        counts = {}
+        for record in dp.storage.storage.values():
+            counts[record.state] = counts.get(record.state, 0) + 1
+    else:
+        return
+    metrics.FSM_STATES.clear()
+    for state, count in counts.items():
+        if state is not None:
+            metrics.FSM_STATES.set(count, state)
+
+async def on_shutdown(app: web.Application):
+    for task in (loop_lag_task, archiver_task):
+        if task is not None:
+            task.cancel()
+    changes.close()
+    # Дописываем всё, что осталось в очереди записи
+    await notifier.close()
+    await writer.close()
+    store.close()
+
 # ----------------------------------------------------------------------
 # Веб-приложение
 # ----------------------------------------------------------------------
-app = web.Application()
+app = web.Application(middlewares=[metrics.http_middleware, store_ready_web_middleware])
+app.on_startup.append(load_store_on_startup)
+app.on_startup.append(start_metrics)
+app.on_startup.append(start_archiver)
+app.on_shutdown.append(on_shutdown)
 app.router.add_get("/", login_page)
 app.router.add_get("/admin", admin_panel)
+app.router.add_get("/search", search_web)
 app.router.add_get("/delete/{id}", delete_web)
+app.router.add_get("/status/{id}", status_web)
+app.router.add_post("/bulk_delete", bulk_delete_web)
+app.router.add_get("/events", events_web)
+app.router.add_get("/stats", stats_web)
 app.router.add_get("/download_csv", download_csv_web)
+app.router.add_get("/metrics", metrics.metrics_handler)
 
-# Регистрация webhook
-SimpleRequestHandler(dispatcher=dp, bot=bot).register(app, path="/webhook")
+# Регистрация webhook: ответ сразу, обработка — в ограниченном пуле, или
+# до ответа при WEBHOOK_MODE=inline или WORKERS > 1 (webhook.py)
+webhook_handler = make_handler(dp, bot, processes=WORKERS)
+webhook_handler.register(app, path="/webhook")
 setup_application(app, dp, bot=bot)
 
 # Включаем роутер
 dp.include_router(router)
+dp.update.outer_middleware(metrics.update_middleware)
+dp.update.outer_middleware(store_ready_middleware)
+dp.message.middleware(metrics.handler_name_middleware)
+dp.callback_query.middleware(metrics.handler_name_middleware)
+dp.message.middleware(throttle)
+dp.callback_query.middleware(throttle)
+bot.session.middleware(metrics.bot_api_middleware)
 
 # ----------------------------------------------------------------------
 # Запуск — ТОЛЬКО webhook
 # ----------------------------------------------------------------------
-import os
-
-async def main():
+async def main(primary: bool = True):
+    global is_primary
+    is_primary = primary
     await on_startup(app)
     
     port = int(os.environ.get("PORT", 8000))
-    webhook_url = f"https://tehnobot-miyassarova110604.amvera.io/webhook"
+    webhook_url = "https://tehnobot-miyassarova110604.amvera.io/webhook"
     
-    await bot.set_webhook(url=webhook_url, drop_pending_updates=True)
-    logging.info(f"Webhook установлен: {webhook_url}")
+    if primary:
+        await bot.set_webhook(url=webhook_url, drop_pending_updates=True)
+        logging.info(f"Webhook установлен: {webhook_url}")
     
-    await web._run_app(app, host="0.0.0.0", port=port)
+    await web._run_app(app, host="0.0.0.0", port=port, reuse_port=WORKERS > 1)
+
+def run_worker():
+    # Дополнительный процесс: тот же порт, webhook ставит только основной
+    asyncio.run(main(primary=False))
 
 if __name__ == "__main__":
+    if WORKERS > 1:
+        import multiprocessing
+        ctx = multiprocessing.get_context("spawn")
+        for _ in range(WORKERS - 1):
+            ctx.Process(target=run_worker, daemon=True).start()
+        logging.info(f"Запущено процессов: {WORKERS}")
     asyncio.run(main())
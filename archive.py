@@ -0,0 +1,231 @@
+# archive.py
+# Архив закрытых заявок. Выполненные и отменённые периодически переносятся
+# из рабочего хранилища в неизменяемые сегменты — сжатые CSV по месяцам
+# создания, — так что рабочее хранилище и его индексы держат только открытые
+# заявки. Архив читается лишь по явному запросу: поиск, просмотр, выгрузка.
+from collections import OrderedDict
+from typing import Iterator
+from decouple import config
+from index import RequestIndex, _DATE_RE
+from metrics import STORAGE_SECONDS
+from stats import RequestStats
+from storage import CSV_HEADER, DATA_DIR
+import csv
+import gzip
+import heapq
+import io
+import json
+import os
+import re
+import threading
+import time
+
+ARCHIVE_DIR = os.path.join(DATA_DIR, "archive")
+ARCHIVE_INTERVAL_HOURS = config("ARCHIVE_INTERVAL_HOURS", default=24, cast=float)
+ARCHIVE_CACHE_SEGMENTS = config("ARCHIVE_CACHE_SEGMENTS", default=4, cast=int)
+# <месяц>_<первый id>-<последний id>_<время записи>.csv.gz; рядом —
+# сводка сегмента <...>.stats.json, записанная до появления самого сегмента
+_SEGMENT_RE = re.compile(r"(\d{4}-\d{2})_(\d+)-(\d+)_(\d+)\.csv\.gz")
+
+class Segment:
+    def __init__(self, path: str, month: str, first: int, last: int, written: int):
+        self.path = path
+        self.month = month
+        self.first = first
+        self.last = last
+        self.written = written
+
+    @property
+    def stats_path(self) -> str:
+        return self.path[:-len(".csv.gz")] + ".stats.json"
+
+def _overlapping(segments: list[Segment]) -> Iterator[list[Segment]]:
+    # Группы сегментов (отсортированных по первому id) с пересекающимися диапазонами id
+    group: list[Segment] = []
+    for seg in segments:
+        if group and seg.first > max(g.last for g in group):
+            yield group
+            group = []
+        group.append(seg)
+    if group:
+        yield group
+
+class Archive:
+    # Сегменты не меняются после записи, поэтому разобранные строки и индексы
+    # кэшируются без проверок (LRU на ARCHIVE_CACHE_SEGMENTS сегментов).
+    # Заявка может оказаться в двух сегментах (перенос прервался до
+    # удаления из рабочего хранилища) — верной считается более свежая копия.
+    def __init__(self, path: str = ARCHIVE_DIR):
+        self.path = path
+        self._segments: list[Segment] = []
+        self._listed: int | None = None  # mtime каталога при последнем чтении списка
+        self._cache: OrderedDict[str, tuple[dict[int, list], RequestIndex | None]] = OrderedDict()
+        self._stats: dict[str, RequestStats] = {}  # сводки сегментов, по пути
+        self._total: tuple[list[Segment], RequestStats] | None = None
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    # ------------------- Сегменты -------------------
+    def segments(self) -> list[Segment]:
+        # Новые сегменты может дописать другой процесс — список перечитывается
+        # при смене mtime каталога. Сначала самые свежие записи.
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime != self._listed:
+            segments = []
+            for name in os.listdir(self.path):
+                m = _SEGMENT_RE.fullmatch(name)
+                if m:
+                    segments.append(Segment(os.path.join(self.path, name), m.group(1),
+                                            int(m.group(2)), int(m.group(3)), int(m.group(4))))
+            segments.sort(key=lambda seg: (seg.written, seg.path), reverse=True)
+            self._segments, self._listed = segments, mtime
+        return self._segments
+
+    def version(self) -> int:
+        return len(self.segments())
+
+    def _load(self, seg: Segment, indexed: bool = False) -> tuple[dict[int, list], RequestIndex | None]:
+        with self._lock:
+            entry = self._cache.get(seg.path)
+            if entry is not None:
+                self._cache.move_to_end(seg.path)
+        if entry is None:
+            with STORAGE_SECONDS.time("archive_read"), gzip.open(seg.path, 'rt', encoding='utf-8', newline='') as f:
+                reader = csv.reader(f)
+                next(reader, None)
+                entry = ({int(row[0]): row for row in reader if row}, None)
+        if indexed and entry[1] is None:
+            index = RequestIndex()
+            for rid, row in entry[0].items():
+                index.add(rid, row[1:6], row[6])
+            entry = (entry[0], index)
+        with self._lock:
+            self._cache[seg.path] = entry
+            self._cache.move_to_end(seg.path)
+            while len(self._cache) > ARCHIVE_CACHE_SEGMENTS:
+                self._cache.popitem(last=False)
+        return entry
+
+    # ------------------- Чтение -------------------
+    def get(self, rid: int) -> list | None:
+        for seg in self.segments():
+            if seg.first <= rid <= seg.last:
+                row = self._load(seg)[0].get(rid)
+                if row is not None:
+                    return row
+        return None
+
+    def iter_rows(self, id_from: int = 1, id_to: int | None = None,
+                  start: str = "", end: str = "\uffff") -> Iterator[list]:
+        # По возрастанию id, start <= создано < end; месяц сегмента отсекает
+        # лишние по дате. Сливаются только сегменты с пересекающимися
+        # диапазонами id — в памяти одна такая группа, а не весь архив.
+        segments = sorted((seg for seg in self.segments()
+                           if seg.last >= id_from and (id_to is None or seg.first <= id_to)
+                           and start[:7] <= seg.month <= end[:7]), key=lambda seg: seg.first)
+
+        def rows(seg: Segment) -> Iterator[list]:
+            data = self._load(seg)[0]
+            for rid in sorted(data):
+                row = data[rid]
+                if rid >= id_from and (id_to is None or rid <= id_to) and start <= row[6] < end:
+                    yield row
+
+        def merged(group: list[Segment]) -> Iterator[list]:
+            # heapq.merge устойчив: при равных id первой идёт копия из более свежего сегмента
+            group.sort(key=lambda seg: seg.written, reverse=True)
+            last = None
+            for row in heapq.merge(*(rows(seg) for seg in group), key=lambda row: int(row[0])):
+                rid = int(row[0])
+                if rid != last:
+                    last = rid
+                    yield [rid] + row[1:]
+
+        for group in _overlapping(segments):
+            yield from merged(group)
+
+    def search(self, query: str, limit: int = 20) -> list[list]:
+        # Тот же синтаксис, что у поиска по рабочему хранилищу; по дате
+        # читаются только сегменты подходящих месяцев
+        date = _DATE_RE.fullmatch(query.strip())
+        months = (date.group(1)[:7], (date.group(2) or date.group(1))[:7]) if date else ("", "\uffff")
+        found: dict[int, tuple[int, list]] = {}
+        for seg in sorted(self.segments(), key=lambda seg: seg.last, reverse=True):
+            if not months[0] <= seg.month <= months[1]:
+                continue
+            if len(found) >= limit and seg.last < min(found):
+                break
+            rows, index = self._load(seg, indexed=True)
+            for rid in index.search(query, limit):
+                if rid not in found or found[rid][0] < seg.written:
+                    found[rid] = (seg.written, rows[rid])
+        return [[rid] + found[rid][1][1:] for rid in sorted(found, reverse=True)[:limit]]
+
+    def stats(self) -> RequestStats:
+        # Сумма сводок сегментов: каждая читается один раз, сегменты не меняются,
+        # так что сумма пересчитывается только при смене списка сегментов.
+        # Заявка учитывается только в самом свежем сегменте: старые копии
+        # вычитаются, а искать их нужно лишь среди пересекающихся по id сегментов.
+        segments = self.segments()
+        if self._total is not None and self._total[0] is segments:
+            return self._total[1].copy()
+        total = RequestStats()
+        for seg in segments:
+            stats = self._stats.get(seg.path)
+            if stats is None:
+                try:
+                    with open(seg.stats_path, encoding='utf-8') as f:
+                        stats = RequestStats.from_dict(json.load(f))
+                except FileNotFoundError:
+                    stats = RequestStats.from_rows(self._load(seg)[0].values())
+                    self._write_stats(seg.stats_path, stats)
+                self._stats[seg.path] = stats
+            total.update(stats)
+        for group in _overlapping(sorted(segments, key=lambda seg: seg.first)):
+            if len(group) < 2:
+                continue
+            seen: set[int] = set()
+            for seg in sorted(group, key=lambda seg: seg.written, reverse=True):
+                for rid, row in self._load(seg)[0].items():
+                    if rid in seen:
+                        total.remove(row[1:6], row[6], row[7])
+                    else:
+                        seen.add(rid)
+        self._total = (segments, total)
+        return total.copy()
+
+    @staticmethod
+    def _write_stats(path: str, stats: RequestStats) -> None:
+        tmp_file = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(stats.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_file, path)
+
+    # ------------------- Запись -------------------
+    def write(self, rows: list[list]) -> list[str]:
+        # Строки группируются по месяцу создания; каждый сегмент пишется
+        # во временный файл и появляется в каталоге целиком
+        by_month: dict[str, list[list]] = {}
+        for row in rows:
+            month = row[6][:7] if re.match(r"\d{4}-\d{2}", row[6]) else "0000-00"
+            by_month.setdefault(month, []).append(row)
+        written = time.time_ns()
+        paths = []
+        for month, month_rows in sorted(by_month.items()):
+            month_rows.sort(key=lambda row: row[0])
+            name = f"{month}_{month_rows[0][0]}-{month_rows[-1][0]}_{written}.csv.gz"
+            path = os.path.join(self.path, name)
+            self._write_stats(path[:-len(".csv.gz")] + ".stats.json", RequestStats.from_rows(month_rows))
+            tmp_file = f"{path}.{os.getpid()}.tmp"
+            buf = io.StringIO()
+            out = csv.writer(buf)
+            out.writerow(CSV_HEADER)
+            out.writerows(month_rows)
+            with STORAGE_SECONDS.time("archive_write"):
+                with open(tmp_file, 'wb') as f:
+                    f.write(gzip.compress(buf.getvalue().encode('utf-8')))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_file, path)
+            paths.append(path)
+        return paths
@@ -0,0 +1,274 @@
+# bench.py
+# Нагрузочный прогон бота без сети: синтетические апдейты Telegram идут
+# POST-запросами в /webhook, Bot API подменён локальной заглушкой сессии.
+# Для каждого размера хранилища — отдельный процесс с временным DATA_DIR.
+#
+#   python bench.py --sizes 1000,10000,100000 --backend csv
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_ADMIN_ID = 1
+
+# ----------------------------------------------------------------------
+# Подготовка данных
+# ----------------------------------------------------------------------
+DEVICES = ["ноутбук Lenovo", "смартфон Samsung", "планшет Apple", "телевизор LG", "пылесос Xiaomi"]
+PROBLEMS = ["не включается", "разбит экран", "не заряжается", "шумит", "перегревается"]
+
+def populate(data_dir: str, size: int) -> None:
+    from storage import CSV_HEADER
+    with open(os.path.join(data_dir, "repair_requests.csv"), 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for rid in range(1, size + 1):
+            writer.writerow([
+                rid, f"Клиент {rid}", f"+7912{rid:07d}", random.choice(DEVICES),
+                random.choice(PROBLEMS), "вечером",
+                datetime.fromtimestamp(1700000000 + rid * 60).strftime("%Y-%m-%d %H:%M:%S")
+            ])
+
+# ----------------------------------------------------------------------
+# Заглушка Bot API
+# ----------------------------------------------------------------------
+def make_fake_session():
+    from aiogram.client.session.base import BaseSession
+    from aiogram.types import Chat, Message, User
+
+    class FakeSession(BaseSession):
+        def __init__(self):
+            super().__init__()
+            self.calls: dict[str, int] = {}
+
+        async def make_request(self, bot, method, timeout=None):
+            name = type(method).__name__
+            self.calls[name] = self.calls.get(name, 0) + 1
+            returning = method.__returning__
+            if returning is User:
+                return User(id=bot.id, is_bot=True, first_name="bench", username="bench_bot")
+            if returning is bool:
+                return True
+            chat_id = getattr(method, "chat_id", None)
+            return Message(
+                message_id=1, date=datetime.now(),
+                chat=Chat(id=chat_id if isinstance(chat_id, int) else BENCH_ADMIN_ID, type="private"),
+                text=""
+            )
+
+        async def stream_content(self, *args, **kwargs):
+            yield b""
+
+        async def close(self):
+            pass
+
+    return FakeSession()
+
+# ----------------------------------------------------------------------
+# Синтетические апдейты
+# ----------------------------------------------------------------------
+class Updates:
+    def __init__(self):
+        self.update_id = 0
+
+    def _next(self) -> int:
+        self.update_id += 1
+        return self.update_id
+
+    def _user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"u{user_id}"}
+
+    def message(self, user_id: int, text: str) -> dict:
+        uid = self._next()
+        return {"update_id": uid, "message": {
+            "message_id": uid, "date": int(time.time()), "text": text,
+            "chat": {"id": user_id, "type": "private"}, "from": self._user(user_id),
+        }}
+
+    def callback(self, user_id: int, data: str) -> dict:
+        uid = self._next()
+        return {"update_id": uid, "callback_query": {
+            "id": str(uid), "chat_instance": "bench", "data": data, "from": self._user(user_id),
+            "message": {"message_id": 1, "date": int(time.time()), "text": "",
+                        "chat": {"id": user_id, "type": "private"}, "from": self._user(user_id)},
+        }}
+
+# ----------------------------------------------------------------------
+# Замеры
+# ----------------------------------------------------------------------
+class Recorder:
+    def __init__(self):
+        self.samples: dict[str, list[float]] = {}
+        self.spans: dict[str, list[float]] = {}  # начало первого и конец последнего замера
+
+    def add(self, name: str, seconds: float) -> None:
+        end = time.perf_counter()
+        self.samples.setdefault(name, []).append(seconds)
+        span = self.spans.setdefault(name, [end - seconds, end])
+        span[0] = min(span[0], end - seconds)
+        span[1] = end
+
+    def summary(self) -> dict:
+        result = {}
+        for name, values in sorted(self.samples.items()):
+            values.sort()
+            window = self.spans[name][1] - self.spans[name][0]
+            result[name] = {
+                "count": len(values),
+                "rps": len(values) / window if window else 0.0,
+                "p50": _percentile(values, 0.50) * 1000,
+                "p95": _percentile(values, 0.95) * 1000,
+                "p99": _percentile(values, 0.99) * 1000,
+            }
+        return result
+
+def _percentile(values: list[float], p: float) -> float:
+    return values[max(0, math.ceil(p * len(values)) - 1)]
+
+def handler_timer(recorder: Recorder):
+    # Внутренний middleware роутера: в data уже есть найденный обработчик
+    async def middleware(handler, event, data):
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            recorder.add(data["handler"].callback.__name__, time.perf_counter() - start)
+    return middleware
+
+# ----------------------------------------------------------------------
+# Сценарии
+# ----------------------------------------------------------------------
+async def run_scenarios(args) -> dict:
+    from aiohttp.test_utils import TestClient, TestServer
+    import app as bot_app
+    from webhook import QueuedRequestHandler
+
+    logging.getLogger().setLevel(logging.WARNING)
+    bot_app.bot.session = make_fake_session()
+    recorder = Recorder()
+    bot_app.router.message.middleware(handler_timer(recorder))
+    bot_app.router.callback_query.middleware(handler_timer(recorder))
+    updates = Updates()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with TestClient(TestServer(bot_app.app)) as client:
+        async def post(update: dict) -> None:
+            async with semaphore:
+                start = time.perf_counter()
+                async with client.post("/webhook", json=update) as resp:
+                    await resp.read()
+                recorder.add("POST /webhook", time.perf_counter() - start)
+
+        async def get(name: str, url: str) -> None:
+            async with semaphore:
+                start = time.perf_counter()
+                async with client.get(url, allow_redirects=False) as resp:
+                    await resp.read()
+                recorder.add(name, time.perf_counter() - start)
+
+        async def drain() -> None:
+            # В режиме очереди апдейты обрабатываются после ответа — ждём их
+            if isinstance(bot_app.webhook_handler, QueuedRequestHandler):
+                await bot_app.webhook_handler.join()
+
+        async def conversation(user_id: int) -> None:
+            for text in ["Заявка на ремонт", "Иван Петров", f"+7912{user_id:07d}",
+                         random.choice(DEVICES), random.choice(PROBLEMS), "после обеда", "Да"]:
+                await post(updates.message(user_id, text))
+                await drain()
+
+        def random_id() -> int:
+            return random.randint(1, max(1, bot_app.store.counter))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(conversation(100000 + i) for i in range(args.users)))
+
+        admin_ops = []
+        for _ in range(args.admin_ops):
+            kind = random.random()
+            if kind < 0.2:
+                admin_ops.append(updates.message(BENCH_ADMIN_ID, "/admin"))
+            elif kind < 0.5:
+                admin_ops.append(updates.callback(BENCH_ADMIN_ID, f"view_{random_id()}"))
+            elif kind < 0.7:
+                admin_ops.append(updates.callback(BENCH_ADMIN_ID, f"page_a_{random_id()}"))
+            elif kind < 0.8:
+                admin_ops.append(updates.message(BENCH_ADMIN_ID, f"/find {random.choice(PROBLEMS)}"))
+            else:
+                admin_ops.append(updates.callback(BENCH_ADMIN_ID, f"delete_{random_id()}_0"))
+        await asyncio.gather(*(post(u) for u in admin_ops))
+        await drain()
+
+        web_hits = []
+        for _ in range(args.web_hits):
+            kind = random.random()
+            if kind < 0.5:
+                web_hits.append(("GET /admin", f"/admin?user={BENCH_ADMIN_ID}"))
+            elif kind < 0.7:
+                web_hits.append(("GET /admin?after", f"/admin?user={BENCH_ADMIN_ID}&after={random_id()}"))
+            elif kind < 0.9:
+                web_hits.append(("GET /search", f"/search?user={BENCH_ADMIN_ID}&q={random.randint(1000, 9999)}"))
+            else:
+                web_hits.append(("GET /delete", f"/delete/{random_id()}?user={BENCH_ADMIN_ID}"))
+        await asyncio.gather(*(get(name, url) for name, url in web_hits))
+        elapsed = time.perf_counter() - started
+        await bot_app.writer.flush()
+
+    return {"elapsed": elapsed, "handlers": recorder.summary(),
+            "bot_api_calls": bot_app.bot.session.calls}
+
+def run_one(args) -> None:
+    result = asyncio.run(run_scenarios(args))
+    print(json.dumps(result))
+
+# ----------------------------------------------------------------------
+# Запуск
+# ----------------------------------------------------------------------
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон webhook и веб-панели")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="размеры хранилища через запятую")
+    parser.add_argument("--backend", default="csv", choices=["csv", "sqlite"])
+    parser.add_argument("--users", type=int, default=50, help="параллельных диалогов оформления заявки")
+    parser.add_argument("--admin-ops", type=int, default=200)
+    parser.add_argument("--web-hits", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--run", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    if args.run is not None:
+        run_one(args)
+        return
+
+    for size in [int(s) for s in args.sizes.split(",")]:
+        with tempfile.TemporaryDirectory() as data_dir:
+            env = dict(os.environ, DATA_DIR=data_dir, STORAGE_BACKEND=args.backend,
+                       BOT_TOKEN="123456:BENCH", ADMIN_ID=str(BENCH_ADMIN_ID),
+                       NOTIFY_RATE="1000", NOTIFY_BURST="1000")
+            populate(data_dir, size)
+            proc = subprocess.run(
+                [sys.executable, __file__, "--run", str(size), *sys.argv[1:]],
+                env=env, capture_output=True, text=True
+            )
+            if proc.returncode:
+                print(proc.stderr, file=sys.stderr)
+                sys.exit(proc.returncode)
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"\n=== {size} заявок, хранилище {args.backend}, {result['elapsed']:.2f} с ===")
+        print(f"{'обработчик':<24}{'кол-во':>8}{'rps':>10}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}")
+        for name, s in result["handlers"].items():
+            print(f"{name:<24}{s['count']:>8}{s['rps']:>10.1f}{s['p50']:>10.2f}{s['p95']:>10.2f}{s['p99']:>10.2f}")
+        print("Bot API:", ", ".join(f"{k}={v}" for k, v in sorted(result["bot_api_calls"].items())))
+
+if __name__ == "__main__":
+    main()
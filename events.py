@@ -0,0 +1,75 @@
+# events.py
+# Внутрипроцессная шина изменений заявок для живой веб-панели (SSE, /events):
+# обработчики публикуют «добавлена / изменена / удалена», у каждой открытой
+# страницы своя ограниченная очередь. Отставшей подписке отправляется
+# «reload» — страница перечитается целиком. Оборванное соединение браузер
+# восстанавливает сам и догоняет по Last-Event-ID из кольца последних событий.
+from collections import deque
+from decouple import config
+import asyncio
+import os
+
+EVENTS_QUEUE_SIZE = config("EVENTS_QUEUE_SIZE", default=256, cast=int)
+EVENTS_REPLAY = config("EVENTS_REPLAY", default=1000, cast=int)
+EVENTS_KEEPALIVE = config("EVENTS_KEEPALIVE", default=15.0, cast=float)
+
+# id события — "<метка запуска>.<номер>": после перезапуска номера не сравнимы
+_BOOT = os.urandom(3).hex()
+
+class Subscription:
+    def __init__(self, size: int = EVENTS_QUEUE_SIZE):
+        # (номер, вид, id заявки); None — подписка закрыта
+        self.queue: asyncio.Queue[tuple[int, str, int] | None] = asyncio.Queue(maxsize=size)
+        self.overflowed = False
+
+    def close(self) -> None:
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+class EventBus:
+    def __init__(self, queue_size: int = EVENTS_QUEUE_SIZE, replay: int = EVENTS_REPLAY):
+        self.queue_size = queue_size
+        self.subscribers: set[Subscription] = set()
+        self.recent: deque[tuple[int, str, int]] = deque(maxlen=replay)
+        self.last = 0
+
+    @staticmethod
+    def event_id(number: int) -> str:
+        return f"{_BOOT}.{number}"
+
+    def publish(self, kind: str, rid: int) -> None:
+        self.last += 1
+        event = (self.last, kind, rid)
+        self.recent.append(event)
+        for sub in list(self.subscribers):
+            try:
+                sub.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.subscribers.discard(sub)
+                sub.overflowed = True
+                sub.close()
+
+    def subscribe(self, last_event_id: str | None = None) -> tuple[Subscription, list | None]:
+        # Возвращает подписку и пропущенные события; None — догнать нельзя,
+        # странице нужно перечитаться целиком
+        sub = Subscription(self.queue_size)
+        self.subscribers.add(sub)
+        if not last_event_id:
+            return sub, []
+        boot, _, number = last_event_id.partition(".")
+        if boot != _BOOT or not number.isdigit() or int(number) > self.last:
+            return sub, None
+        seen = int(number)
+        if seen < self.last and (not self.recent or self.recent[0][0] > seen + 1):
+            return sub, None
+        return sub, [event for event in self.recent if event[0] > seen]
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        self.subscribers.discard(sub)
+
+    def close(self) -> None:
+        # При остановке сервера открытые потоки завершаются сами
+        for sub in list(self.subscribers):
+            sub.close()
+        self.subscribers.clear()
@@ -0,0 +1,244 @@
+# export.py
+# Выгрузка заявок в CSV потоком: строки читаются страницами по id, кодируются
+# и (по желанию) сжимаются gzip/zip кусками — память не зависит от объёма.
+# Фильтры: диапазон id и диапазон дат создания; архив закрытых заявок
+# (archive.py) добавляется только по явному запросу.
+from typing import AsyncGenerator, Iterator
+from aiogram.types import InputFile
+from decouple import config
+from archive import Archive
+from storage import CSV_HEADER, DATA_DIR, RequestStore
+import asyncio
+import csv
+import hashlib
+import heapq
+import io
+import os
+import re
+import time
+import zipfile
+import zlib
+
+EXPORT_DIR = os.path.join(DATA_DIR, "exports")
+EXPORT_CHUNK_ROWS = config("EXPORT_CHUNK_ROWS", default=500, cast=int)
+EXPORT_CACHE_FILES = config("EXPORT_CACHE_FILES", default=8, cast=int)
+COMPRESSIONS = ("gzip", "zip")
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+class ExportFilter:
+    def __init__(self, id_from: int | None = None, id_to: int | None = None,
+                 date_from: str | None = None, date_to: str | None = None,
+                 compression: str | None = None, archive: bool = False):
+        for date in (date_from, date_to):
+            if date is not None and not _DATE_RE.fullmatch(date):
+                raise ValueError(f"Дата должна быть в формате ГГГГ-ММ-ДД: {date}")
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError(f"Сжатие: {', '.join(COMPRESSIONS)}")
+        self.id_from = id_from
+        self.id_to = id_to
+        self.date_from = date_from
+        self.date_to = date_to  # включительно
+        self.compression = compression
+        self.archive = archive
+
+    @classmethod
+    def parse(cls, text: str) -> "ExportFilter":
+        # Аргументы /get_csv: «100..», «100..200», «2024-01-01..2024-01-31»,
+        # «2024-03-01», «gz» / «zip», «archive» — в любом порядке
+        kwargs = {}
+        for token in (text or "").split():
+            token = token.lower()
+            if token in ("gz", "gzip"):
+                kwargs["compression"] = "gzip"
+            elif token == "zip":
+                kwargs["compression"] = "zip"
+            elif token in ("archive", "архив"):
+                kwargs["archive"] = True
+            elif m := re.fullmatch(r"#?(\d*)\.\.#?(\d*)", token):
+                kwargs["id_from"] = int(m.group(1)) if m.group(1) else None
+                kwargs["id_to"] = int(m.group(2)) if m.group(2) else None
+            elif m := re.fullmatch(r"(\d{4}-\d{2}-\d{2})(?:\.\.(\d{4}-\d{2}-\d{2})?)?", token):
+                kwargs["date_from"] = m.group(1)
+                kwargs["date_to"] = m.group(2) if ".." in token else m.group(1)
+            else:
+                raise ValueError(f"Непонятный аргумент: {token}")
+        return cls(**kwargs)
+
+    @classmethod
+    def from_query(cls, query) -> "ExportFilter":
+        def number(name: str) -> int | None:
+            return int(query[name]) if query.get(name) else None
+        return cls(number("from_id"), number("to_id"), query.get("since") or None,
+                   query.get("until") or None, query.get("compress") or None,
+                   query.get("archive") in ("1", "true", "on"))
+
+    def key(self) -> tuple:
+        return (self.id_from, self.id_to, self.date_from, self.date_to, self.compression, self.archive)
+
+    def filename(self) -> str:
+        parts = ["repair_requests"]
+        if self.id_from is not None or self.id_to is not None:
+            parts.append(f"{self.id_from or ''}-{self.id_to or ''}")
+        if self.date_from or self.date_to:
+            parts.append(f"{self.date_from or ''}_{self.date_to or ''}")
+        if self.archive:
+            parts.append("archive")
+        name = "_".join(parts) + ".csv"
+        return name + {"gzip": ".gz", "zip": ".zip"}.get(self.compression, "")
+
+    def content_type(self) -> str:
+        return {"gzip": "application/gzip", "zip": "application/zip"}.get(self.compression, "text/csv")
+
+# ----------------------------------------------------------------------
+# Строки и байты
+# ----------------------------------------------------------------------
+def _date_range(f: ExportFilter) -> tuple[str, str]:
+    return f.date_from or "", (f.date_to or "9999") + "\uffff"
+
+def iter_rows(store: RequestStore, f: ExportFilter, archive: Archive | None = None) -> Iterator[list]:
+    # Оба потока идут по возрастанию id; если заявка есть и в рабочем
+    # хранилище, и в архиве, берётся рабочая копия
+    if not f.archive or archive is None:
+        yield from _iter_hot_rows(store, f)
+        return
+    dates = _date_range(f) if f.date_from or f.date_to else ()
+    archived = archive.iter_rows(f.id_from or 1, f.id_to, *dates)
+    last = None
+    for row in heapq.merge(_iter_hot_rows(store, f), archived, key=lambda row: row[0]):
+        if row[0] != last:
+            last = row[0]
+            yield row
+
+def _iter_hot_rows(store: RequestStore, f: ExportFilter) -> Iterator[list]:
+    # Без фильтра по дате — страницами по id; с ним — id из индекса дат
+    id_from = f.id_from or 1
+    id_to = f.id_to
+    if f.date_from or f.date_to:
+        ids = sorted(rid for rid in store.created_between(*_date_range(f))
+                     if rid >= id_from and (id_to is None or rid <= id_to))
+        for i in range(0, len(ids), EXPORT_CHUNK_ROWS):
+            yield from store.rows_for(ids[i:i + EXPORT_CHUNK_ROWS])
+        return
+    after = id_from - 1
+    while True:
+        page = store.page(after, EXPORT_CHUNK_ROWS)
+        for row in page:
+            if id_to is not None and row[0] > id_to:
+                return
+            yield row
+        if len(page) < EXPORT_CHUNK_ROWS:
+            return
+        after = page[-1][0]
+
+def _iter_csv_plain(store: RequestStore, f: ExportFilter, archive: Archive | None) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(CSV_HEADER)
+    count = 0
+    for row in iter_rows(store, f, archive):
+        writer.writerow(row)
+        count += 1
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode('utf-8')
+
+class _ZipSink:
+    # Поток без seek: zipfile пишет дескрипторы данных после каждого файла
+    def __init__(self):
+        self.parts: list[bytes] = []
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.parts.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.size
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+def iter_csv(store: RequestStore, f: ExportFilter, archive: Archive | None = None) -> Iterator[bytes]:
+    chunks = _iter_csv_plain(store, f, archive)
+    if f.compression == "gzip":
+        gz = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            if data := gz.compress(chunk):
+                yield data
+        yield gz.flush()
+    elif f.compression == "zip":
+        sink = _ZipSink()
+        # Время в архиве — начало дня: одинаковое содержимое даёт одинаковый ETag
+        info = zipfile.ZipInfo(f.filename()[:-len(".zip")], date_time=time.localtime()[:3] + (0, 0, 0))
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with zipfile.ZipFile(sink, "w") as archive, archive.open(info, "w") as member:
+            for chunk in chunks:
+                member.write(chunk)
+                if data := sink.take():
+                    yield data
+        yield sink.take()
+    else:
+        yield from chunks
+
+# ----------------------------------------------------------------------
+# Telegram: документ читается из генератора, каждый кусок — в пуле потоков
+# ----------------------------------------------------------------------
+class ExportInputFile(InputFile):
+    def __init__(self, store: RequestStore, f: ExportFilter, archive: Archive | None = None):
+        super().__init__(filename=f.filename())
+        self.store = store
+        self.filter = f
+        self.archive = archive
+
+    async def read(self, bot) -> AsyncGenerator[bytes, None]:
+        chunks = iter_csv(self.store, self.filter, self.archive)
+        while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+            if chunk:
+                yield chunk
+
+# ----------------------------------------------------------------------
+# Веб: готовая выгрузка кэшируется файлом, пока хранилище не изменится
+# ----------------------------------------------------------------------
+def export_file(store: RequestStore, f: ExportFilter, archive: Archive | None = None) -> tuple[str, str]:
+    # Возвращает путь и сильный ETag (хэш содержимого — одинаков во всех процессах)
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    archive_version = archive.version() if f.archive and archive is not None else None
+    name = hashlib.sha1(repr((store.etag(), archive_version, f.key())).encode()).hexdigest()
+    path = os.path.join(EXPORT_DIR, name)
+    etag_path = path + ".etag"
+    if os.path.exists(path) and os.path.exists(etag_path):
+        os.utime(path)
+        with open(etag_path) as e:
+            return path, e.read()
+    digest = hashlib.sha1()
+    tmp_file = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_file, 'wb') as out:
+        for chunk in iter_csv(store, f, archive):
+            digest.update(chunk)
+            out.write(chunk)
+    os.replace(tmp_file, path)
+    etag = f'"{digest.hexdigest()}"'
+    with open(etag_path, 'w') as e:
+        e.write(etag)
+    _prune_exports()
+    return path, etag
+
+def _prune_exports() -> None:
+    files = []
+    for entry in os.scandir(EXPORT_DIR):
+        if entry.is_file() and "." not in entry.name:
+            files.append((entry.stat().st_mtime, entry.path))
+    for _, path in sorted(files, reverse=True)[EXPORT_CACHE_FILES:]:
+        for stale in (path, path + ".etag"):
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
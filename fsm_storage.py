@@ -0,0 +1,161 @@
+# fsm_storage.py
+# Хранилище FSM для незавершённых заявок: SQLite на диске (переживает
+# перезапуск), перед ним — ограниченный LRU-кэш в памяти. Брошенные
+# черновики старше FSM_TTL_HOURS вычищаются фоновой задачей.
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from decouple import config
+from storage import DATA_DIR
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+
+FSM_FILE = os.path.join(DATA_DIR, "fsm.sqlite3")
+FSM_TTL_HOURS = config("FSM_TTL_HOURS", default=24, cast=float)
+FSM_CACHE_SIZE = config("FSM_CACHE_SIZE", default=1000, cast=int)
+FSM_SWEEP_MINUTES = config("FSM_SWEEP_MINUTES", default=10, cast=float)
+
+_MISSING = object()
+
+class SQLiteStorage(BaseStorage):
+    def __init__(self, path: str = FSM_FILE, ttl: float = FSM_TTL_HOURS * 3600,
+                 cache_size: int = FSM_CACHE_SIZE, sweep_interval: float = FSM_SWEEP_MINUTES * 60):
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.sweep_interval = sweep_interval
+        # key -> (state, data, updated_at)
+        self.cache: OrderedDict[str, tuple[str | None, dict, float]] = OrderedDict()
+        # Один поток на все обращения к базе: записи по одному ключу не переставляются
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm")
+        self._sweeper: asyncio.Task | None = None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS fsm (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_fsm_updated_at ON fsm(updated_at);
+        """)
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return (f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id}:"
+                f"{key.business_connection_id}:{key.destiny}")
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    # ------------------- Кэш -------------------
+    def _cache_put(self, key: str, entry: tuple[str | None, dict, float]) -> None:
+        self.cache[key] = entry
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    async def _load(self, key: str) -> tuple[str | None, dict, float]:
+        self._ensure_sweeper()
+        entry = self.cache.get(key, _MISSING)
+        if entry is _MISSING:
+            row = await self._run(self._select, key)
+            entry = (row[0], json.loads(row[1]), row[2]) if row else (None, {}, time.time())
+            self._cache_put(key, entry)
+        else:
+            self.cache.move_to_end(key)
+        if entry[0] is None and not entry[1]:
+            return entry
+        if time.time() - entry[2] > self.ttl:
+            entry = (None, {}, time.time())
+            await self._store(key, entry)
+        return entry
+
+    async def _store(self, key: str, entry: tuple[str | None, dict, float]) -> None:
+        self._cache_put(key, entry)
+        if entry[0] is None and not entry[1]:
+            await self._run(self._delete, key)
+        else:
+            await self._run(self._upsert, key, entry[0], json.dumps(entry[1], ensure_ascii=False), entry[2])
+
+    # ------------------- База -------------------
+    def _select(self, key: str):
+        return self.db.execute("SELECT state, data, updated_at FROM fsm WHERE key = ?", (key,)).fetchone()
+
+    def _upsert(self, key: str, state: str | None, data: str, updated_at: float) -> None:
+        self.db.execute(
+            "INSERT INTO fsm (key, state, data, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET state = excluded.state, data = excluded.data, "
+            "updated_at = excluded.updated_at",
+            (key, state, data, updated_at)
+        )
+
+    def _delete(self, key: str) -> None:
+        self.db.execute("DELETE FROM fsm WHERE key = ?", (key,))
+
+    def _delete_expired(self, deadline: float) -> int:
+        return self.db.execute("DELETE FROM fsm WHERE updated_at < ?", (deadline,)).rowcount
+
+    def _count_states(self, deadline: float) -> dict[str | None, int]:
+        return dict(self.db.execute(
+            "SELECT state, COUNT(*) FROM fsm WHERE updated_at >= ? GROUP BY state", (deadline,)
+        ).fetchall())
+
+    # ------------------- Интерфейс BaseStorage -------------------
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k = self._key(key)
+        _, data, _ = await self._load(k)
+        await self._store(k, (state.state if isinstance(state, State) else state, data, time.time()))
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._load(self._key(key)))[0]
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        k = self._key(key)
+        state, _, _ = await self._load(k)
+        await self._store(k, (state, data.copy(), time.time()))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return (await self._load(self._key(key)))[1].copy()
+
+    async def state_counts(self) -> dict[str | None, int]:
+        # Для /metrics: живые черновики по состояниям, без просроченных
+        return await self._run(self._count_states, time.time() - self.ttl)
+
+    # ------------------- Очистка брошенных черновиков -------------------
+    def _ensure_sweeper(self) -> None:
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_loop())
+
+    async def sweep(self) -> int:
+        deadline = time.time() - self.ttl
+        for k in [k for k, entry in self.cache.items() if entry[2] < deadline]:
+            del self.cache[k]
+        removed = await self._run(self._delete_expired, deadline)
+        if removed:
+            logging.info(f"FSM: удалено брошенных черновиков: {removed}")
+        return removed
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                logging.error(f"Ошибка очистки FSM: {e}")
+            await asyncio.sleep(self.sweep_interval)
+
+    async def close(self) -> None:
+        # Вызывается диспетчером при остановке (FSMContextMiddleware)
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        self._executor.shutdown(wait=True)
+        self.db.close()
@@ -0,0 +1,134 @@
+# index.py
+# Индексы заявок в памяти, обновляемые при каждой вставке и удалении:
+# телефон -> id, последние цифры телефона -> id, слово из устройства или
+# проблемы -> id (обратный индекс) и отсортированный список по дате создания.
+from bisect import bisect_left, insort
+import re
+
+PHONE_TAIL = 4  # по скольким последним цифрам ищется неполный номер
+_DATE_RE = re.compile(r"(\d{4}-\d{2}-\d{2})(?:\s*\.\.\s*(\d{4}-\d{2}-\d{2}))?")
+
+def normalize_phone(phone: str) -> str:
+    digits = re.sub(r"\D", "", phone)
+    if len(digits) == 11 and digits.startswith("8"):
+        digits = "7" + digits[1:]
+    return digits
+
+def tokenize(text: str) -> set[str]:
+    return {t for t in re.findall(r"\w+", text.lower().replace("ё", "е")) if len(t) >= 2}
+
+class RequestIndex:
+    def __init__(self):
+        self.phones: dict[int, str] = {}
+        self.entries: dict[int, tuple[list[str], str]] = {}  # id -> (поля, создано)
+        self.by_phone: dict[str, set[int]] = {}
+        self.by_phone_tail: dict[str, set[int]] = {}
+        self.by_token: dict[str, set[int]] = {}
+        self.by_created: list[tuple[str, int]] = []
+
+    def clear(self) -> None:
+        for container in (self.phones, self.entries, self.by_phone, self.by_phone_tail, self.by_token, self.by_created):
+            container.clear()
+
+    # fields — [имя, телефон, устройство, проблема, время]
+    def add(self, rid: int, fields: list[str], created: str) -> None:
+        phone = normalize_phone(fields[1])
+        self.phones[rid] = phone
+        self.entries[rid] = (fields, created)
+        self.by_phone.setdefault(phone, set()).add(rid)
+        self.by_phone_tail.setdefault(phone[-PHONE_TAIL:], set()).add(rid)
+        for token in tokenize(f"{fields[2]} {fields[3]}"):
+            self.by_token.setdefault(token, set()).add(rid)
+        if not self.by_created or (created, rid) > self.by_created[-1]:
+            self.by_created.append((created, rid))
+        else:
+            insort(self.by_created, (created, rid))
+
+    def remove(self, rid: int, fields: list[str], created: str) -> None:
+        phone = self.phones.pop(rid, None)
+        if phone is None:
+            return
+        del self.entries[rid]
+        _discard(self.by_phone, phone, rid)
+        _discard(self.by_phone_tail, phone[-PHONE_TAIL:], rid)
+        for token in tokenize(f"{fields[2]} {fields[3]}"):
+            _discard(self.by_token, token, rid)
+        i = bisect_left(self.by_created, (created, rid))
+        if i < len(self.by_created) and self.by_created[i] == (created, rid):
+            del self.by_created[i]
+
+    def remove_many(self, ids) -> None:
+        # Пачка удалений: список по дате пересобирается один раз, а каждый
+        # затронутый список id правится одним вычитанием, а не по заявке
+        gone = {rid for rid in ids if rid in self.entries}
+        if not gone:
+            return
+        by_phone: dict[str, set[int]] = {}
+        by_phone_tail: dict[str, set[int]] = {}
+        by_token: dict[str, set[int]] = {}
+        for rid in gone:
+            phone = self.phones.pop(rid)
+            fields, _ = self.entries.pop(rid)
+            by_phone.setdefault(phone, set()).add(rid)
+            by_phone_tail.setdefault(phone[-PHONE_TAIL:], set()).add(rid)
+            for token in tokenize(f"{fields[2]} {fields[3]}"):
+                by_token.setdefault(token, set()).add(rid)
+        for index, removed in ((self.by_phone, by_phone), (self.by_phone_tail, by_phone_tail),
+                               (self.by_token, by_token)):
+            for key, rids in removed.items():
+                _discard_many(index, key, rids)
+        self.by_created = [item for item in self.by_created if item[1] not in gone]
+
+    def discard(self, rid: int) -> None:
+        # Удаление по одному id — когда строки уже нет (удалил другой процесс)
+        entry = self.entries.get(rid)
+        if entry is not None:
+            self.remove(rid, *entry)
+
+    # ------------------- Запросы -------------------
+    def find_by_phone(self, phone: str) -> list[int]:
+        return sorted(self.by_phone.get(normalize_phone(phone), ()))
+
+    def created_between(self, start: str, end: str) -> list[int]:
+        lo = bisect_left(self.by_created, (start,))
+        hi = bisect_left(self.by_created, (end,))
+        return [rid for _, rid in self.by_created[lo:hi]]
+
+    def search(self, query: str, limit: int = 20) -> list[int]:
+        # Номер телефона (полный или последние цифры), дата или диапазон дат
+        # «2024-01-01..2024-01-31», иначе — все слова запроса (пересечение).
+        query = query.strip()
+        date = _DATE_RE.fullmatch(query)
+        if date:
+            # Свежие заявки диапазона берём с конца, не копируя весь диапазон
+            lo = bisect_left(self.by_created, (date.group(1),))
+            hi = bisect_left(self.by_created, ((date.group(2) or date.group(1)) + "\uffff",))
+            return [rid for _, rid in reversed(self.by_created[max(lo, hi - limit):hi])]
+        elif re.fullmatch(r"[\d\s()+-]+", query) and len(normalize_phone(query)) >= PHONE_TAIL:
+            digits = normalize_phone(query)
+            ids = self.by_phone.get(digits)
+            if not ids:
+                ids = [rid for rid in self.by_phone_tail.get(digits[-PHONE_TAIL:], ())
+                       if self.phones[rid].endswith(digits)]
+        else:
+            postings = sorted((self.by_token.get(t, set()) for t in tokenize(query)), key=len)
+            if not postings:
+                return []
+            ids = set(postings[0])
+            for posting in postings[1:]:
+                ids &= posting
+        return sorted(ids, reverse=True)[:limit]
+
+def _discard(index: dict[str, set[int]], key: str, rid: int) -> None:
+    ids = index.get(key)
+    if ids is not None:
+        ids.discard(rid)
+        if not ids:
+            del index[key]
+
+def _discard_many(index: dict[str, set[int]], key: str, rids: set[int]) -> None:
+    ids = index.get(key)
+    if ids is not None:
+        ids -= rids
+        if not ids:
+            del index[key]
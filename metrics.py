@@ -0,0 +1,204 @@
+# metrics.py
+# Метрики в текстовом формате Prometheus: счётчики, гистограммы и датчики
+# без внешних зависимостей, плюс middleware для aiogram, aiohttp и Bot API.
+# Наблюдение — пара операций со словарём и bisect, его можно не выключать.
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable
+from aiohttp import web
+import asyncio
+import logging
+import time
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for n, v in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labels: tuple[str, ...] = ()):
+        self.name, self.doc, self.label_names = name, doc, labels
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        return [f"{self.name}{_labels(self.label_names, k)} {v}" for k, v in self.values.items()]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels) -> None:
+        self.values[labels] = value
+
+    def clear(self) -> None:
+        self.values.clear()
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name, self.doc, self.label_names = name, doc, labels
+        self.buckets = tuple(buckets)
+        # labels -> [счётчики по корзинам..., +Inf], сумма
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> list[str]:
+        lines = []
+        for key, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.label_names + ('le',), key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics: list = []
+        self.collectors: list[Callable[[], Awaitable[None]]] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, func: Callable[[], Awaitable[None]]):
+        # Вызывается перед каждой выдачей /metrics — для датчиков «по запросу»
+        self.collectors.append(func)
+        return func
+
+    async def render(self) -> str:
+        for collect in self.collectors:
+            try:
+                await collect()
+            except Exception as e:
+                logging.error(f"Ошибка сбора метрик: {e}")
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.doc}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# ----------------------------------------------------------------------
+# Метрики приложения
+# ----------------------------------------------------------------------
+HANDLER_SECONDS = registry.register(Histogram(
+    "bot_handler_seconds", "Время обработки апдейта по обработчику", ("handler",)))
+HANDLER_ERRORS = registry.register(Counter(
+    "bot_handler_errors_total", "Исключения в обработчиках", ("handler",)))
+HTTP_SECONDS = registry.register(Histogram(
+    "http_request_seconds", "Время ответа веб-приложения", ("route", "method", "status")))
+STORAGE_SECONDS = registry.register(Histogram(
+    "storage_operation_seconds", "Операции хранилища заявок", ("op",)))
+BOT_API_SECONDS = registry.register(Histogram(
+    "bot_api_request_seconds", "Исходящие вызовы Bot API", ("method", "result")))
+LOOP_LAG = registry.register(Histogram(
+    "event_loop_lag_seconds", "Задержка цикла событий", buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)))
+FSM_STATES = registry.register(Gauge(
+    "bot_fsm_states", "Незавершённые диалоги по состояниям FSM", ("state",)))
+REQUESTS_TOTAL = registry.register(Gauge(
+    "repair_requests", "Заявок в хранилище"))
+THROTTLED = registry.register(Counter(
+    "bot_throttled_total", "Апдейты, отброшенные ограничением частоты", ("handler",)))
+DUPLICATES = registry.register(Counter(
+    "repair_duplicates_total", "Повторно отправленные одинаковые заявки"))
+QUEUE_DEPTH = registry.register(Gauge(
+    "background_queue_depth", "Длина фоновых очередей", ("queue",)))
+SSE_CLIENTS = registry.register(Gauge(
+    "sse_clients", "Открытые страницы веб-панели с живым обновлением"))
+WEBHOOK_UPDATES = registry.register(Counter(
+    "webhook_updates_total", "Входящие апдейты: в очереди, повтор, отказ", ("result",)))
+
+# ----------------------------------------------------------------------
+# aiogram
+# ----------------------------------------------------------------------
+# Внешний middleware на dp.update замеряет апдейт целиком; имя обработчика
+# ему сообщает внутренний middleware через изменяемый словарь в data.
+async def update_middleware(handler, event, data: dict[str, Any]):
+    route = data["metrics_route"] = {"handler": "unhandled"}
+    start = time.perf_counter()
+    try:
+        return await handler(event, data)
+    except Exception:
+        HANDLER_ERRORS.inc(route["handler"])
+        raise
+    finally:
+        HANDLER_SECONDS.observe(time.perf_counter() - start, route["handler"])
+
+async def handler_name_middleware(handler, event, data: dict[str, Any]):
+    route = data.get("metrics_route")
+    if route is not None:
+        route["handler"] = data["handler"].callback.__name__
+    return await handler(event, data)
+
+async def bot_api_middleware(make_request, bot, method):
+    start = time.perf_counter()
+    result = "error"
+    try:
+        response = await make_request(bot, method)
+        result = "ok"
+        return response
+    finally:
+        BOT_API_SECONDS.observe(time.perf_counter() - start, type(method).__name__, result)
+
+# ----------------------------------------------------------------------
+# aiohttp
+# ----------------------------------------------------------------------
+@web.middleware
+async def http_middleware(request: web.Request, handler):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        resource = request.match_info.route.resource
+        route = resource.canonical if resource is not None else "unmatched"
+        HTTP_SECONDS.observe(time.perf_counter() - start, route, request.method, status)
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=await registry.render(), content_type="text/plain",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+# ----------------------------------------------------------------------
+# Задержка цикла событий
+# ----------------------------------------------------------------------
+async def watch_loop_lag(interval: float = 0.5) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0.0, loop.time() - start - interval))
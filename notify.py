@@ -0,0 +1,123 @@
+# notify.py
+# Фоновая отправка уведомлений администратору. Скорость ограничена
+# «ведром токенов» под лимиты Telegram для одного чата; если очередь
+# копится, несколько уведомлений склеиваются в одну сводку.
+from collections import deque
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from decouple import config
+import asyncio
+import logging
+import time
+
+NOTIFY_RATE = config("NOTIFY_RATE", default=1.0, cast=float)  # сообщений в секунду
+NOTIFY_BURST = config("NOTIFY_BURST", default=3, cast=int)
+NOTIFY_DIGEST_MIN = config("NOTIFY_DIGEST_MIN", default=3, cast=int)
+NOTIFY_MAX_ATTEMPTS = config("NOTIFY_MAX_ATTEMPTS", default=5, cast=int)
+MESSAGE_LIMIT = 4096
+DIGEST_SEPARATOR = "\n\n———\n\n"
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def try_acquire(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    async def acquire(self) -> None:
+        while not self.try_acquire():
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class NotificationDispatcher:
+    def __init__(self, bot: Bot, chat_id: int | None, rate: float = NOTIFY_RATE,
+                 burst: int = NOTIFY_BURST, digest_min: int = NOTIFY_DIGEST_MIN):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.bucket = TokenBucket(rate, burst)
+        self.digest_min = digest_min
+        self.pending: deque[str] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._sending = False
+
+    def notify(self, text: str) -> None:
+        if not self.chat_id:
+            return
+        self.pending.append(text)
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def _next_message(self) -> str:
+        # Одиночное уведомление — как есть; при очереди — сводка из того,
+        # что помещается в одно сообщение Telegram.
+        if len(self.pending) < self.digest_min:
+            return self.pending.popleft()
+        parts = [self.pending.popleft()]
+        size = len(parts[0])
+        while self.pending and size + len(DIGEST_SEPARATOR) + len(self.pending[0]) <= MESSAGE_LIMIT - 64:
+            parts.append(self.pending.popleft())
+            size += len(DIGEST_SEPARATOR) + len(parts[-1])
+        return f"Сводка уведомлений ({len(parts)}):\n\n" + DIGEST_SEPARATOR.join(parts)
+
+    async def _send(self, text: str) -> None:
+        delay = 1.0
+        for attempt in range(1, NOTIFY_MAX_ATTEMPTS + 1):
+            if attempt > 1:
+                await self.bucket.acquire()
+            try:
+                await self.bot.send_message(self.chat_id, text)
+                return
+            except TelegramRetryAfter as e:
+                logging.warning(f"Telegram просит подождать {e.retry_after} с")
+                await asyncio.sleep(e.retry_after)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                logging.warning(f"Ошибка отправки уведомления (попытка {attempt}): {e}")
+                await asyncio.sleep(delay)
+                delay *= 2
+            except Exception as e:
+                logging.error(f"Уведомление не отправлено: {e}")
+                return
+        logging.error("Уведомление не отправлено: исчерпаны попытки")
+
+    async def _run(self) -> None:
+        while True:
+            if not self.pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            # Токен берём до сборки сообщения: всё, что накопилось
+            # за время ожидания, уйдёт одной сводкой.
+            await self.bucket.acquire()
+            self._sending = True
+            try:
+                await self._send(self._next_message())
+            finally:
+                self._sending = False
+
+    async def _drained(self) -> None:
+        while self.pending or self._sending:
+            await asyncio.sleep(0.05)
+
+    async def close(self, timeout: float = 5.0) -> None:
+        # Пытаемся доотправить очередь, но не задерживаем остановку надолго
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._drained(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Не отправлено уведомлений: {len(self.pending)}")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
@@ -0,0 +1,116 @@
+# stats.py
+# Сводка по заявкам для команды и веб-адреса /stats: заявки по дням создания, по виду
+# устройства, по удобному времени звонка и по статусам. Счётчики меняются
+# за O(1) на каждое добавление, удаление и смену статуса (их ведёт
+# хранилище и архив), поэтому запрос сводки не перечитывает историю заявок.
+from datetime import date, timedelta
+import re
+
+TIME_BUCKETS = {"morning": "Утро", "day": "День", "evening": "Вечер", "other": "Не указано"}
+OPEN_STATUSES = ("new", "in_progress")
+_UNKNOWN = "unknown"
+
+def day_key(created: str) -> str:
+    return created[:10] if re.match(r"\d{4}-\d{2}-\d{2}", created) else _UNKNOWN
+
+def device_kind(device: str) -> str:
+    # «смартфон Samsung» -> «смартфон»: вид устройства — первое слово
+    words = re.findall(r"\w+", device.lower().replace("ё", "е"))
+    return words[0] if words else _UNKNOWN
+
+def time_bucket(text: str) -> str:
+    # Свободный текст «после 14:00», «вечером», «утром в субботу»
+    text = text.lower()
+    hour = re.search(r"\b(\d{1,2})(?::\d{2})?\b", text)
+    if hour and int(hour.group(1)) < 24:
+        h = int(hour.group(1))
+        return "morning" if h < 12 else "day" if h < 17 else "evening"
+    if "утр" in text:
+        return "morning"
+    if "вечер" in text:
+        return "evening"
+    if "днем" in text or "днём" in text or "обед" in text or "день" in text:
+        return "day"
+    return "other"
+
+def _bump(counter: dict[str, int], key: str, delta: int) -> None:
+    value = counter.get(key, 0) + delta
+    if value:
+        counter[key] = value
+    else:
+        counter.pop(key, None)
+
+class RequestStats:
+    KINDS = ("day", "device", "time", "status")
+
+    def __init__(self):
+        self.total = 0
+        self.counters: dict[str, dict[str, int]] = {kind: {} for kind in self.KINDS}
+
+    # fields — [имя, телефон, устройство, проблема, время]
+    def add(self, fields: list[str], created: str, status: str, delta: int = 1) -> None:
+        self.total += delta
+        _bump(self.counters["day"], day_key(created), delta)
+        _bump(self.counters["device"], device_kind(fields[2]), delta)
+        _bump(self.counters["time"], time_bucket(fields[4]), delta)
+        _bump(self.counters["status"], status, delta)
+
+    def remove(self, fields: list[str], created: str, status: str) -> None:
+        self.add(fields, created, status, -1)
+
+    def move_status(self, old: str, new: str) -> None:
+        _bump(self.counters["status"], old, -1)
+        _bump(self.counters["status"], new, 1)
+
+    def copy(self) -> "RequestStats":
+        other = RequestStats()
+        other.total = self.total
+        other.counters = {kind: dict(counter) for kind, counter in self.counters.items()}
+        return other
+
+    def update(self, other: "RequestStats") -> None:
+        self.total += other.total
+        for kind, counter in other.counters.items():
+            for key, value in counter.items():
+                _bump(self.counters[kind], key, value)
+
+    def merge(self, other: "RequestStats") -> "RequestStats":
+        result = self.copy()
+        result.update(other)
+        return result
+
+    @classmethod
+    def from_rows(cls, rows) -> "RequestStats":
+        # Полный пересчёт за один проход по строкам [id, ..., создано, статус]
+        stats = cls()
+        for row in rows:
+            stats.add(row[1:6], row[6], row[7])
+        return stats
+
+    def to_dict(self) -> dict:
+        return {"total": self.total, **self.counters}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RequestStats":
+        stats = cls()
+        stats.total = data["total"]
+        for kind in cls.KINDS:
+            stats.counters[kind] = dict(data.get(kind, {}))
+        return stats
+
+    # ------------------- Отчёт -------------------
+    def report(self, days: int = 14, today: date | None = None, top: int = 10) -> dict:
+        # Цена — O(days + число видов устройств), от объёма истории не зависит
+        today = today or date.today()
+        by_day = self.counters["day"]
+        per_day = [(d, by_day.get(d, 0))
+                   for d in ((today - timedelta(days=i)).isoformat() for i in range(days - 1, -1, -1))]
+        statuses = self.counters["status"]
+        return {
+            "total": self.total,
+            "backlog": sum(statuses.get(s, 0) for s in OPEN_STATUSES),
+            "by_status": dict(statuses),
+            "per_day": dict(per_day),
+            "by_device": dict(sorted(self.counters["device"].items(), key=lambda kv: -kv[1])[:top]),
+            "by_time": {bucket: self.counters["time"].get(bucket, 0) for bucket in TIME_BUCKETS},
+        }
@@ -0,0 +1,1237 @@
+# storage.py
+# Хранилище заявок, общее для бота (app.py) и веб-просмотра (web.py).
+# Две реализации: CSV-журнал с «надгробиями» и SQLite в режиме WAL.
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right, insort
+from typing import Iterator
+from decouple import config
+from index import RequestIndex, normalize_phone
+from metrics import STORAGE_SECONDS
+from stats import RequestStats
+import asyncio
+import csv
+import fcntl
+import gc
+import io
+import logging
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+
+# ----------------------------------------------------------------------
+# Настройка
+# ----------------------------------------------------------------------
+DATA_DIR = config("DATA_DIR", default="/data")
+CSV_FILE = os.path.join(DATA_DIR, "repair_requests.csv")
+SQLITE_FILE = os.path.join(DATA_DIR, "repair_requests.sqlite3")
+STORAGE_BACKEND = config("STORAGE_BACKEND", default="csv")  # csv | sqlite
+CSV_HEADER = ["ID", "Имя", "Телефон", "Устройство", "Проблема", "Время", "Дата создания", "Статус"]
+UNKNOWN_CREATED = "Неизвестно"
+# Жизненный цикл заявки. Закрытые периодически уходят в архив (archive.py).
+STATUSES = {"new": "Новая", "in_progress": "В работе", "done": "Выполнена", "cancelled": "Отменена"}
+STATUS_NEW = "new"
+CLOSED_STATUSES = ("done", "cancelled")
+# Удаление дописывает в CSV «надгробие» вида "-<id>" вместо перезаписи файла.
+# Файл сжимается в фоне, когда мёртвых строк набирается не меньше порога
+# и не меньше, чем живых заявок (так сжатие амортизированно O(1) на удаление).
+TOMBSTONE_PREFIX = "-"
+# Смена статуса дописывает строку "~<id>,<статус>" (при сжатии статус
+# переносится в последнюю колонку строки заявки)
+STATUS_PREFIX = "~"
+CSV_COMPACT_MIN_DEAD = config("CSV_COMPACT_MIN_DEAD", default=200, cast=int)
+# Снимок состояния (pickle) рядом с CSV: при старте читается он и только
+# строки журнала, дописанные после покрытого им смещения. Снимок
+# переписывается в фоне после каждых CSV_SNAPSHOT_EVERY записанных строк.
+CSV_SNAPSHOT_EVERY = config("CSV_SNAPSHOT_EVERY", default=1000, cast=int)
+SNAPSHOT_FORMAT = 4
+# Заявки в снимке — пачками отдельных pickle: чтение в пуле потоков не держит
+# GIL (и цикл событий) всё время разбора
+SNAPSHOT_CHUNK = 5000
+SNAPSHOT_SIG_BYTES = 64  # хвост покрытой части файла — защита от чужого снимка
+
+# Метка запуска процесса: версия хранилища в ETag сравнима только внутри него.
+# Ей же помечаются свои записи в журнале изменений SQLite.
+_BOOT_ID = os.urandom(4).hex()
+# Сколько последних изменений SQLite хранить для догоняющих процессов
+SQLITE_CHANGES_KEEP = config("SQLITE_CHANGES_KEEP", default=10000, cast=int)
+
+def _spawn(coro) -> None:
+    task = asyncio.get_running_loop().create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+_background_tasks: set[asyncio.Task] = set()
+
+# ----------------------------------------------------------------------
+# Общие для процессов блокировка и последовательность id
+# ----------------------------------------------------------------------
+# Несколько процессов бота на одном /data: запись в журнал идёт под flock,
+# id выдаёт общий файл-счётчик. Внутри процесса доступ к FileLock
+# сериализует вызывающий (flock не различает потоки одного процесса).
+class FileLock:
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: int | None = None
+
+    def __enter__(self) -> "FileLock":
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+class IdSequence:
+    # Последний выданный id лежит в файле; floor — наибольший id, известный
+    # вызывающему (на случай, если файл потерян или создаётся впервые)
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._file = FileLock(path)
+
+    def next(self, floor: int = 0) -> int:
+        with self._lock, self._file:
+            raw = os.pread(self._file._fd, 32, 0).strip()
+            value = max(int(raw) if raw.isdigit() else 0, floor) + 1
+            os.pwrite(self._file._fd, str(value).encode().ljust(20), 0)
+            return value
+
+    def close(self) -> None:
+        self._file.close()
+
+# ----------------------------------------------------------------------
+# Общий интерфейс
+# ----------------------------------------------------------------------
+# Заявка хранится как [имя, телефон, устройство, проблема, время];
+# полная строка — [id, имя, телефон, устройство, проблема, время, создано, статус].
+#
+# Запись разделена на две фазы: stage_* сразу меняет видимое состояние и
+# возвращает строку журнала (полная строка, надгробие "-<id>" или "~<id>"),
+# write_records сохраняет пачку таких строк на диск (её можно вызывать
+# из другого потока), committed вызывается в потоке цикла после записи.
+class RequestStore(ABC):
+    version = 0  # растёт при любом изменении видимого состояния
+
+    @abstractmethod
+    def __len__(self) -> int: ...
+
+    @abstractmethod
+    def get(self, rid: int) -> list[str] | None: ...
+
+    @abstractmethod
+    def created(self, rid: int) -> str: ...
+
+    @abstractmethod
+    def status(self, rid: int) -> str: ...
+
+    @abstractmethod
+    def stage_add(self, fields: list[str], created_at: str) -> tuple[int, list]: ...
+
+    @abstractmethod
+    def stage_delete(self, rid: int) -> list | None: ...
+
+    # Откат подготовленных удалений ({id: запись}), пока их записи не отданы писателю
+    @abstractmethod
+    def unstage_deletes(self, staged: dict[int, list]) -> None: ...
+
+    @abstractmethod
+    def stage_status(self, rid: int, status: str) -> list | None: ...
+
+    @abstractmethod
+    def write_records(self, records: list[list], fsync: bool = False) -> None: ...
+
+    def committed(self, records: list[list]) -> None:
+        pass
+
+    @abstractmethod
+    def rows(self) -> Iterator[list]: ...
+
+    # Постраничный вывод по курсору id: устойчив к удалениям, цена — O(размер страницы)
+    @abstractmethod
+    def page(self, after: int = 0, limit: int = 20) -> list[list]: ...
+
+    @abstractmethod
+    def page_before(self, before: int, limit: int = 20) -> list[list]: ...
+
+    @abstractmethod
+    def created_between(self, start: str, end: str) -> list[int]: ...
+
+    @abstractmethod
+    def find_by_phone(self, phone: str) -> list[int]: ...
+
+    @abstractmethod
+    def ids_with_status(self, *statuses: str) -> list[int]: ...
+
+    # Сводка (stats.py) по заявкам в хранилище; ведётся при каждой записи
+    @abstractmethod
+    def stats(self) -> RequestStats: ...
+
+    @abstractmethod
+    def search_index(self) -> RequestIndex: ...
+
+    def search(self, query: str, limit: int = 20) -> list[int]:
+        # Поиск по индексам в памяти, без прохода по всем заявкам
+        return self.search_index().search(query, limit)
+
+    def __contains__(self, rid: int) -> bool:
+        return self.get(rid) is not None
+
+    def stage_deletes(self, ids: list[int]) -> dict[int, list]:
+        # Массовое удаление: {id: запись журнала} для одной пачки; отсутствующие id пропускаются
+        staged = {}
+        for rid in ids:
+            record = self.stage_delete(rid)
+            if record is not None:
+                staged[rid] = record
+        return staged
+
+    def rows_for(self, ids: list[int]) -> list[list]:
+        # Полные строки для указанных id в том же порядке; удалённые пропускаются
+        rows = []
+        for rid in ids:
+            fields = self.get(rid)
+            if fields is not None:
+                rows.append([rid] + fields + [self.created(rid), self.status(rid)])
+        return rows
+
+    def add(self, fields: list[str], created_at: str) -> int:
+        rid, record = self.stage_add(fields, created_at)
+        self.write_records([record])
+        self.committed([record])
+        return rid
+
+    def delete(self, rid: int) -> bool:
+        record = self.stage_delete(rid)
+        if record is None:
+            return False
+        self.write_records([record])
+        self.committed([record])
+        return True
+
+    def set_status(self, rid: int, status: str) -> bool:
+        record = self.stage_status(rid, status)
+        if record is None:
+            return False
+        self.write_records([record])
+        self.committed([record])
+        return True
+
+    def refresh(self) -> None:
+        # Подхватить изменения, сделанные другим процессом
+        pass
+
+    async def refresh_async(self) -> None:
+        # То же из цикла событий: долгие перечитывания не должны его блокировать
+        self.refresh()
+
+    def ensure_loaded(self) -> None:
+        # Для хранилищ, открытых с lazy=True; можно вызывать из пула потоков
+        pass
+
+    def etag(self, *parts) -> str:
+        return '"' + "-".join([_BOOT_ID, str(self.version), *map(str, parts)]) + '"'
+
+    def close(self) -> None:
+        pass
+
+# ----------------------------------------------------------------------
+# CSV-журнал
+# ----------------------------------------------------------------------
+class CsvStore(RequestStore):
+    def __init__(self, path: str = CSV_FILE, lazy: bool = False):
+        self.path = path
+        self.snapshot_path = path + ".snapshot"
+        self.data: dict[int, list[str]] = {}
+        self.created_at: dict[int, str] = {}
+        self.statuses: dict[int, str] = {}
+        self._stats = RequestStats()
+        self._index = RequestIndex()  # строится при загрузке, дальше ведётся вместе с data
+        self.ids: list[int] = []  # отсортированные id живых заявок
+        self.counter = 0
+        self.dead_rows = 0  # строки CSV, не соответствующие живым заявкам
+        self._compact_from: tuple[int, int] | None = None  # inode и смещение снимка для сжатия
+        self._foreign: list[bytes] = []  # строки других процессов, ещё не разобранные
+        self._file_lock = FileLock(path + ".lock")
+        self._seq = IdSequence(path + ".seq")
+        self._unwritten: set[int] = set()  # добавлены в память, но ещё не на диске
+        self._unwritten_deletes: dict[int, tuple[list[str], str, str]] = {}  # удалены, надгробие не на диске
+        self._unwritten_status: dict[int, str] = {}  # статус на диске, пока новый не записан
+        self._since_snapshot = 0  # строк журнала, не покрытых снимком
+        self._snapshotting = False
+        self._load_lock = threading.Lock()
+        self.loaded = False
+        self._reloading: asyncio.Task | None = None
+        self._write_lock = threading.Lock()
+        self._stat_key: tuple[int, int, int] | None = None  # inode, размер, mtime
+        self._offset = 0  # сколько байт файла уже разобрано
+        if not os.path.exists(path):
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                csv.writer(f).writerow(CSV_HEADER)
+        if not lazy:
+            self.load()
+
+    # ------------------- Загрузка -------------------
+    def ensure_loaded(self) -> None:
+        with self._load_lock:
+            if not self.loaded:
+                self.load()
+
+    def load(self) -> None:
+        self._adopt(self._read_fresh())
+
+    def _read_fresh(self) -> "CsvStore":
+        # Файл читается в отдельный объект: текущее состояние не трогается,
+        # поэтому чтение может идти в пуле потоков, пока цикл работает
+        fresh = CsvStore.__new__(CsvStore)
+        fresh.path, fresh.snapshot_path = self.path, self.snapshot_path
+        fresh.data, fresh.created_at, fresh.statuses, fresh.ids = {}, {}, {}, []
+        fresh._stats = RequestStats()
+        fresh._index = None
+        fresh.dead_rows = fresh._offset = fresh.counter = 0
+        # Сотни тысяч новых списков запускают полные проходы сборщика
+        # циклов, а он держит GIL — и цикл событий — по полсекунды
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with STORAGE_SECONDS.time("load"):
+                # Снимок сверяется и хвост читается по одному открытому файлу:
+                # между ними файл могут подменить сжатием
+                with open(self.path, 'rb') as f:
+                    fresh.from_snapshot = fresh._read_snapshot(f)
+                    fresh.replayed = fresh._read_tail(f)
+            fresh._index = fresh._build_index()
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return fresh
+
+    def _adopt(self, fresh: "CsvStore") -> None:
+        with self._write_lock:
+            # Подготовленные, но не записанные изменения переживают перечитывание
+            staged = [(rid, self.data[rid], self.created_at[rid], self.statuses[rid])
+                      for rid in self._unwritten if rid in self.data]
+            staged_status = {rid: self.statuses[rid] for rid in self._unwritten_status if rid in self.statuses}
+            self.data, self.created_at, self.statuses, self.ids = fresh.data, fresh.created_at, fresh.statuses, fresh.ids
+            self._stats, self._index = fresh._stats, fresh._index
+            self.dead_rows, self._offset, self._stat_key = fresh.dead_rows, fresh._offset, fresh._stat_key
+            # Чужие строки, собранные до подмены, уже есть в прочитанном файле или в его хвосте
+            self._foreign.clear()
+            self.counter = max(self.counter, fresh.counter, max(self.data.keys(), default=0))
+            for rid, fields, created, status in staged:
+                self._forget(rid)
+                self._remember(rid, fields, created, status)
+            for rid, status in staged_status.items():
+                if rid in self.statuses:
+                    self._stats.move_status(self.statuses[rid], status)
+                    self.statuses[rid] = status
+            for rid in self._unwritten_deletes:
+                self._forget(rid)
+            self._since_snapshot = fresh.replayed
+            self.version += 1
+            self.loaded = True
+        logging.info(f"CSV загружен: {len(self.data)} заявок, "
+                     f"{'из снимка + ' if fresh.from_snapshot else ''}{fresh.replayed} строк журнала")
+
+    def _read_snapshot(self, csv_file) -> bool:
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                snap = pickle.load(f)
+                if not isinstance(snap, dict) or snap.get("format") != SNAPSHOT_FORMAT:
+                    return False
+                # Снимок годится, только если файл тот же (не сжат и не подменён)
+                # и покрытая снимком часть не изменилась
+                st = os.fstat(csv_file.fileno())
+                sig = snap["sig"]
+                if st.st_ino != snap["inode"] or st.st_size < snap["offset"]:
+                    return False
+                csv_file.seek(snap["offset"] - len(sig))
+                if csv_file.read(len(sig)) != sig:
+                    return False
+                data, created_at, statuses = {}, {}, {}
+                for _ in range(snap["chunks"]):
+                    for rid, fields, created, status in pickle.load(f):
+                        data[rid] = fields
+                        created_at[rid] = created
+                        statuses[rid] = status
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logging.warning(f"Снимок {self.snapshot_path} не прочитан: {e}")
+            return False
+        self.data = data
+        self.created_at = created_at
+        self.statuses = statuses
+        self._stats = RequestStats.from_dict(snap["stats"])
+        self.ids = sorted(self.data)
+        self.dead_rows = snap["dead_rows"]
+        self._offset = snap["offset"]
+        return True
+
+    # Разбирает байты после self._offset. Незавершённая последняя строка
+    # (запись другого процесса ещё идёт) остаётся до следующего вызова.
+    def _read_tail(self, f) -> int:
+        st = os.fstat(f.fileno())
+        f.seek(self._offset)
+        chunk = f.read()
+        end = chunk.rfind(b"\n") + 1
+        reader = csv.reader(io.StringIO(chunk[:end].decode('utf-8'), newline=''))
+        if self._offset == 0:
+            next(reader, None)
+        count = 0
+        for row in reader:
+            self._apply_row(row)
+            count += 1
+        self._offset += end
+        self._stat_key = (st.st_ino, st.st_size, st.st_mtime_ns)
+        return count
+
+    def _apply_row(self, row: list[str]) -> None:
+        if not row:
+            return
+        key = row[0]
+        if key.startswith(TOMBSTONE_PREFIX) and key[1:].isdigit():
+            if self._forget(int(key[1:])):
+                self.dead_rows += 1
+            self.dead_rows += 1
+        elif key.startswith(STATUS_PREFIX) and key[1:].isdigit() and len(row) >= 2:
+            rid = int(key[1:])
+            if rid in self.statuses and row[1] in STATUSES:
+                self._stats.move_status(self.statuses[rid], row[1])
+                self.statuses[rid] = row[1]
+            self.dead_rows += 1
+        elif len(row) >= 6 and key.isdigit():
+            rid = int(key)
+            if self._forget(rid):
+                self.dead_rows += 1
+            status = row[7] if len(row) >= 8 and row[7] in STATUSES else STATUS_NEW
+            self._remember(rid, row[1:6], row[6] if len(row) >= 7 else UNKNOWN_CREATED, status)
+            self.counter = max(self.counter, rid)
+
+    def _stat(self) -> tuple[int, int, int]:
+        st = os.stat(self.path)
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _mark_synced(self) -> None:
+        # Файл изменён этим процессом: всё, что в нём есть, уже в памяти
+        # (чужие строки перед своими лежат в self._foreign)
+        self._stat_key = self._stat()
+        self._offset = self._stat_key[1]
+
+    def _drain_foreign(self) -> None:
+        # Вызывается в потоке цикла под self._write_lock
+        if not self._foreign:
+            return
+        for chunk in self._foreign:
+            for row in csv.reader(io.StringIO(chunk.decode('utf-8'), newline='')):
+                self._apply_row(row)
+        self._foreign.clear()
+        self.version += 1
+
+    def _refresh_tail(self) -> bool:
+        # Если файл только дописан — разбираем лишь новые байты. False —
+        # файл подменён (сжатие) или укорочен, его нужно прочитать заново.
+        if self._foreign:
+            with self._write_lock:
+                self._drain_foreign()
+        # Решение и чтение — по одному открытому файлу, иначе смещение
+        # старого файла может прийтись на середину строки подменённого
+        with open(self.path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            key = (st.st_ino, st.st_size, st.st_mtime_ns)
+            if key == self._stat_key and key[1] == self._offset:
+                return True
+            if self._stat_key is not None and key[0] == self._stat_key[0] and key[1] >= self._offset:
+                with STORAGE_SECONDS.time("refresh"):
+                    self._read_tail(f)
+                self.version += 1
+                return True
+        return False
+
+    def refresh(self) -> None:
+        if not self._refresh_tail():
+            self.load()
+
+    async def refresh_async(self) -> None:
+        # Полное перечитывание — в пуле потоков, одно на все ждущие запросы;
+        # в цикле остаётся только подмена состояния и разбор свежего хвоста
+        if self._refresh_tail():
+            return
+        if self._reloading is None or self._reloading.done():
+            self._reloading = asyncio.get_running_loop().create_task(self._reload_async())
+        await asyncio.shield(self._reloading)
+
+    async def _reload_async(self) -> None:
+        fresh = await asyncio.get_running_loop().run_in_executor(None, self._read_fresh)
+        self._adopt(fresh)
+        self._refresh_tail()
+
+    # ------------------- Индексы в памяти -------------------
+    def _remember(self, rid: int, fields: list[str], created: str, status: str = STATUS_NEW) -> None:
+        self.data[rid] = fields
+        self.created_at[rid] = created
+        self.statuses[rid] = status
+        self._stats.add(fields, created, status)
+        if self._index is not None:
+            self._index.add(rid, fields, created)
+        if not self.ids or rid > self.ids[-1]:
+            self.ids.append(rid)
+        else:
+            insort(self.ids, rid)
+
+    # batch — удаление в составе пачки: список id и индекс поправит stage_deletes
+    def _forget(self, rid: int, batch: bool = False) -> bool:
+        fields = self.data.pop(rid, None)
+        if fields is None:
+            return False
+        created = self.created_at.pop(rid)
+        self._stats.remove(fields, created, self.statuses.pop(rid, STATUS_NEW))
+        if not batch:
+            if self._index is not None:
+                self._index.remove(rid, fields, created)
+            i = bisect_left(self.ids, rid)
+            if i < len(self.ids) and self.ids[i] == rid:
+                del self.ids[i]
+        return True
+
+    # ------------------- Чтение -------------------
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def get(self, rid: int) -> list[str] | None:
+        return self.data.get(rid)
+
+    def created(self, rid: int) -> str:
+        return self.created_at.get(rid, UNKNOWN_CREATED)
+
+    def status(self, rid: int) -> str:
+        return self.statuses.get(rid, STATUS_NEW)
+
+    def rows(self) -> Iterator[list]:
+        # Может выполняться в пуле потоков, пока цикл меняет словари
+        for rid in list(self.ids):
+            fields = self.data.get(rid)
+            if fields is not None:
+                yield [rid] + fields + [self.created_at.get(rid, UNKNOWN_CREATED), self.status(rid)]
+
+    def page(self, after: int = 0, limit: int = 20) -> list[list]:
+        i = bisect_right(self.ids, after)
+        return self.rows_for(self.ids[i:i + limit])
+
+    def page_before(self, before: int, limit: int = 20) -> list[list]:
+        i = bisect_left(self.ids, before)
+        return self.rows_for(self.ids[max(0, i - limit):i])
+
+    def created_between(self, start: str, end: str) -> list[int]:
+        return self.search_index().created_between(start, end)
+
+    def find_by_phone(self, phone: str) -> list[int]:
+        return self.search_index().find_by_phone(phone)
+
+    def _build_index(self) -> RequestIndex:
+        index = RequestIndex()
+        for rid, fields in self.data.items():
+            index.add(rid, fields, self.created_at[rid])
+        return index
+
+    def ids_with_status(self, *statuses: str) -> list[int]:
+        return [rid for rid in list(self.ids) if self.statuses.get(rid) in statuses]
+
+    def stats(self) -> RequestStats:
+        return self._stats.copy()
+
+    def search_index(self) -> RequestIndex:
+        # Индекс строит только загрузка (под блокировкой записи): первый поиск
+        # из пула потоков не должен обходить словари, которые меняет цикл
+        self.ensure_loaded()
+        return self._index
+
+    def close(self) -> None:
+        self._file_lock.close()
+        self._seq.close()
+
+    # ------------------- Запись -------------------
+    def stage_add(self, fields: list[str], created_at: str) -> tuple[int, list]:
+        rid = self._seq.next(self.counter)
+        self.counter = rid
+        self._remember(rid, list(fields), created_at)
+        self._unwritten.add(rid)
+        self.version += 1
+        return rid, [rid] + list(fields) + [created_at, STATUS_NEW]
+
+    def stage_delete(self, rid: int, batch: bool = False) -> list | None:
+        fields, created, status = self.data.get(rid), self.created(rid), self.status(rid)
+        if not self._forget(rid, batch):
+            return None
+        self._unwritten_deletes[rid] = (fields, created, status)
+        self.dead_rows += 2
+        self.version += 1
+        return [f"{TOMBSTONE_PREFIX}{rid}"]
+
+    def unstage_deletes(self, staged: dict[int, list]) -> None:
+        for rid in staged:
+            fields, created, status = self._unwritten_deletes.pop(rid)
+            self._remember(rid, fields, created, status)
+            self.dead_rows -= 2
+        self.version += 1
+
+    def stage_deletes(self, ids: list[int]) -> dict[int, list]:
+        # Отсортированный список id и индекс пересобираются один раз на пачку,
+        # а не сдвигаются на каждое удаление
+        staged = {}
+        for rid in ids:
+            record = self.stage_delete(rid, batch=True)
+            if record is not None:
+                staged[rid] = record
+        if staged:
+            self.ids = [rid for rid in self.ids if rid not in staged]
+            if self._index is not None:
+                self._index.remove_many(staged)
+        return staged
+
+    def stage_status(self, rid: int, status: str) -> list | None:
+        if rid not in self.data or status not in STATUSES:
+            return None
+        self._unwritten_status.setdefault(rid, self.statuses[rid])
+        self._stats.move_status(self.statuses[rid], status)
+        self.statuses[rid] = status
+        self.dead_rows += 1
+        self.version += 1
+        return [f"{STATUS_PREFIX}{rid}", status]
+
+    def write_records(self, records: list[list], fsync: bool = False) -> None:
+        with self._write_lock, self._file_lock, STORAGE_SECONDS.time("append"):
+            buf = io.StringIO()
+            csv.writer(buf).writerows(records)
+            payload = memoryview(buf.getvalue().encode('utf-8'))
+            with open(self.path, 'ab', buffering=0) as f:
+                st = os.fstat(f.fileno())
+                replaced = self._stat_key is None or st.st_ino != self._stat_key[0]
+                foreign = None
+                if not replaced and st.st_size > self._offset:
+                    # Другие процессы дописали журнал: их строки разберёт цикл событий
+                    with open(self.path, 'rb') as r:
+                        r.seek(self._offset)
+                        foreign = r.read(st.st_size - self._offset)
+                try:
+                    while payload:
+                        payload = payload[f.write(payload):]
+                    if fsync:
+                        os.fsync(f.fileno())
+                except BaseException:
+                    # Пачку повторит писатель: недописанный кусок не должен
+                    # склеиться с её следующей попыткой
+                    os.ftruncate(f.fileno(), st.st_size)
+                    raise
+                if foreign is not None:
+                    self._foreign.append(foreign)
+            if replaced:
+                # Файл сжат другим процессом — refresh() перечитает его целиком
+                self._stat_key = None
+            else:
+                self._mark_synced()
+            for record in records:
+                if isinstance(record[0], int):
+                    self._unwritten.discard(record[0])
+                elif record[0].startswith(STATUS_PREFIX):
+                    # На диске теперь этот статус; если после него поставлен
+                    # ещё один, снимку нужен именно записанный
+                    rid = int(record[0][1:])
+                    if self.statuses.get(rid, record[1]) == record[1]:
+                        self._unwritten_status.pop(rid, None)
+                    elif rid in self._unwritten_status:
+                        self._unwritten_status[rid] = record[1]
+                else:
+                    self._unwritten_deletes.pop(int(record[0][1:]), None)
+
+    def committed(self, records: list[list]) -> None:
+        self._since_snapshot += len(records)
+        if self._stat_key is None or self._foreign:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                self.refresh()
+            else:
+                _spawn(self.refresh_async())
+        self._maybe_compact()
+        self._maybe_snapshot()
+
+    # ------------------- Снимок для быстрого старта -------------------
+    def _capture_snapshot(self) -> dict:
+        # Вызывается под блокировкой записи: состояние ровно на self._offset —
+        # без ещё не записанных заявок и с ещё не записанными удалениями
+        self._drain_foreign()
+        data = dict(self.data)
+        created_at = dict(self.created_at)
+        statuses = dict(self.statuses)
+        # Сводка поправляется на те же незаписанные изменения — O(их числа)
+        stats = self._stats.copy()
+        for rid in self._unwritten:
+            if rid in data:
+                stats.remove(data.pop(rid), created_at.pop(rid), statuses.pop(rid))
+        for rid, (fields, created, status) in self._unwritten_deletes.items():
+            if rid not in self._unwritten:
+                data[rid] = fields
+                created_at[rid] = created
+                statuses[rid] = status
+                stats.add(fields, created, status)
+        for rid, status in self._unwritten_status.items():
+            if rid in statuses:
+                stats.move_status(statuses[rid], status)
+                statuses[rid] = status
+        with open(self.path, 'rb') as f:
+            f.seek(max(0, self._offset - SNAPSHOT_SIG_BYTES))
+            sig = f.read(min(self._offset, SNAPSHOT_SIG_BYTES))
+        return {
+            "format": SNAPSHOT_FORMAT, "inode": self._stat_key[0], "offset": self._offset, "sig": sig,
+            "dead_rows": self.dead_rows - 2 * len(self._unwritten_deletes) - len(self._unwritten_status),
+            "data": data, "created_at": created_at, "statuses": statuses, "stats": stats.to_dict(),
+        }
+
+    def _save_snapshot(self, snap: dict) -> None:
+        tmp_file = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        with STORAGE_SECONDS.time("snapshot"):
+            rows = [(rid, fields, snap["created_at"][rid], snap["statuses"][rid])
+                    for rid, fields in snap["data"].items()]
+            header = {key: value for key, value in snap.items() if key not in ("data", "created_at", "statuses")}
+            header["chunks"] = (len(rows) + SNAPSHOT_CHUNK - 1) // SNAPSHOT_CHUNK
+            with open(tmp_file, 'wb') as f:
+                pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+                for i in range(0, len(rows), SNAPSHOT_CHUNK):
+                    pickle.dump(rows[i:i + SNAPSHOT_CHUNK], f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, self.snapshot_path)
+
+    def snapshot(self) -> None:
+        with self._write_lock:
+            snap = self._capture_snapshot()
+        self._save_snapshot(snap)
+        self._since_snapshot = 0
+
+    async def _snapshot_async(self, snap: dict) -> None:
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._save_snapshot, snap)
+        except Exception as e:
+            logging.error(f"Ошибка записи снимка: {e}")
+        finally:
+            self._snapshotting = False
+
+    def _maybe_snapshot(self) -> None:
+        if self._snapshotting or self._compact_from is not None or self._stat_key is None:
+            return
+        if self._since_snapshot < CSV_SNAPSHOT_EVERY:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.snapshot()
+            return
+        with self._write_lock:
+            snap = self._capture_snapshot()
+        self._since_snapshot = 0
+        self._snapshotting = True
+        _spawn(self._snapshot_async(snap))
+
+    # ------------------- Сжатие -------------------
+    def _write_snapshot(self, path: str, rows: list[list]) -> None:
+        with STORAGE_SECONDS.time("rewrite"), open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_HEADER)
+            writer.writerows(rows)
+
+    def compact(self) -> None:
+        tmp_file = f"{self.path}.{os.getpid()}.tmp"
+        with self._write_lock, self._file_lock:
+            self._drain_foreign()
+            with open(self.path, 'rb') as f:
+                if self._stat_key is None or os.fstat(f.fileno()).st_ino != self._stat_key[0]:
+                    return
+                self._read_tail(f)
+            self._write_snapshot(tmp_file, [row for row in self.rows() if row[0] not in self._unwritten])
+            os.replace(tmp_file, self.path)
+            self._mark_synced()
+            self.dead_rows = 2 * len(self._unwritten_deletes) + len(self._unwritten_status)
+            # Старый снимок описывает прежний файл; новый нужен сразу —
+            # по нему другие процессы перечитают сжатый файл
+            snap = self._capture_snapshot()
+        self._save_snapshot(snap)
+        self._since_snapshot = 0
+
+    async def _compact_async(self, rows: list[list], dead_before: int) -> None:
+        tmp_file = f"{self.path}.{os.getpid()}.tmp"
+        inode, start = self._compact_from
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._write_snapshot, tmp_file, rows
+            )
+            # Под блокировками хвост журнала после снимка (свои и чужие строки)
+            # копируется как есть и файл подменяется — строки не теряются.
+            with self._write_lock, self._file_lock:
+                if self._stat()[0] != inode:
+                    os.remove(tmp_file)
+                    logging.info("CSV уже сжат другим процессом")
+                    return
+                with open(self.path, 'rb') as src, open(tmp_file, 'ab') as dst:
+                    base = dst.tell()
+                    src.seek(start)
+                    dst.write(src.read())
+                os.replace(tmp_file, self.path)
+                # Своё смещение переносится в новый файл; чужие строки после
+                # него разберёт refresh()
+                self._stat_key = self._stat()
+                self._offset = base + (self._offset - start)
+                self.dead_rows -= dead_before
+                # Снимок нового файла — другие процессы перечитают его по снимку
+                snap = self._capture_snapshot()
+            self._since_snapshot = 0
+            await asyncio.get_running_loop().run_in_executor(None, self._save_snapshot, snap)
+            logging.info(f"CSV сжат: {len(rows)} заявок")
+        except Exception as e:
+            logging.error(f"Ошибка сжатия CSV: {e}")
+        finally:
+            self._compact_from = None
+
+    def _maybe_compact(self) -> None:
+        if self._compact_from is not None or self._stat_key is None:
+            return
+        if self.dead_rows < CSV_COMPACT_MIN_DEAD or self.dead_rows < len(self.data):
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.compact()
+            return
+        # Снимок и начало хвоста фиксируются атомарно относительно записи;
+        # ещё не записанные строки попадут в хвост или уже в новый файл.
+        with self._write_lock:
+            self._drain_foreign()
+            self._compact_from = (self._stat_key[0], self._offset)
+            rows = [row for row in self.rows() if row[0] not in self._unwritten]
+            dead_before = self.dead_rows - 2 * len(self._unwritten_deletes) - len(self._unwritten_status)
+        _spawn(self._compact_async(rows, dead_before))
+
+# ----------------------------------------------------------------------
+# SQLite (WAL)
+# ----------------------------------------------------------------------
+class SqliteStore(RequestStore):
+    # Чтение идёт через соединение своего потока, запись — через отдельное
+    # соединение писателя. Подготовленные, но не записанные изменения лежат
+    # в _pending/_pending_deletes/_pending_status и видны при чтении до фиксации.
+    def __init__(self, path: str = SQLITE_FILE):
+        self.path = path
+        self._local = threading.local()
+        self._wdb: sqlite3.Connection | None = None
+        self._write_lock = threading.Lock()
+        self._pending: dict[int, list] = {}
+        self._pending_deletes: set[int] = set()
+        self._pending_status: dict[int, str] = {}
+        self._index: RequestIndex | None = None  # строится в ensure_loaded()
+        self._load_lock = threading.Lock()
+        self._seq = IdSequence(path + ".seq")
+        db = self._conn()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS requests (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                phone TEXT NOT NULL,
+                device TEXT NOT NULL,
+                problem TEXT NOT NULL,
+                preferred_time TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                phone_norm TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'new'
+            );
+            CREATE INDEX IF NOT EXISTS idx_requests_created_at ON requests(created_at);
+            CREATE INDEX IF NOT EXISTS idx_requests_phone ON requests(phone_norm);
+            -- Журнал изменений: другие процессы по нему догоняют своё состояние
+            -- (deleted: 0 — добавление, 1 — удаление, 2 — смена статуса)
+            CREATE TABLE IF NOT EXISTS changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                id INTEGER NOT NULL,
+                deleted INTEGER NOT NULL,
+                origin TEXT NOT NULL
+            );
+            -- Сводка (stats.py): счётчики меняются в той же транзакции, что и заявки
+            CREATE TABLE IF NOT EXISTS stats (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (kind, key)
+            );
+        """)
+        # Базы, созданные до появления статусов; процессы стартуют одновременно,
+        # поэтому проверка и ALTER — в одной пишущей транзакции
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if "status" not in [r[1] for r in db.execute("PRAGMA table_info(requests)")]:
+                db.execute("ALTER TABLE requests ADD COLUMN status TEXT NOT NULL DEFAULT 'new'")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_requests_status ON requests(status)")
+            if db.execute("SELECT 1 FROM stats WHERE kind = 'meta'").fetchone() is None:
+                self._rebuild_stats(db)
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        self.counter, self._count = db.execute(
+            "SELECT COALESCE(MAX(id), 0), COUNT(*) FROM requests"
+        ).fetchone()
+        self._change_seq = db.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+        # data_version сравним только в пределах одного соединения
+        self._probe = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._data_version = self._probe.execute("PRAGMA data_version").fetchone()[0]
+
+    # ------------------- Сводка -------------------
+    _ROW_COLUMNS = "name, phone, device, problem, preferred_time, created_at, status"
+
+    def _rebuild_stats(self, db: sqlite3.Connection) -> None:
+        # Один проход по таблице — для баз, созданных до появления сводки
+        stats = RequestStats.from_rows(
+            [None, *row] for row in db.execute(f"SELECT {self._ROW_COLUMNS} FROM requests")
+        )
+        db.execute("DELETE FROM stats")
+        self._apply_stats(db, stats)
+        db.execute("INSERT INTO stats (kind, key, count) VALUES ('meta', 'built', 1)")
+
+    @staticmethod
+    def _apply_stats(db: sqlite3.Connection, delta: RequestStats) -> None:
+        rows = [("total", "", delta.total)]
+        rows += [(kind, key, count) for kind, counter in delta.counters.items() for key, count in counter.items()]
+        db.executemany(
+            "INSERT INTO stats (kind, key, count) VALUES (?, ?, ?) "
+            "ON CONFLICT(kind, key) DO UPDATE SET count = count + excluded.count",
+            rows
+        )
+        db.execute("DELETE FROM stats WHERE count = 0 AND kind != 'meta'")
+
+    def stats(self) -> RequestStats:
+        # Без подготовленных, но ещё не записанных изменений
+        stats = RequestStats()
+        for kind, key, count in self._conn().execute("SELECT kind, key, count FROM stats WHERE kind != 'meta'"):
+            if kind == "total":
+                stats.total = count
+            elif kind in stats.counters:
+                stats.counters[kind][key] = count
+        return stats
+
+    def _conn(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def refresh(self) -> None:
+        # data_version меняется, когда фиксирует другое соединение, в том числе
+        # из другого процесса. Чужие изменения берутся из журнала changes:
+        # добавления дописываются в индекс, удалённые убираются из него.
+        data_version = self._probe.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return
+        self._data_version = data_version
+        with STORAGE_SECONDS.time("refresh"):
+            # Один запрос — одно согласованное чтение: номера идут подряд,
+            # пропуск в начале значит, что нужные записи журнала уже удалены
+            changes = self._probe.execute(
+                "SELECT seq, id, deleted, origin FROM changes WHERE seq > ? ORDER BY seq",
+                (self._change_seq,)
+            ).fetchall()
+            if changes and changes[0][0] > self._change_seq + 1:
+                # Отстали дальше хранимого журнала — пересчитываем целиком
+                max_id, count = self._probe.execute(
+                    "SELECT COALESCE(MAX(id), 0), COUNT(*) FROM requests"
+                ).fetchone()
+                self._count = count + len(self._pending) - len(self._pending_deletes)
+                self.counter = max(self.counter, max_id)
+                if self._index is not None:
+                    # refresh() идёт в потоке цикла — единственном, что меняет индекс
+                    self._index = self._build_index()
+            else:
+                added = []
+                for _, rid, deleted, origin in changes:
+                    if origin == _BOOT_ID or deleted == 2:
+                        continue
+                    if deleted:
+                        if rid not in self._pending_deletes:
+                            self._count -= 1
+                        if self._index is not None:
+                            self._index.discard(rid)
+                    else:
+                        self._count += 1
+                        self.counter = max(self.counter, rid)
+                        added.append(rid)
+                if self._index is not None and added:
+                    for row in self.rows_for(added):
+                        self._index.add(row[0], row[1:6], row[6])
+            if changes:
+                self._change_seq = changes[-1][0]
+        if changes:
+            self.version += 1
+
+    # ------------------- Чтение -------------------
+    def __len__(self) -> int:
+        return self._count
+
+    def get(self, rid: int) -> list[str] | None:
+        if rid in self._pending_deletes:
+            return None
+        pending = self._pending.get(rid)
+        if pending is not None:
+            return pending[1:6]
+        row = self._conn().execute(
+            "SELECT name, phone, device, problem, preferred_time FROM requests WHERE id = ?",
+            (rid,)
+        ).fetchone()
+        return list(row) if row else None
+
+    def created(self, rid: int) -> str:
+        pending = self._pending.get(rid)
+        if pending is not None:
+            return pending[6]
+        row = self._conn().execute("SELECT created_at FROM requests WHERE id = ?", (rid,)).fetchone()
+        return row[0] if row else UNKNOWN_CREATED
+
+    def status(self, rid: int) -> str:
+        status = self._pending_status.get(rid)
+        if status is not None:
+            return status
+        pending = self._pending.get(rid)
+        if pending is not None:
+            return pending[7]
+        row = self._conn().execute("SELECT status FROM requests WHERE id = ?", (rid,)).fetchone()
+        return row[0] if row else STATUS_NEW
+
+    def _overlay(self, row) -> list:
+        row = list(row)
+        status = self._pending_status.get(row[0])
+        if status is not None:
+            row[7] = status
+        return row
+
+    def _visible_pending(self) -> list[list]:
+        return [self._overlay(row) for rid, row in sorted(self._pending.items()) if rid not in self._pending_deletes]
+
+    def rows(self) -> Iterator[list]:
+        pending = self._visible_pending()
+        cur = self._conn().execute(
+            "SELECT id, name, phone, device, problem, preferred_time, created_at, status "
+            "FROM requests ORDER BY id"
+        )
+        for row in cur:
+            if row[0] not in self._pending_deletes and row[0] not in self._pending:
+                yield self._overlay(row)
+        yield from pending
+
+    def _merge_pending(self, db_rows, lo: int, hi: int) -> list[list]:
+        rows = [self._overlay(r) for r in db_rows if r[0] not in self._pending_deletes and r[0] not in self._pending]
+        rows += [row for row in self._visible_pending() if lo < row[0] < hi]
+        rows.sort(key=lambda row: row[0])
+        return rows
+
+    def page(self, after: int = 0, limit: int = 20) -> list[list]:
+        # Запрашиваем с запасом на строки, скрытые неподтверждёнными изменениями
+        cur = self._conn().execute(
+            "SELECT id, name, phone, device, problem, preferred_time, created_at, status "
+            "FROM requests WHERE id > ? ORDER BY id LIMIT ?",
+            (after, limit + len(self._pending_deletes) + len(self._pending))
+        )
+        return self._merge_pending(cur, after, float("inf"))[:limit]
+
+    def page_before(self, before: int, limit: int = 20) -> list[list]:
+        cur = self._conn().execute(
+            "SELECT id, name, phone, device, problem, preferred_time, created_at, status "
+            "FROM requests WHERE id < ? ORDER BY id DESC LIMIT ?",
+            (before, limit + len(self._pending_deletes) + len(self._pending))
+        )
+        rows = self._merge_pending(cur, 0, before)
+        return rows[max(0, len(rows) - limit):]
+
+    def created_between(self, start: str, end: str) -> list[int]:
+        cur = self._conn().execute(
+            "SELECT id FROM requests WHERE created_at >= ? AND created_at < ? ORDER BY created_at, id",
+            (start, end)
+        )
+        ids = [r[0] for r in cur if r[0] not in self._pending_deletes and r[0] not in self._pending]
+        return ids + [row[0] for row in self._visible_pending() if start <= row[6] < end]
+
+    def find_by_phone(self, phone: str) -> list[int]:
+        phone = normalize_phone(phone)
+        cur = self._conn().execute("SELECT id FROM requests WHERE phone_norm = ? ORDER BY id", (phone,))
+        ids = [r[0] for r in cur if r[0] not in self._pending_deletes and r[0] not in self._pending]
+        return ids + [row[0] for row in self._visible_pending() if normalize_phone(row[2]) == phone]
+
+    def ids_with_status(self, *statuses: str) -> list[int]:
+        marks = ",".join("?" * len(statuses))
+        cur = self._conn().execute(f"SELECT id FROM requests WHERE status IN ({marks}) ORDER BY id", statuses)
+        ids = {r[0] for r in cur if r[0] not in self._pending_deletes and r[0] not in self._pending_status}
+        ids.update(row[0] for row in self._visible_pending() if row[7] in statuses)
+        ids.update(rid for rid, status in self._pending_status.items()
+                   if status in statuses and rid not in self._pending_deletes)
+        return sorted(ids)
+
+    def _build_index(self) -> RequestIndex:
+        index = RequestIndex()
+        for row in self.rows():
+            index.add(row[0], row[1:6], row[6])
+        return index
+
+    def ensure_loaded(self) -> None:
+        # Индекс поиска строится до первого апдейта, пока цикл ещё ничего не меняет
+        with self._load_lock:
+            if self._index is None:
+                self._index = self._build_index()
+
+    def search_index(self) -> RequestIndex:
+        if self._index is None:
+            self.ensure_loaded()
+        return self._index
+
+    # ------------------- Запись -------------------
+    def stage_add(self, fields: list[str], created_at: str) -> tuple[int, list]:
+        rid = self._seq.next(self.counter)
+        self.counter = rid
+        record = [rid] + list(fields) + [created_at, STATUS_NEW]
+        self._pending[rid] = record
+        if self._index is not None:
+            self._index.add(rid, record[1:6], created_at)
+        self._count += 1
+        self.version += 1
+        return rid, record
+
+    def stage_delete(self, rid: int, batch: bool = False) -> list | None:
+        fields = self.get(rid)
+        if fields is None:
+            return None
+        if self._index is not None and not batch:
+            self._index.remove(rid, fields, self.created(rid))
+        self._pending_deletes.add(rid)
+        self._count -= 1
+        self.version += 1
+        return [f"{TOMBSTONE_PREFIX}{rid}"]
+
+    def stage_deletes(self, ids: list[int]) -> dict[int, list]:
+        staged = {}
+        for rid in ids:
+            record = self.stage_delete(rid, batch=True)
+            if record is not None:
+                staged[rid] = record
+        if staged and self._index is not None:
+            self._index.remove_many(staged)
+        return staged
+
+    def unstage_deletes(self, staged: dict[int, list]) -> None:
+        for rid in staged:
+            self._pending_deletes.discard(rid)
+            self._count += 1
+            if self._index is not None:
+                self._index.add(rid, self.get(rid), self.created(rid))
+        self.version += 1
+
+    def stage_status(self, rid: int, status: str) -> list | None:
+        if status not in STATUSES or self.get(rid) is None:
+            return None
+        self._pending_status[rid] = status
+        self.version += 1
+        return [f"{STATUS_PREFIX}{rid}", status]
+
+    def write_records(self, records: list[list], fsync: bool = False) -> None:
+        with self._write_lock, STORAGE_SECONDS.time("append"):
+            if self._wdb is None:
+                self._wdb = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            db = self._wdb
+            db.execute(f"PRAGMA synchronous={'FULL' if fsync else 'NORMAL'}")
+            db.execute("BEGIN IMMEDIATE")
+            changes = []
+            delta = RequestStats()
+            try:
+                for record in records:
+                    rid = record[0] if isinstance(record[0], int) else int(record[0][1:])
+                    old = db.execute(f"SELECT {self._ROW_COLUMNS} FROM requests WHERE id = ?", (rid,)).fetchone()
+                    if isinstance(record[0], int):
+                        if old is not None:
+                            delta.remove(old[:5], old[5], old[6])
+                        delta.add(record[1:6], record[6], record[7] if len(record) > 7 else STATUS_NEW)
+                        db.execute(
+                            "INSERT OR REPLACE INTO requests "
+                            "(id, name, phone, device, problem, preferred_time, created_at, status, phone_norm) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (*record[:7], record[7] if len(record) > 7 else STATUS_NEW, normalize_phone(record[2]))
+                        )
+                        changes.append((record[0], 0, _BOOT_ID))
+                    elif record[0].startswith(STATUS_PREFIX):
+                        if old is not None:
+                            delta.move_status(old[6], record[1])
+                        db.execute("UPDATE requests SET status = ? WHERE id = ?", (record[1], rid))
+                        changes.append((rid, 2, _BOOT_ID))
+                    else:
+                        if old is not None:
+                            delta.remove(old[:5], old[5], old[6])
+                        db.execute("DELETE FROM requests WHERE id = ?", (rid,))
+                        changes.append((rid, 1, _BOOT_ID))
+                self._apply_stats(db, delta)
+                db.executemany("INSERT INTO changes (id, deleted, origin) VALUES (?, ?, ?)", changes)
+                db.execute(
+                    "DELETE FROM changes WHERE seq <= last_insert_rowid() - ?", (SQLITE_CHANGES_KEEP,)
+                )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+
+    def committed(self, records: list[list]) -> None:
+        for record in records:
+            if isinstance(record[0], int):
+                self._pending.pop(record[0], None)
+            elif record[0].startswith(STATUS_PREFIX):
+                rid = int(record[0][1:])
+                if self._pending_status.get(rid) == record[1]:
+                    del self._pending_status[rid]
+            else:
+                rid = int(record[0][1:])
+                self._pending.pop(rid, None)
+                self._pending_deletes.discard(rid)
+
+    def close(self) -> None:
+        for db in (getattr(self._local, "db", None), self._wdb, self._probe):
+            if db is not None:
+                db.close()
+        self._seq.close()
+
+# ----------------------------------------------------------------------
+# Миграция и выбор хранилища
+# ----------------------------------------------------------------------
+def migrate_csv_to_sqlite(csv_path: str = CSV_FILE, sqlite_path: str = SQLITE_FILE) -> int:
+    source = CsvStore(csv_path)
+    target = SqliteStore(sqlite_path)
+    try:
+        target.write_records(list(source.rows()))
+    finally:
+        target.close()
+    logging.info(f"Перенесено в SQLite: {len(source)} заявок")
+    return len(source)
+
+def open_store(backend: str = STORAGE_BACKEND, lazy: bool = False) -> RequestStore:
+    # lazy=True — CSV не читается здесь, загрузку запускает ensure_loaded()
+    os.makedirs(DATA_DIR, exist_ok=True)
+    if backend == "sqlite":
+        if not os.path.exists(SQLITE_FILE) and os.path.exists(CSV_FILE):
+            migrate_csv_to_sqlite()
+        return SqliteStore()
+    if backend == "csv":
+        return CsvStore(lazy=lazy)
+    raise ValueError(f"Неизвестное хранилище: {backend}")
+
+if __name__ == "__main__":
+    # python storage.py migrate — разовый перенос CSV в SQLite
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    if sys.argv[1:] == ["migrate"]:
+        migrate_csv_to_sqlite()
+    else:
+        print("Использование: python storage.py migrate")
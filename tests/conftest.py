@@ -0,0 +1,16 @@
+# conftest.py
+# Модули читают настройки при импорте: каталог данных и токен подставляются
+# до первого импорта, чтобы тесты не трогали /data и не ходили в Telegram.
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+_DATA_DIR = tempfile.mkdtemp(prefix="repair-tests-")
+atexit.register(shutil.rmtree, _DATA_DIR, True)
+
+os.environ.setdefault("DATA_DIR", _DATA_DIR)
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ.setdefault("ADMIN_ID", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,232 @@
+# test_app.py
+# Админ-панель: постраничный вывод в боте и в вебе.
+import asyncio
+import json
+import re
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+import app
+from archive import Archive
+from storage import CsvStore
+from writer import GroupCommitWriter
+
+def fields(n: int) -> list[str]:
+    return [f"Имя {n}", f"+7912000{n:04d}", "ноутбук Lenovo", "не включается", "вечером"]
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = CsvStore(str(tmp_path / "repair_requests.csv"))
+    for n in range(1, 6):
+        store.add(fields(n), f"2024-01-0{n} 10:00:00")
+    monkeypatch.setattr(app, "store", store)
+    monkeypatch.setattr(app, "writer", GroupCommitWriter(store))
+    return store
+
+def serve(go):
+    # Приложение привязывается к первому циклу событий — на каждый тест
+    # собирается новое с теми же маршрутами
+    async def main():
+        application = web.Application(middlewares=app.app.middlewares)
+        for route in app.app.router.routes():
+            if route.method != "HEAD":
+                application.router.add_route(route.method, route.resource.canonical, route.handler)
+        async with TestClient(TestServer(application)) as client:
+            result = await go(client)
+            await app.writer.flush()
+            return result
+    return asyncio.run(main())
+
+async def get(client, url: str) -> tuple[int, str]:
+    resp = await client.get(url, allow_redirects=False)
+    return resp.status, resp.headers.get("Location") or await resp.text()
+
+def test_admin_keyboard_pages(store, monkeypatch):
+    monkeypatch.setattr(app, "ADMIN_PAGE_SIZE", 2)
+    kb = app.admin_keyboard()
+    assert [row[0].callback_data for row in kb.inline_keyboard[:-2]] == ["view_1", "view_2"]
+    assert [b.callback_data for b in kb.inline_keyboard[-2]] == ["page_a_2"]
+    assert [b.callback_data for b in kb.inline_keyboard[-1]] == ["sel_a_0"]
+    # Последняя страница опустела — показывается предыдущая
+    store.delete(5)
+    kb = app.admin_keyboard(after=4)
+    assert [row[0].callback_data for row in kb.inline_keyboard[:-2]] == ["view_3", "view_4"]
+    assert [b.callback_data for b in kb.inline_keyboard[-2]] == ["page_b_3"]
+    # Режим выбора: отметки и кнопка массового удаления
+    kb = app.admin_keyboard(after=2, selected={4})
+    assert [row[0].text[0] for row in kb.inline_keyboard[:-2]] == ["☐", "☑"]
+    assert [row[0].callback_data for row in kb.inline_keyboard[:-2]] == ["pick_3_2", "pick_4_2"]
+    assert [b.callback_data for b in kb.inline_keyboard[-1]] == ["bulk_ask", "page_a_2"]
+
+def test_web_panel_requires_admin(store):
+    assert serve(lambda c: get(c, "/admin?user=2"))[0] == 403
+
+def test_web_panel_pages(store):
+    status, text = serve(lambda c: get(c, "/admin?user=1&after=2&limit=2"))
+    assert status == 200
+    assert "<td>3</td>" in text and "<td>4</td>" in text and "<td>5</td>" not in text
+    assert "/admin?user=1&before=3&limit=2" in text
+    assert "/admin?user=1&after=4&limit=2" in text
+    assert "/delete/3?user=1&after=2&limit=2" in text
+
+def test_web_delete_keeps_page(store):
+    async def go(client):
+        redirect = await get(client, "/delete/5?user=1&after=4&limit=2")
+        return redirect, await get(client, redirect[1])
+
+    (status, location), (_, text) = serve(go)
+    assert status == 302
+    assert location == "/admin?user=1&after=4&limit=2"
+    # Страница с единственной заявкой опустела — видна предыдущая и ссылка назад
+    assert "<td>3</td>" in text and "<td>4</td>" in text
+    assert "/admin?user=1&before=3&limit=2" in text
+    assert 5 not in store
+
+def test_web_panel_not_modified(store):
+    async def go(client):
+        first = await client.get("/admin?user=1&limit=2")
+        etag = first.headers["ETag"]
+        same = await client.get("/admin?user=1&limit=2", headers={"If-None-Match": etag})
+        other_page = await client.get("/admin?user=1&limit=3", headers={"If-None-Match": etag})
+        store.delete(1)
+        changed = await client.get("/admin?user=1&limit=2", headers={"If-None-Match": etag})
+        return first.status, same.status, other_page.status, changed.status, changed.headers["ETag"] != etag
+
+    assert serve(go) == (200, 304, 200, 200, True)
+
+def test_web_search(store):
+    store.add(["Анна", "+79005556789", "телевизор", "нет звука", "днём"], "2024-02-01 10:00:00")
+    status, text = serve(lambda c: get(c, "/search?user=1&q=телевизор"))
+    assert status == 200
+    assert "<td>Анна</td>" in text and "<td>Имя 1</td>" not in text
+    assert "Найдено: 1" in text
+    _, text = serve(lambda c: get(c, "/search?user=1&q=%22%3E%3Cb%3E"))
+    assert '"><b>' not in text
+
+def test_metrics_endpoint(store):
+    async def go(client):
+        await get(client, "/admin?user=1")
+        return await get(client, "/metrics")
+    status, text = serve(go)
+    assert status == 200
+    assert 'http_request_seconds_count{route="/admin",method="GET",status="200"}' in text
+    assert "\nrepair_requests 5\n" in text
+
+def test_web_status_keeps_page(store):
+    async def go(client):
+        redirect = await get(client, "/status/3?to=in_progress&user=1&after=2&limit=2")
+        return redirect, await get(client, redirect[1])
+
+    (status, location), (_, text) = serve(go)
+    assert status == 302
+    assert location == "/admin?user=1&after=2&limit=2"
+    assert store.status(3) == "in_progress"
+    assert "/status/3?to=done&user=1&after=2&limit=2" in text
+    assert "/status/3?to=in_progress&" not in text
+
+def test_archive_closed(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "archive", Archive(str(tmp_path / "archive")))
+    store.set_status(2, "done")
+    store.set_status(4, "cancelled")
+    store.set_status(5, "in_progress")
+
+    async def go():
+        moved = await app.archive_closed()
+        await app.writer.flush()
+        return moved
+
+    assert asyncio.run(go()) == 2
+    assert [row[0] for row in store.rows()] == [1, 3, 5]
+    assert [(row[0], row[7]) for row in app.archive.iter_rows()] == [(2, "done"), (4, "cancelled")]
+    # Повторный запуск ничего не переносит
+    assert asyncio.run(go()) == 0
+
+def test_web_panel_escapes_cells(store):
+    store.add(["<script>x</script>", "+79005556789", "ноутбук", "a & b", "днём"], "2024-02-01 10:00:00")
+    _, text = serve(lambda c: get(c, "/admin?user=1&after=5"))
+    assert "<script>x</script>" not in text
+    assert "<td>&lt;script&gt;x&lt;/script&gt;</td>" in text and "<td>a &amp; b</td>" in text
+
+def test_events_replay_since_page(store):
+    async def go(client):
+        _, page = await get(client, "/admin?user=1&after=2&limit=2")
+        since = re.search(r"since=([\w.]+)", page).group(1)
+        # Изменение между отдачей страницы и подпиской не теряется
+        await get(client, "/status/3?to=done&user=1&after=2&limit=2")
+        resp = await client.get(f"/events?user=1&after=2&limit=2&since={since}")
+        lines = []
+        while not lines or not lines[-1].startswith("data:"):
+            lines.append((await resp.content.readline()).decode().rstrip("\n"))
+        resp.close()
+        return lines
+
+    lines = serve(go)
+    assert lines[0] == "retry: 2000"
+    assert lines[-2] == "event: change"
+    data = json.loads(lines[-1][len("data: "):])
+    assert data["id"] == 3
+    assert "/delete/3?user=1&after=2&limit=2" in data["html"] and "Выполнена" in data["html"]
+
+def test_archive_write_failure_rolls_back(store, tmp_path, monkeypatch):
+    class BrokenArchive(Archive):
+        def write(self, rows):
+            raise OSError("диск заполнен")
+
+    monkeypatch.setattr(app, "archive", BrokenArchive(str(tmp_path / "archive")))
+    store.set_status(2, "done")
+    before = list(store.rows())
+    with pytest.raises(OSError):
+        asyncio.run(app.archive_closed())
+    assert list(store.rows()) == before
+    assert store.search("ноутбук") == [5, 4, 3, 2, 1]
+
+def test_stats_endpoint(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "archive", Archive(str(tmp_path / "archive")))
+    store.set_status(1, "done")
+    store.set_status(2, "in_progress")
+    asyncio.run(app.archive_closed())
+    status, text = serve(lambda c: get(c, "/stats?user=1&days=3"))
+    assert status == 200
+    report = json.loads(text)
+    assert report["total"] == 5 and report["backlog"] == 4
+    assert report["by_status"] == {"new": 3, "in_progress": 1, "done": 1}
+    assert report["by_device"] == {"ноутбук": 5}
+    assert len(report["per_day"]) == 3
+
+@pytest.mark.parametrize("text, expected", [
+    ("12 15 20", ([12, 15, 20], None, "")),
+    ("12,15, 20", ([12, 15, 20], None, "")),
+    ("100-200", ([], (100, 200), "")),
+    ("100 - 200", ([], (100, 200), "")),
+    ("до 2024-01-01", ([], None, "2024-01-01")),
+    ("<2024-01-01", ([], None, "2024-01-01")),
+    ("5 100-200 до 2024-01-01", ([5], (100, 200), "2024-01-01")),
+])
+def test_parse_bulk(text, expected):
+    assert app.parse_bulk(text) == expected
+
+@pytest.mark.parametrize("text", ["", "  ", "12 abc", "до вчера"])
+def test_parse_bulk_rejects(text):
+    assert app.parse_bulk(text) is None
+
+def test_bulk_targets(store):
+    assert app.bulk_targets([1, 9]) == [1]
+    assert app.bulk_targets([], (4, 2)) == [2, 3, 4]
+    # Диапазон и дата сужают друг друга, явно выбранные id добавляются
+    assert app.bulk_targets([5], (1, 4), "2024-01-03") == [1, 2, 5]
+
+def test_web_bulk_delete_keeps_page(store):
+    async def go(client):
+        _, page = await get(client, "/admin?user=1&after=2&limit=2")
+        resp = await client.post("/bulk_delete?user=1&after=2&limit=2", allow_redirects=False,
+                                 data=[("id", "3"), ("id", "4"), ("before", "2024-01-02")])
+        return page, resp.status, resp.headers["Location"]
+
+    page, status, location = serve(go)
+    assert "action=\"/bulk_delete?user=1&after=2&limit=2\"" in page
+    assert "name='id' value='3'" in page
+    assert status == 302
+    assert location == "/admin?user=1&after=2&limit=2"
+    assert [row[0] for row in store.rows()] == [2, 5]
@@ -0,0 +1,53 @@
+# test_archive.py
+# Архив закрытых заявок: сегменты по месяцам, чтение и поиск.
+import os
+
+import pytest
+
+from archive import Archive
+
+def row(n: int, month: str, device: str = "ноутбук Lenovo", status: str = "done") -> list:
+    return [n, f"Имя {n}", f"+7912000{n:04d}", device, "не включается", "вечером", f"{month}-05 10:00:00", status]
+
+@pytest.fixture
+def archive(tmp_path):
+    return Archive(str(tmp_path / "archive"))
+
+def test_segments_by_month(archive):
+    archive.write([row(3, "2024-02"), row(1, "2024-01"), row(2, "2024-01")])
+    names = sorted(os.path.basename(seg.path).rsplit("_", 1)[0] for seg in archive.segments())
+    assert names == ["2024-01_1-2", "2024-02_3-3"]
+    assert archive.get(3) == [str(v) for v in row(3, "2024-02")]
+    assert archive.get(4) is None
+
+def test_iter_rows_filters(archive):
+    archive.write([row(n, "2024-01") for n in (1, 2)] + [row(n, "2024-02") for n in (3, 4)])
+    assert [r[0] for r in archive.iter_rows()] == [1, 2, 3, 4]
+    assert [r[0] for r in archive.iter_rows(2, 3)] == [2, 3]
+    assert [r[0] for r in archive.iter_rows(start="2024-02-01", end="2024-03-01")] == [3, 4]
+
+def test_newer_copy_wins(archive):
+    # Перенос прервался до надгробия — заявка попала в архив дважды
+    archive.write([row(1, "2024-01", status="cancelled"), row(2, "2024-01")])
+    archive.write([row(1, "2024-01", status="done")])
+    assert [r[0] for r in archive.iter_rows()] == [1, 2]
+    assert next(archive.iter_rows())[7] == "done"
+    assert archive.search("ноутбук") == [[2, *row(2, "2024-01")[1:]], [1, *row(1, "2024-01")[1:]]]
+
+def test_search_by_date_reads_matching_months(archive):
+    archive.write([row(1, "2024-01", "телевизор"), row(2, "2024-02", "телевизор")])
+    assert [r[0] for r in archive.search("2024-02-01..2024-02-28")] == [2]
+    assert [r[0] for r in archive.search("телевизор", limit=1)] == [2]
+    # Новый сегмент другого процесса виден без перезапуска
+    other = Archive(archive.path)
+    other.write([row(3, "2024-03", "телевизор")])
+    assert [r[0] for r in archive.search("телевизор")] == [3, 2, 1]
+
+def test_stats_count_duplicates_once(archive):
+    archive.write([row(1, "2024-01", status="cancelled"), row(2, "2024-01")])
+    archive.write([row(1, "2024-01", status="done"), row(3, "2024-02")])
+    stats = archive.stats().to_dict()
+    assert stats["total"] == 3
+    assert stats["status"] == {"done": 3}
+    # Сводки сегментов сохраняются рядом и читаются другим процессом
+    assert Archive(archive.path).stats().to_dict() == stats
@@ -0,0 +1,65 @@
+# test_events.py
+# Шина изменений для живой веб-панели: рассылка, догон по Last-Event-ID, переполнение.
+import asyncio
+
+import events
+from events import EventBus
+
+def drain(sub) -> list:
+    items = []
+    while not sub.queue.empty():
+        items.append(sub.queue.get_nowait())
+    return items
+
+def test_publish_to_subscribers():
+    async def go():
+        bus = EventBus()
+        first, missed = bus.subscribe()
+        second, _ = bus.subscribe()
+        bus.publish("add", 7)
+        bus.unsubscribe(second)
+        bus.publish("delete", 7)
+        return missed, drain(first), drain(second)
+
+    missed, first, second = asyncio.run(go())
+    assert missed == []
+    assert first == [(1, "add", 7), (2, "delete", 7)]
+    assert second == [(1, "add", 7)]
+
+def test_resume_from_last_event_id():
+    async def go():
+        bus = EventBus(replay=3)
+        for rid in range(1, 4):
+            bus.publish("change", rid)
+        results = [bus.subscribe(bus.event_id(n))[1] for n in (1, 3)]
+        bus.publish("change", 4)
+        bus.publish("change", 5)
+        # Событие 2 уже вытеснено из кольца — догнать нельзя
+        results.append(bus.subscribe(bus.event_id(1))[1])
+        results.append(bus.subscribe(bus.event_id(2))[1])
+        return results
+
+    after_one, up_to_date, too_old, from_two = asyncio.run(go())
+    assert after_one == [(2, "change", 2), (3, "change", 3)]
+    assert up_to_date == []
+    assert too_old is None
+    assert from_two == [(3, "change", 3), (4, "change", 4), (5, "change", 5)]
+
+def test_foreign_or_future_id_reloads():
+    async def go():
+        bus = EventBus()
+        bus.publish("add", 1)
+        return [bus.subscribe(last)[1] for last in ("ffffff.1", f"{events._BOOT}.5", f"{events._BOOT}.x")]
+
+    assert asyncio.run(go()) == [None, None, None]
+
+def test_slow_subscriber_overflows():
+    async def go():
+        bus = EventBus(queue_size=2)
+        slow, _ = bus.subscribe()
+        for rid in range(3):
+            bus.publish("add", rid)
+        return slow.overflowed, slow in bus.subscribers, drain(slow)
+
+    # Очередь отставшей подписки сброшена, вместо событий — признак закрытия
+    assert asyncio.run(go()) == (True, False, [None])
@@ -0,0 +1,144 @@
+# test_export.py
+# Выгрузка: разбор фильтра, потоковый CSV со сжатием и отдача с Range.
+import asyncio
+import csv
+import gzip
+import io
+import zipfile
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+import export
+from app import send_export
+from export import ExportFilter, iter_csv
+from storage import CSV_HEADER, CsvStore, SqliteStore
+
+def fields(n: int) -> list[str]:
+    return [f"Имя {n}", f"+7912000{n:04d}", "ноутбук Lenovo", "не включается", "вечером"]
+
+def created(n: int) -> str:
+    return f"2024-01-{n:02d} 10:00:00"
+
+# ------------------- Фильтр -------------------
+def test_filter_parse():
+    f = ExportFilter.parse("100..200 2024-01-01..2024-01-31 gz")
+    assert (f.id_from, f.id_to) == (100, 200)
+    assert (f.date_from, f.date_to) == ("2024-01-01", "2024-01-31")
+    assert f.compression == "gzip"
+
+def test_filter_parse_open_ranges():
+    f = ExportFilter.parse("#100.. 2024-03-01")
+    assert (f.id_from, f.id_to) == (100, None)
+    assert (f.date_from, f.date_to) == ("2024-03-01", "2024-03-01")
+    f = ExportFilter.parse("..50 2024-03-01.. ZIP")
+    assert (f.id_from, f.id_to) == (None, 50)
+    assert (f.date_from, f.date_to) == ("2024-03-01", None)
+    assert f.compression == "zip"
+    assert f.filename() == "repair_requests_-50_2024-03-01_.csv.zip"
+    assert ExportFilter.parse("").compression is None
+
+@pytest.mark.parametrize("text", ["abc", "100..200 xz", "2024-13"])
+def test_filter_parse_rejects(text):
+    with pytest.raises(ValueError):
+        ExportFilter.parse(text)
+
+# ------------------- CSV -------------------
+@pytest.fixture(params=["csv", "sqlite"])
+def store(request, tmp_path, monkeypatch):
+    # Маленькие куски — проверяется и склейка страниц
+    monkeypatch.setattr(export, "EXPORT_CHUNK_ROWS", 2)
+    if request.param == "csv":
+        store = CsvStore(str(tmp_path / "repair_requests.csv"))
+    else:
+        store = SqliteStore(str(tmp_path / "repair_requests.sqlite3"))
+    for n in range(1, 8):
+        store.add(fields(n), created(n))
+    store.delete(3)
+    yield store
+    store.close()
+
+def exported(store, f: ExportFilter) -> list[list[str]]:
+    data = b"".join(iter_csv(store, f))
+    if f.compression == "gzip":
+        data = gzip.decompress(data)
+    elif f.compression == "zip":
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            data = archive.read(f.filename()[:-len(".zip")])
+    return list(csv.reader(io.StringIO(data.decode("utf-8"), newline="")))
+
+@pytest.mark.parametrize("compression", [None, "gzip", "zip"])
+def test_export_all(store, compression):
+    lines = exported(store, ExportFilter(compression=compression))
+    assert lines[0] == CSV_HEADER
+    assert lines[1:] == [[str(v) for v in row] for row in store.rows()]
+
+def test_export_filters(store):
+    assert [line[0] for line in exported(store, ExportFilter.parse("2..5"))[1:]] == ["2", "4", "5"]
+    assert [line[0] for line in exported(store, ExportFilter.parse("5.."))[1:]] == ["5", "6", "7"]
+    rows = exported(store, ExportFilter.parse("2024-01-02..2024-01-04"))[1:]
+    assert [line[0] for line in rows] == ["2", "4"]
+    rows = exported(store, ExportFilter.parse("..4 2024-01-04.."))[1:]
+    assert [line[0] for line in rows] == ["4"]
+
+# ------------------- Range -------------------
+BODY = bytes(range(256)) * 4
+ETAG = '"v1"'
+
+def fetch(path, headers=None):
+    async def handler(request):
+        return await send_export(request, path, ETAG, ExportFilter())
+
+    async def go():
+        application = web.Application()
+        application.router.add_get("/export", handler)
+        async with TestClient(TestServer(application)) as client:
+            resp = await client.get("/export", headers=headers or {})
+            return resp.status, resp.headers, await resp.read()
+    return asyncio.run(go())
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "export.csv"
+    path.write_bytes(BODY)
+    return str(path)
+
+def test_full(path):
+    status, headers, body = fetch(path)
+    assert status == 200
+    assert body == BODY
+    assert headers["ETag"] == ETAG
+    assert headers["Accept-Ranges"] == "bytes"
+
+def test_not_modified(path):
+    status, _, body = fetch(path, {"If-None-Match": ETAG})
+    assert status == 304
+    assert body == b""
+
+@pytest.mark.parametrize("rng, start, stop", [
+    ("bytes=0-99", 0, 100),
+    ("bytes=1000-", 1000, len(BODY)),
+    ("bytes=-24", len(BODY) - 24, len(BODY)),
+    ("bytes=1000-5000", 1000, len(BODY)),
+])
+def test_range(path, rng, start, stop):
+    status, headers, body = fetch(path, {"Range": rng})
+    assert status == 206
+    assert body == BODY[start:stop]
+    assert headers["Content-Range"] == f"bytes {start}-{stop - 1}/{len(BODY)}"
+
+@pytest.mark.parametrize("rng", ["bytes=5000-", "bytes=abc"])
+def test_range_not_satisfiable(path, rng):
+    status, headers, _ = fetch(path, {"Range": rng})
+    assert status == 416
+    assert headers["Content-Range"] == f"bytes */{len(BODY)}"
+
+def test_if_range(path):
+    # Файл сменился — Range игнорируется, отдаётся целиком
+    status, _, body = fetch(path, {"Range": "bytes=0-99", "If-Range": '"v0"'})
+    assert status == 200
+    assert body == BODY
+    status, _, body = fetch(path, {"Range": "bytes=0-99", "If-Range": ETAG})
+    assert status == 206
+    assert body == BODY[:100]
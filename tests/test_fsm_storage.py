@@ -0,0 +1,94 @@
+# test_fsm_storage.py
+# Черновики заявок в SQLite: переживают перезапуск, истекают по TTL,
+# кэш в памяти ограничен.
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+import fsm_storage
+from fsm_storage import SQLiteStorage
+
+def key(user: int) -> StorageKey:
+    return StorageKey(bot_id=42, chat_id=user, user_id=user)
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(fsm_storage, "time", SimpleNamespace(time=clock))
+    return clock
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "fsm.sqlite3")
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_draft_survives_restart(path, clock):
+    async def go():
+        storage = SQLiteStorage(path)
+        await storage.set_state(key(1), "RepairRequest:phone")
+        await storage.set_data(key(1), {"name": "Иван"})
+        await storage.close()
+        storage = SQLiteStorage(path)
+        result = await storage.get_state(key(1)), await storage.get_data(key(1)), await storage.get_data(key(2))
+        await storage.close()
+        return result
+
+    assert run(go()) == ("RepairRequest:phone", {"name": "Иван"}, {})
+
+def test_idle_draft_expires(path, clock):
+    async def go():
+        storage = SQLiteStorage(path, ttl=3600)
+        await storage.set_state(key(1), "RepairRequest:phone")
+        await storage.set_data(key(1), {"name": "Иван"})
+        clock.now += 1800
+        alive = await storage.get_state(key(1))
+        await storage.set_data(key(1), {"name": "Иван", "phone": "+79120000001"})
+        clock.now += 3000  # с последнего изменения меньше часа
+        still_alive = await storage.get_state(key(1))
+        clock.now += 3601
+        expired = await storage.get_state(key(1)), await storage.get_data(key(1))
+        row = storage._select(storage._key(key(1)))
+        await storage.close()
+        return alive, still_alive, expired, row
+
+    assert run(go()) == ("RepairRequest:phone", "RepairRequest:phone", (None, {}), None)
+
+def test_sweep_removes_only_expired(path, clock):
+    async def go():
+        storage = SQLiteStorage(path, ttl=3600)
+        await storage.set_data(key(1), {"name": "Иван"})
+        clock.now += 3000
+        await storage.set_data(key(2), {"name": "Пётр"})
+        clock.now += 1000
+        removed = await storage.sweep()
+        keys = list(storage.cache)
+        await storage.close()
+        return removed, keys
+
+    removed, keys = run(go())
+    assert removed == 1
+    assert keys == [SQLiteStorage._key(key(2))]
+
+def test_cache_is_bounded(path, clock):
+    async def go():
+        storage = SQLiteStorage(path, cache_size=2)
+        for user in (1, 2, 3):
+            await storage.set_data(key(user), {"user": user})
+        cached = len(storage.cache)
+        # Вытесненный из кэша черновик читается из базы
+        data = await storage.get_data(key(1))
+        await storage.close()
+        return cached, data
+
+    assert run(go()) == (2, {"user": 1})
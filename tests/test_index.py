@@ -0,0 +1,54 @@
+# test_index.py
+# Поиск по индексам в памяти: слова, телефон (полный и последние цифры), даты.
+import pytest
+
+from index import RequestIndex, normalize_phone, tokenize
+
+@pytest.fixture
+def index():
+    index = RequestIndex()
+    index.add(1, ["Иван", "8 (912) 345-67-89", "Ноутбук Lenovo", "не включается", "утром"], "2024-01-05 10:00:00")
+    index.add(2, ["Пётр", "+79001112233", "ноутбук HP", "разбит экран", "вечером"], "2024-01-20 12:00:00")
+    index.add(3, ["Анна", "+79005556789", "Телевизор", "не включается", "днём"], "2024-02-01 09:00:00")
+    return index
+
+def test_normalize():
+    assert normalize_phone("8 (912) 345-67-89") == normalize_phone("+7 912 345 67 89") == "79123456789"
+    assert tokenize("Ноутбук, ёлка и Wi-Fi") == {"ноутбук", "елка", "wi", "fi"}
+
+def test_search_words(index):
+    assert index.search("ноутбук") == [2, 1]
+    assert index.search("не включается") == [3, 1]
+    assert index.search("ноутбук включается") == [1]
+    assert index.search("ёж") == []
+    assert index.search("!") == []
+
+def test_search_phone(index):
+    assert index.search("+7 912 345 67 89") == [1]
+    assert index.search("89123456789") == [1]
+    assert index.search("6789") == [3, 1]
+    assert index.search("5556789") == [3]
+
+def test_search_dates(index):
+    assert index.search("2024-01-20") == [2]
+    assert index.search("2024-01-01..2024-01-31") == [2, 1]
+    assert index.search("2024-01-01..2024-12-31", limit=2) == [3, 2]
+
+def test_search_after_remove(index):
+    index.remove(1, ["Иван", "8 (912) 345-67-89", "Ноутбук Lenovo", "не включается", "утром"], "2024-01-05 10:00:00")
+    assert index.search("ноутбук") == [2]
+    assert index.search("6789") == [3]
+    assert index.search("2024-01-01..2024-01-31") == [2]
+    assert index.find_by_phone("89123456789") == []
+
+def test_remove_many_matches_single_removes(index):
+    single = RequestIndex()
+    for rid, (fields, created) in index.entries.items():
+        single.add(rid, fields, created)
+    for rid in (1, 3):
+        single.discard(rid)
+    index.remove_many([1, 3, 7])
+    for name in ("phones", "entries", "by_phone", "by_phone_tail", "by_token", "by_created"):
+        assert getattr(index, name) == getattr(single, name)
+    assert index.search("включается") == []
+    assert index.search("ноутбук") == [2]
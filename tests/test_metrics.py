@@ -0,0 +1,48 @@
+# test_metrics.py
+# Текстовый формат Prometheus для счётчиков, датчиков и гистограмм.
+import asyncio
+
+import metrics
+
+def test_counter_and_gauge_render():
+    counter = metrics.Counter("errors_total", "Ошибки", ("handler",))
+    counter.inc("start")
+    counter.inc("start", amount=2)
+    counter.inc('say "hi"')
+    assert counter.render() == [
+        'errors_total{handler="start"} 3.0',
+        'errors_total{handler="say \\"hi\\""} 1.0',
+    ]
+    gauge = metrics.Gauge("depth", "Очередь", ("queue",))
+    gauge.set(5, "write")
+    gauge.set(2, "write")
+    assert gauge.render() == ['depth{queue="write"} 2']
+    gauge.clear()
+    assert gauge.render() == []
+
+def test_histogram_buckets_are_cumulative():
+    hist = metrics.Histogram("latency_seconds", "Задержка", ("op",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        hist.observe(value, "read")
+    assert hist.render() == [
+        'latency_seconds_bucket{op="read",le="0.1"} 2',
+        'latency_seconds_bucket{op="read",le="1.0"} 3',
+        'latency_seconds_bucket{op="read",le="+Inf"} 4',
+        'latency_seconds_sum{op="read"} 3.65',
+        'latency_seconds_count{op="read"} 4',
+    ]
+
+def test_registry_runs_collectors():
+    registry = metrics.Registry()
+    gauge = registry.register(metrics.Gauge("items", "Записи"))
+
+    @registry.collector
+    async def collect():
+        gauge.set(7)
+
+    @registry.collector
+    async def broken():
+        raise RuntimeError("нет данных")
+
+    text = asyncio.run(registry.render())
+    assert text == "# HELP items Записи\n# TYPE items gauge\nitems 7\n"
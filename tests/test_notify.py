@@ -0,0 +1,73 @@
+# test_notify.py
+# Уведомления администратору: сводка при очереди, повтор после
+# RetryAfter и ограниченное ожидание при остановке.
+import asyncio
+import time
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from notify import MESSAGE_LIMIT, NotificationDispatcher
+
+class FakeBot:
+    def __init__(self, failures: list[Exception] = (), delay: float = 0):
+        self.sent: list[tuple[int, str]] = []
+        self.failures = list(failures)
+        self.delay = delay
+
+    async def send_message(self, chat_id: int, text: str) -> None:
+        await asyncio.sleep(self.delay)
+        if self.failures:
+            raise self.failures.pop(0)
+        self.sent.append((chat_id, text))
+
+def run(bot: FakeBot, texts: list[str], **kwargs) -> list[str]:
+    async def go():
+        dispatcher = NotificationDispatcher(bot, 7, **kwargs)
+        for text in texts:
+            dispatcher.notify(text)
+        await dispatcher.close(timeout=5)
+    asyncio.run(go())
+    assert all(chat_id == 7 for chat_id, _ in bot.sent)
+    return [text for _, text in bot.sent]
+
+def test_single_notification():
+    assert run(FakeBot(), ["НОВАЯ ЗАЯВКА #1"]) == ["НОВАЯ ЗАЯВКА #1"]
+
+def test_short_queue_is_not_merged():
+    assert run(FakeBot(), ["#1", "#2"], digest_min=3) == ["#1", "#2"]
+
+def test_backlog_becomes_digest():
+    sent = run(FakeBot(), [f"#{n}" for n in range(5)], digest_min=3)
+    assert len(sent) == 1
+    assert sent[0].startswith("Сводка уведомлений (5):")
+    assert [sent[0].index(f"#{n}") for n in range(5)] == sorted(sent[0].index(f"#{n}") for n in range(5))
+
+def test_digest_fits_one_message():
+    texts = [f"#{n} " + "x" * 1500 for n in range(7)]
+    sent = run(FakeBot(), texts, rate=1000, burst=1, digest_min=3)
+    assert all(len(text) <= MESSAGE_LIMIT for text in sent)
+    assert "".join(sent).count("x" * 1500) == 7
+
+def test_retry_after_is_respected():
+    flood = TelegramRetryAfter(method=SendMessage(chat_id=7, text="x"), message="flood", retry_after=0)
+    bot = FakeBot(failures=[flood])
+    assert run(bot, ["#1"], rate=1000) == ["#1"]
+
+def test_no_chat_no_messages():
+    async def go():
+        dispatcher = NotificationDispatcher(FakeBot(), None)
+        dispatcher.notify("#1")
+        assert not dispatcher.pending
+        await dispatcher.close()
+    asyncio.run(go())
+
+def test_close_does_not_wait_forever():
+    async def go():
+        dispatcher = NotificationDispatcher(FakeBot(delay=60), 7)
+        dispatcher.notify("#1")
+        await asyncio.sleep(0.01)
+        start = time.monotonic()
+        await dispatcher.close(timeout=0.2)
+        return time.monotonic() - start
+    assert asyncio.run(go()) < 1
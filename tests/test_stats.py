@@ -0,0 +1,52 @@
+# test_stats.py
+# Сводка /stats: разбор полей заявки и счётчики, которые ведёт хранилище.
+from datetime import date
+
+import pytest
+
+from stats import RequestStats, device_kind, time_bucket
+
+@pytest.mark.parametrize("text, bucket", [
+    ("после 14:00", "day"),
+    ("9", "morning"),
+    ("к 18:30", "evening"),
+    ("утром в субботу", "morning"),
+    ("Вечером", "evening"),
+    ("в обед", "day"),
+    ("днём", "day"),
+    ("в 25 часов", "other"),
+    ("когда угодно", "other"),
+])
+def test_time_bucket(text, bucket):
+    assert time_bucket(text) == bucket
+
+def test_device_kind():
+    assert device_kind("Смартфон Samsung") == "смартфон"
+    assert device_kind("  ") == "unknown"
+
+def request(device: str, when: str) -> list[str]:
+    return ["Иван", "+79001112233", device, "не включается", when]
+
+def test_counters_return_to_zero():
+    stats = RequestStats()
+    stats.add(request("ноутбук HP", "утром"), "2024-01-05 10:00:00", "new")
+    stats.add(request("Телевизор", "вечером"), "2024-01-06 10:00:00", "new")
+    stats.move_status("new", "done")
+    stats.remove(request("ноутбук HP", "утром"), "2024-01-05 10:00:00", "new")
+    assert stats.to_dict() == {
+        "total": 1, "day": {"2024-01-06": 1}, "device": {"телевизор": 1},
+        "time": {"evening": 1}, "status": {"done": 1},
+    }
+    assert RequestStats.from_dict(stats.to_dict()).to_dict() == stats.to_dict()
+
+def test_report():
+    hot, archived = RequestStats(), RequestStats()
+    hot.add(request("ноутбук", "днём"), "2024-03-10 10:00:00", "in_progress")
+    archived.add(request("ноутбук", "днём"), "2024-03-01 10:00:00", "done")
+    report = hot.merge(archived).report(days=3, today=date(2024, 3, 10))
+    assert report["total"] == 2 and report["backlog"] == 1
+    assert report["per_day"] == {"2024-03-08": 0, "2024-03-09": 0, "2024-03-10": 1}
+    assert report["by_device"] == {"ноутбук": 2}
+    assert report["by_time"] == {"morning": 0, "day": 2, "evening": 0, "other": 0}
+    # Слияние не меняет исходные сводки
+    assert hot.total == 1 and archived.total == 1
@@ -0,0 +1,381 @@
+# test_storage.py
+# Хранилища заявок: CSV-журнал с надгробиями и SQLite ведут себя одинаково.
+import asyncio
+import csv
+import os
+import shutil
+
+import pytest
+
+import storage
+from stats import RequestStats
+from storage import CSV_HEADER, CsvStore, SqliteStore, migrate_csv_to_sqlite
+
+def fields(n: int) -> list[str]:
+    return [f"Имя {n}", f"+7912000{n:04d}", "ноутбук Lenovo", "не включается", "вечером"]
+
+def created(n: int) -> str:
+    return f"2024-01-{n:02d} 10:00:00"
+
+def journal(path: str) -> list[list[str]]:
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.reader(f))[1:]
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "repair_requests.csv")
+
+@pytest.fixture(params=["csv", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "csv":
+        store = CsvStore(str(tmp_path / "repair_requests.csv"))
+    else:
+        store = SqliteStore(str(tmp_path / "repair_requests.sqlite3"))
+    yield store
+    store.close()
+
+# ------------------- Общее поведение -------------------
+def test_add_get_delete(store):
+    ids = [store.add(fields(n), created(n)) for n in range(1, 5)]
+    assert ids == [1, 2, 3, 4]
+    assert len(store) == 4
+    assert store.get(2) == fields(2)
+    assert store.created(2) == created(2)
+    assert store.delete(2)
+    assert not store.delete(2)
+    assert 2 not in store and 3 in store
+    assert store.get(2) is None
+    assert store.created(2) == storage.UNKNOWN_CREATED
+    assert [row[0] for row in store.rows()] == [1, 3, 4]
+    assert list(store.rows())[0] == [1, *fields(1), created(1), "new"]
+
+def test_lookups(store):
+    for n in range(1, 5):
+        store.add(fields(n), created(n))
+    store.add(fields(1), created(9))
+    store.delete(3)
+    assert store.find_by_phone("8 (912) 000-00-01") == [1, 5]
+    assert store.find_by_phone("+79120000003") == []
+    assert store.created_between(created(2), created(9)) == [2, 4]
+    assert store.created_between("", "2025") == [1, 2, 4, 5]
+
+def test_migrate_csv_to_sqlite(path, tmp_path):
+    source = CsvStore(path)
+    for n in range(1, 5):
+        source.add(fields(n), created(n))
+    source.delete(2)
+    assert migrate_csv_to_sqlite(path, str(tmp_path / "db.sqlite3")) == 3
+    target = SqliteStore(str(tmp_path / "db.sqlite3"))
+    assert list(target.rows()) == list(source.rows())
+    target.close()
+
+# ------------------- CSV-журнал -------------------
+def test_load_applies_tombstones(path):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for n in (1, 2, 3):
+            writer.writerow([n, *fields(n), created(n)])
+        writer.writerows([["-2"], [3, *fields(3), created(3)], ["-9"]])
+    store = CsvStore(path)
+    assert [row[0] for row in store.rows()] == [1, 3]
+    # удалённая строка и её надгробие, перезаписанная строка, лишнее надгробие
+    assert store.dead_rows == 4
+    assert store.add(fields(4), created(4)) == 4
+
+def test_delete_appends_tombstone(path):
+    store = CsvStore(path)
+    for n in (1, 2, 3):
+        store.add(fields(n), created(n))
+    store.delete(2)
+    assert journal(path)[-1] == ["-2"]
+    assert store.dead_rows == 2
+    assert list(CsvStore(path).rows()) == list(store.rows())
+
+def test_compact_without_loop(path, monkeypatch):
+    monkeypatch.setattr(storage, "CSV_COMPACT_MIN_DEAD", 4)
+    store = CsvStore(path)
+    for n in (1, 2, 3):
+        store.add(fields(n), created(n))
+    store.delete(1)
+    store.delete(2)  # мёртвых строк 4 — файл переписан сразу
+    assert store.dead_rows == 0
+    assert journal(path) == [[str(v) for v in [3, *fields(3), created(3), "new"]]]
+
+def test_background_compaction(path, monkeypatch):
+    monkeypatch.setattr(storage, "CSV_COMPACT_MIN_DEAD", 4)
+    store = CsvStore(path)
+    for n in (1, 2, 3):
+        store.add(fields(n), created(n))
+
+    async def go():
+        store.delete(1)
+        store.delete(2)
+        assert store._compact_from is not None
+        # Строка, дописанная во время сжатия, попадает в новый файл
+        store.add(fields(4), created(4))
+        await asyncio.gather(*storage._background_tasks)
+
+    asyncio.run(go())
+    assert store.dead_rows == 0
+    assert [row[0] for row in journal(path)] == ["3", "4"]
+    assert list(CsvStore(path).rows()) == list(store.rows())
+
+def test_statuses(store):
+    for n in (1, 2, 3):
+        store.add(fields(n), created(n))
+    assert store.status(1) == "new"
+    assert store.set_status(1, "done")
+    assert store.set_status(2, "in_progress")
+    assert store.set_status(3, "cancelled")
+    assert not store.set_status(2, "lost")
+    assert not store.set_status(9, "done")
+    assert store.ids_with_status("done", "cancelled") == [1, 3]
+    assert [row[7] for row in store.rows()] == ["done", "in_progress", "cancelled"]
+    reopened = type(store)(store.path)
+    assert list(reopened.rows()) == list(store.rows())
+    reopened.close()
+
+def test_stats_follow_changes(store):
+    for n in range(1, 5):
+        store.add(fields(n), created(n))
+    store.delete(2)
+    store.set_status(3, "done")
+    expected = RequestStats.from_rows(store.rows()).to_dict()
+    assert store.stats().to_dict() == expected
+    assert expected["status"] == {"new": 2, "done": 1}
+    reopened = type(store)(store.path)
+    assert reopened.stats().to_dict() == expected
+    reopened.close()
+
+def test_unstage_deletes(store):
+    for n in (1, 2, 3):
+        store.add(fields(n), created(n))
+    store.set_status(2, "done")
+    before = list(store.rows())
+    staged = {rid: store.stage_delete(rid) for rid in (1, 2)}
+    assert len(store) == 1 and store.search("ноутбук") == [3]
+    store.unstage_deletes(staged)
+    assert list(store.rows()) == before
+    assert store.search("ноутбук") == [3, 2, 1]
+    assert store.stats().to_dict() == RequestStats.from_rows(before).to_dict()
+
+def test_stage_deletes(store):
+    for n in range(1, 7):
+        store.add(fields(n), created(n))
+    store.search("ноутбук")
+    staged = store.stage_deletes([5, 2, 9, 2, 4])
+    assert sorted(staged) == [2, 4, 5]
+    assert staged[2] == [f"{storage.TOMBSTONE_PREFIX}2"]
+    assert len(store) == 3
+    assert [row[0] for row in store.page(0, 10)] == [1, 3, 6]
+    assert store.search("ноутбук") == [6, 3, 1]
+    assert store.created_between("", "2025") == [1, 3, 6]
+    store.write_records(list(staged.values()))
+    store.committed(list(staged.values()))
+    reopened = type(store)(store.path)
+    assert list(reopened.rows()) == list(store.rows())
+    reopened.close()
+
+def test_journal_record_kinds(path):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for n in (1, 2, 3):
+            writer.writerow([n, *fields(n), created(n), "new"])
+        writer.writerow(["-2"])
+        writer.writerow(["~3", "done"])
+        writer.writerow(["~1", "in_progress"])
+        writer.writerow(["~1", "cancelled"])
+    store = CsvStore(path)
+    assert [row[0] for row in store.rows()] == [1, 3]
+    assert (store.status(1), store.status(3)) == ("cancelled", "done")
+    assert store.dead_rows == 5
+    # Сжатие сворачивает смены статуса в строки заявок
+    store.compact()
+    assert journal(path) == [[str(v) for v in [1, *fields(1), created(1), "cancelled"]],
+                             [str(v) for v in [3, *fields(3), created(3), "done"]]]
+
+def test_pages(store):
+    for n in range(1, 8):
+        store.add(fields(n), created(n))
+    store.delete(4)
+    assert [row[0] for row in store.page(0, 3)] == [1, 2, 3]
+    assert [row[0] for row in store.page(3, 3)] == [5, 6, 7]
+    assert store.page(7, 3) == []
+    assert [row[0] for row in store.page_before(6, 3)] == [2, 3, 5]
+    assert [row[0] for row in store.page_before(2, 3)] == [1]
+    assert store.page(0, 1) == [[1, *fields(1), created(1), "new"]]
+
+def test_version_tracks_visible_changes(store):
+    start = store.version
+    rid = store.add(fields(1), created(1))
+    assert store.version > start
+    seen = store.version
+    assert store.etag(0, None, 50) == store.etag(0, None, 50) != store.etag(0, None, 20)
+    assert not store.delete(rid + 1)
+    assert store.version == seen
+    store.delete(rid)
+    assert store.version > seen
+
+# ------------------- Снимок CSV -------------------
+def test_snapshot_plus_tail(path):
+    store = CsvStore(path)
+    for n in (1, 2, 3):
+        store.add(fields(n), created(n))
+    store.delete(2)
+    store.set_status(3, "done")
+    store.snapshot()
+    store.add(fields(4), created(4))
+    store.delete(1)
+    store.set_status(4, "in_progress")
+    loaded = CsvStore(path)
+    assert loaded._since_snapshot == 3  # дочитан только хвост после снимка
+    assert (loaded.status(3), loaded.status(4)) == ("done", "in_progress")
+    assert list(loaded.rows()) == list(store.rows())
+    assert loaded.dead_rows == store.dead_rows
+    assert loaded.search("ноутбук") == [4, 3]
+    assert loaded.stats().to_dict() == store.stats().to_dict()
+
+def test_snapshot_of_replaced_file_ignored(path):
+    store = CsvStore(path)
+    for n in (1, 2, 3):
+        store.add(fields(n), created(n))
+    store.snapshot()
+    # Файл подменён с тем же содержимым — снимок описывает прежний файл
+    shutil.copy(path, path + ".copy")
+    os.replace(path + ".copy", path)
+    loaded = CsvStore(path)
+    assert loaded._since_snapshot == 3
+    assert list(loaded.rows()) == list(store.rows())
+
+def test_compaction_writes_snapshot(path):
+    store = CsvStore(path)
+    for n in (1, 2, 3):
+        store.add(fields(n), created(n))
+    # Сжатие сразу пишет снимок нового файла — по нему перечитают другие
+    store.delete(1)
+    store.compact()
+    loaded = CsvStore(path)
+    assert loaded._since_snapshot == 0
+    assert [row[0] for row in loaded.rows()] == [2, 3]
+
+# ------------------- Изменения другого процесса -------------------
+@pytest.fixture(params=["csv", "sqlite"])
+def pair(request, tmp_path):
+    # Два хранилища на одном файле — как бот и web.py
+    cls, name = (CsvStore, "repair_requests.csv") if request.param == "csv" else (SqliteStore, "db.sqlite3")
+    first, second = cls(str(tmp_path / name)), cls(str(tmp_path / name))
+    yield first, second
+    first.close()
+    second.close()
+
+def test_refresh_sees_other_writer(pair):
+    writer, reader = pair
+    writer.add(fields(1), created(1))
+    writer.add(fields(2), created(2))
+    version = reader.version
+    reader.refresh()
+    assert list(reader.rows()) == list(writer.rows())
+    assert reader.version > version
+    version = reader.version
+    reader.refresh()
+    assert reader.version == version
+    writer.delete(1)
+    reader.refresh()
+    assert list(reader.rows()) == list(writer.rows())
+    assert reader.find_by_phone(fields(2)[1]) == [2]
+
+def test_refresh_waits_for_complete_line(path):
+    writer, reader = CsvStore(path), CsvStore(path)
+    writer.add(fields(1), created(1))
+    line = f"2,{','.join(fields(2))},{created(2)}\r\n".encode("utf-8")
+    with open(path, "ab") as f:
+        f.write(line[:10])
+    reader.refresh()
+    assert [row[0] for row in reader.rows()] == [1]
+    with open(path, "ab") as f:
+        f.write(line[10:])
+    reader.refresh()
+    assert [row[0] for row in reader.rows()] == [1, 2]
+
+def test_refresh_after_compaction(path):
+    writer, reader = CsvStore(path), CsvStore(path)
+    for n in (1, 2, 3):
+        writer.add(fields(n), created(n))
+    reader.refresh()
+    writer.delete(2)
+    writer.compact()
+    writer.add(fields(4), created(4))
+    reader.refresh()
+    assert list(reader.rows()) == list(writer.rows())
+    assert reader.dead_rows == 0
+
+def test_shared_id_sequence(pair):
+    first, second = pair
+    # id выдаёт общий счётчик: процессы не выдают один номер дважды
+    assert [first.add(fields(1), created(1)), second.add(fields(2), created(2)),
+            first.add(fields(3), created(3))] == [1, 2, 3]
+    first.delete(3)
+    assert second.add(fields(4), created(4)) == 4
+    first.refresh()
+    second.refresh()
+    assert list(first.rows()) == list(second.rows())
+    assert [row[0] for row in first.rows()] == [1, 2, 4]
+
+def test_other_writer_rows_parsed_once(path):
+    first, second = CsvStore(path), CsvStore(path)
+    first.add(fields(1), created(1))
+    second.add(fields(2), created(2))
+    # Строка второго процесса лежит перед своей и разбирается один раз
+    first.add(fields(3), created(3))
+    assert [row[0] for row in first.rows()] == [1, 2, 3]
+    assert first.dead_rows == 0
+    assert CsvStore(path).search("ноутбук") == [3, 2, 1]
+
+def test_refresh_async_reloads_compacted_file(path):
+    writer, reader = CsvStore(path), CsvStore(path)
+    for n in (1, 2, 3):
+        writer.add(fields(n), created(n))
+    writer.delete(2)
+    writer.compact()
+    writer.add(fields(4), created(4))
+
+    async def go():
+        # Ждущие запросы делят одно перечитывание
+        await asyncio.gather(reader.refresh_async(), reader.refresh_async())
+
+    asyncio.run(go())
+    assert list(reader.rows()) == list(writer.rows())
+    assert reader.search("ноутбук") == [4, 3, 1]
+
+def test_sqlite_other_delete_updates_index(tmp_path, monkeypatch):
+    path = str(tmp_path / "db.sqlite3")
+    writer, reader = SqliteStore(path), SqliteStore(path)
+
+    def other_process(*actions):
+        # Свои записи журнала изменений пропускаются — пишем «из другого процесса»
+        with monkeypatch.context() as m:
+            m.setattr(storage, "_BOOT_ID", "other")
+            for action in actions:
+                action()
+        reader.refresh()
+
+    other_process(lambda: writer.add(fields(1), created(1)), lambda: writer.add(fields(2), created(2)))
+    assert reader.search("ноутбук") == [2, 1]
+    other_process(lambda: writer.delete(1), lambda: writer.add(fields(3), created(3)))
+    assert reader.search("ноутбук") == [3, 2]
+    assert len(reader) == 2
+    writer.close()
+    reader.close()
+
+def test_search(store):
+    store.add(["Иван", "+79123456789", "ноутбук Lenovo", "не включается", "утром"], created(1))
+    store.add(["Пётр", "+79001112233", "ноутбук HP", "разбит экран", "вечером"], created(2))
+    assert store.search("ноутбук") == [2, 1]
+    store.delete(2)
+    assert store.search("ноутбук") == [1]
+    store.add(["Анна", "+79005556789", "ноутбук Asus", "не включается", "днём"], created(3))
+    assert store.search("включается") == [3, 1]
+    assert store.search("6789") == [3, 1]
+    assert store.rows_for([3, 2, 1]) == [list(store.rows())[1], list(store.rows())[0]]
@@ -0,0 +1,118 @@
+# test_throttle.py
+# Ограничение частоты по пользователю и обработчику, детектор повторных заявок.
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+import pytest
+from aiogram.types import Chat, Message, User
+
+import notify
+import throttle
+from throttle import DuplicateDetector, ThrottleMiddleware, parse_limits
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    fake_time = SimpleNamespace(monotonic=clock)
+    monkeypatch.setattr(notify, "time", fake_time)
+    monkeypatch.setattr(throttle, "time", fake_time)
+    return clock
+
+sent: list[str] = []
+
+class FakeMessage(Message):
+    async def answer(self, text: str, **kwargs):
+        sent.append(text)
+
+def message(user_id: int) -> FakeMessage:
+    user = User(id=user_id, is_bot=False, first_name="Тест")
+    return FakeMessage(message_id=1, date=datetime.datetime.now(), chat=Chat(id=user_id, type="private"),
+                       from_user=user, text="/start")
+
+def test_parse_limits():
+    assert parse_limits("start_request=0.2/3, *=2/10,confirm_yes=1") == {
+        "start_request": (0.2, 3), "*": (2.0, 10), "confirm_yes": (1.0, 1),
+    }
+
+def test_token_bucket_try_acquire(clock):
+    bucket = notify.TokenBucket(rate=2, burst=2)
+    assert [bucket.try_acquire() for _ in range(3)] == [True, True, False]
+    clock.now += 0.5  # пополнился один токен
+    assert [bucket.try_acquire() for _ in range(2)] == [True, False]
+
+def run(middleware: ThrottleMiddleware, user_id: int, handler_name: str, times: int) -> list:
+    handled = []
+
+    async def start_request(event, data):
+        handled.append(event.from_user.id)
+        return "ok"
+    start_request.__name__ = handler_name
+
+    async def go():
+        results = []
+        for _ in range(times):
+            event = message(user_id)
+            data = {"event_from_user": event.from_user, "handler": SimpleNamespace(callback=start_request)}
+            results.append(await middleware(start_request, event, data))
+        return results
+    return asyncio.run(go())
+
+def test_throttle_warns_once_per_burst(clock):
+    sent.clear()
+    middleware = ThrottleMiddleware({"start_request": (1, 2)}, exempt={1})
+    assert run(middleware, 5, "start_request", 4) == ["ok", "ok", None, None]
+    assert len(sent) == 1
+    # Ведро пополнилось — серия закончилась, следующая снова предупреждается
+    clock.now += 1
+    assert run(middleware, 5, "start_request", 2) == ["ok", None]
+    assert len(sent) == 2
+    # Ведра — по пользователю и обработчику; админ не ограничивается,
+    # обработчик без лимита и без «*» — тоже
+    assert run(middleware, 6, "start_request", 2) == ["ok", "ok"]
+    assert run(middleware, 1, "start_request", 5) == ["ok"] * 5
+    assert run(middleware, 5, "show_requests", 3) == ["ok"] * 3
+
+def test_throttle_keys_bounded(clock):
+    middleware = ThrottleMiddleware({"*": (1, 1)}, max_keys=2)
+    for user_id in (1, 2, 3):
+        run(middleware, user_id, "start_request", 1)
+    assert list(middleware.buckets) == [(2, "start_request"), (3, "start_request")]
+
+def test_duplicate_key_normalised():
+    assert DuplicateDetector.key("8 (912) 000-00-01", " Ноутбук  Lenovo", "Не включается") == \
+        DuplicateDetector.key("+79120000001", "ноутбук lenovo", "не  включается")
+
+def test_duplicate_detector(clock):
+    detector = DuplicateDetector(window=60)
+    key = DuplicateDetector.key("+79120000001", "ноутбук", "не включается")
+    other = DuplicateDetector.key("+79120000002", "ноутбук", "не включается")
+    assert detector.check(key) is None
+    detector.remember(key, 7)
+    clock.now += 30
+    detector.remember(other, 8)
+    assert detector.check(key) == 7
+    # Окно истекло для первой заявки, но не для второй
+    clock.now += 31
+    assert detector.check(key) is None
+    assert detector.check(other) == 8
+    # Удалённая заявка не блокирует повторную подачу
+    detector.forget(8)
+    assert detector.check(other) is None
+    assert detector.keys_by_id == {}
+
+def test_duplicate_detector_bounded(clock):
+    detector = DuplicateDetector(window=60, max_keys=2)
+    keys = [DuplicateDetector.key(f"+7912000000{n}", "ноутбук", "экран") for n in range(3)]
+    for rid, key in enumerate(keys, 1):
+        detector.remember(key, rid)
+    assert detector.check(keys[0]) is None
+    assert detector.check(keys[2]) == 3
+    assert sorted(detector.keys_by_id) == [2, 3]
@@ -0,0 +1,27 @@
+# test_web.py
+# Веб-просмотр (web.py): таблица заявок и ответ 304 без изменений.
+import pytest
+from fastapi.testclient import TestClient
+
+import web
+from storage import CsvStore
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    store = CsvStore(str(tmp_path / "repair_requests.csv"))
+    store.add(["Иван", "+79120000001", "ноутбук", "не включается", "вечером"], "2024-01-01 10:00:00")
+    monkeypatch.setattr(web, "store", store)
+    return TestClient(web.app)
+
+def test_requests_table(client):
+    resp = client.get("/requests")
+    assert resp.status_code == 200
+    assert "<td>Иван</td>" in resp.text
+
+def test_requests_not_modified(client):
+    etag = client.get("/requests").headers["ETag"]
+    assert client.get("/requests", headers={"If-None-Match": etag}).status_code == 304
+    web.store.add(["Пётр", "+79120000002", "телефон", "разбит экран", "днём"], "2024-01-02 10:00:00")
+    resp = client.get("/requests", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert "<td>Пётр</td>" in resp.text
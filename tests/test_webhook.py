@@ -0,0 +1,112 @@
+# test_webhook.py
+# Очередь webhook: отсев повторных update_id, порядок внутри чата, выбор режима.
+import asyncio
+import datetime
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+import webhook
+from webhook import QueuedRequestHandler, RecentIds, chat_key, make_handler
+
+def update(update_id: int, chat_id: int, text: str = "x") -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": int(datetime.datetime.now().timestamp()), "text": text,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Тест"},
+        },
+    }
+
+def serve(handler_factory, go):
+    # Обработчик записывает (чат, update_id); задержка по тексту сообщения
+    # позволяет апдейтам разных чатов обгонять друг друга
+    handled = []
+    router = Router()
+
+    @router.message()
+    async def record(message: Message):
+        await asyncio.sleep(float(message.text))
+        handled.append((message.chat.id, message.message_id))
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot(token="123456:TEST")
+
+    async def main():
+        application = web.Application()
+        handler = handler_factory(dp, bot)
+        handler.register(application, path="/webhook")
+        async with TestClient(TestServer(application)) as client:
+            result = await go(client, handler)
+            if isinstance(handler, QueuedRequestHandler):
+                await handler.close(timeout=5)
+        await bot.session.close()
+        return handled, result
+    return asyncio.run(main())
+
+async def post(client, body: dict) -> int:
+    resp = await client.post("/webhook", json=body)
+    return resp.status
+
+def test_redelivered_update_dropped():
+    async def go(client, handler):
+        return [await post(client, update(1, 10, "0")), await post(client, update(1, 10, "0")),
+                await post(client, update(2, 10, "0"))]
+    handled, statuses = serve(QueuedRequestHandler, go)
+    assert statuses == [200, 200, 200]
+    assert handled == [(10, 1), (10, 2)]
+
+def test_order_kept_within_chat():
+    async def go(client, handler):
+        # Первые апдейты чата обрабатываются дольше последующих
+        for n, delay in enumerate(["0.05", "0.02", "0"], 1):
+            await post(client, update(n, 10, delay))
+        await post(client, update(4, 20, "0"))
+        await handler.join()
+    handled, _ = serve(lambda dp, bot: QueuedRequestHandler(dp, bot, workers=4), go)
+    assert [uid for chat, uid in handled if chat == 10] == [1, 2, 3]
+    # Другой чат не ждёт очереди первого
+    assert handled.index((20, 4)) < handled.index((10, 1))
+
+def test_full_queue_rejected(monkeypatch):
+    monkeypatch.setattr(webhook, "WEBHOOK_ENQUEUE_TIMEOUT", 0.05)
+
+    async def go(client, handler):
+        statuses = [await post(client, update(n, 10, "0.3")) for n in (1, 2, 3)]
+        # Отклонённый апдейт не запоминается: повторная доставка принимается
+        await handler.join()
+        statuses.append(await post(client, update(3, 10, "0")))
+        return statuses
+    handled, statuses = serve(lambda dp, bot: QueuedRequestHandler(dp, bot, workers=1, queue_size=1), go)
+    assert statuses == [200, 200, 503, 200]
+    assert handled == [(10, 1), (10, 2), (10, 3)]
+
+def test_chat_key():
+    assert chat_key(update(1, 10)) == 10
+    callback = {"update_id": 2, "callback_query": {"id": "1", "from": {"id": 7}, "message": {"chat": {"id": 10}}}}
+    assert chat_key(callback) == 10
+    assert chat_key({"update_id": 3, "inline_query": {"id": "1", "from": {"id": 7}}}) == 7
+    assert chat_key({"update_id": 4}) == 0
+
+def test_recent_ids_bounded():
+    recent = RecentIds(size=2)
+    for update_id in (1, 2, 3):
+        recent.add(update_id)
+    assert 1 not in recent and 2 in recent and 3 in recent
+    assert recent.ids == {2, 3}
+
+def test_make_handler_modes():
+    dp, bot = Dispatcher(), Bot(token="123456:TEST")
+    assert isinstance(make_handler(dp, bot, "queue"), QueuedRequestHandler)
+    # Очередь не работает между процессами — при нескольких включается inline
+    for handler in (make_handler(dp, bot, "queue", processes=2), make_handler(dp, bot, "inline")):
+        assert type(handler) is SimpleRequestHandler
+        assert not handler.handle_in_background
+    with pytest.raises(ValueError):
+        make_handler(dp, bot, "thread")
@@ -0,0 +1,110 @@
+# test_writer.py
+# Групповая запись: пачки, повтор с нарастающей паузой, откат недописанного.
+import asyncio
+import csv
+import os
+
+import pytest
+
+import writer
+from storage import CsvStore
+from writer import GroupCommitWriter
+
+def fields(n: int) -> list[str]:
+    return [f"Имя {n}", f"+7912000{n:04d}", "ноутбук Lenovo", "не включается", "вечером"]
+
+class FlakyStore(CsvStore):
+    # Первые failures вызовов write_records падают
+    def __init__(self, path: str, failures: int = 0):
+        super().__init__(path)
+        self.failures = failures
+        self.batches: list[int] = []
+
+    def write_records(self, records, fsync=False):
+        self.batches.append(len(records))
+        if self.failures:
+            self.failures -= 1
+            raise OSError("диск недоступен")
+        super().write_records(records, fsync)
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "repair_requests.csv")
+
+def journal(path: str) -> list[list[str]]:
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.reader(f))[1:]
+
+def test_group_commit(path):
+    store = FlakyStore(path)
+
+    async def go():
+        w = GroupCommitWriter(store, window_ms=20)
+        for n in range(1, 11):
+            _, record = store.stage_add(fields(n), "2024-01-01 10:00:00")
+            await w.submit(record)
+        await w.close()
+
+    asyncio.run(go())
+    assert store.batches == [10]
+    assert [row[0] for row in journal(path)] == [str(n) for n in range(1, 11)]
+
+def test_failed_batch_is_retried(path, monkeypatch):
+    store = FlakyStore(path, failures=3)
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay):
+        delays.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(writer, "WRITE_RETRY_MAX_DELAY", 0.3)
+
+    async def go():
+        monkeypatch.setattr(writer.asyncio, "sleep", sleep)
+        w = GroupCommitWriter(store, window_ms=0, durable=True)
+        _, record = store.stage_add(fields(1), "2024-01-01 10:00:00")
+        # Обработчик освобождается только после успешной записи
+        await asyncio.wait_for(w.submit(record), 5)
+        await w.close()
+
+    asyncio.run(go())
+    assert store.batches == [1, 1, 1, 1]
+    assert delays == [0.1, 0.2, 0.3]
+    assert journal(path) == [["1", *fields(1), "2024-01-01 10:00:00", "new"]]
+    assert not store._unwritten
+
+def test_partial_write_is_rolled_back(path, monkeypatch):
+    store = CsvStore(path)
+    _, record = store.stage_add(fields(1), "2024-01-01 10:00:00")
+    real_fsync = os.fsync
+    calls = []
+
+    def fsync(fd):
+        calls.append(fd)
+        if len(calls) == 1:
+            raise OSError("нет места")
+        real_fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", fsync)
+    with pytest.raises(OSError):
+        store.write_records([record], fsync=True)
+    assert journal(path) == []
+    store.write_records([record], fsync=True)
+    assert journal(path) == [["1", *fields(1), "2024-01-01 10:00:00", "new"]]
+
+def test_submit_many_is_one_batch(path):
+    store = FlakyStore(path)
+    for n in range(1, 6):
+        store.add(fields(n), "2024-01-01 10:00:00")
+    store.batches.clear()
+
+    async def go():
+        w = GroupCommitWriter(store, window_ms=0)
+        await w.submit_many(list(store.stage_deletes([2, 3, 4, 9]).values()))
+        await w.close()
+
+    asyncio.run(go())
+    assert store.batches == [3]
+    assert [row[0] for row in journal(path)][-3:] == ["-2", "-3", "-4"]
+    assert [row[0] for row in CsvStore(path).rows()] == [1, 5]
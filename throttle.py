@@ -0,0 +1,117 @@
+# throttle.py
+# Защита от флуда: ограничение частоты по пользователю и обработчику
+# («ведро токенов» из notify.py, ведра в ограниченном LRU) и детектор
+# повторной отправки одной и той же заявки в пределах окна.
+from collections import OrderedDict
+from typing import Any
+from aiogram.types import CallbackQuery, Message
+from decouple import config
+from index import normalize_phone
+from metrics import DUPLICATES, THROTTLED
+from notify import TokenBucket
+import time
+
+# «обработчик=частота/запас» через запятую; «*» — для всех остальных
+THROTTLE_LIMITS = config("THROTTLE_LIMITS", default="start_request=0.2/3,confirm_yes=0.1/2,*=2/10")
+THROTTLE_MAX_KEYS = config("THROTTLE_MAX_KEYS", default=10000, cast=int)
+DUPLICATE_WINDOW_MINUTES = config("DUPLICATE_WINDOW_MINUTES", default=60, cast=float)
+DUPLICATE_MAX_KEYS = config("DUPLICATE_MAX_KEYS", default=10000, cast=int)
+
+def parse_limits(spec: str) -> dict[str, tuple[float, int]]:
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition("=")
+        rate, _, burst = value.partition("/")
+        limits[name.strip()] = (float(rate), int(burst or 1))
+    return limits
+
+class ThrottleMiddleware:
+    # Внутренний middleware: в data уже есть найденный обработчик
+    def __init__(self, limits: dict[str, tuple[float, int]] | None = None,
+                 max_keys: int = THROTTLE_MAX_KEYS, exempt: set[int] | None = None):
+        self.limits = parse_limits(THROTTLE_LIMITS) if limits is None else limits
+        self.max_keys = max_keys
+        self.exempt = exempt or set()
+        # (user_id, обработчик) -> [ведро, предупреждён ли]
+        self.buckets: OrderedDict[tuple[int, str], list] = OrderedDict()
+
+    def _bucket(self, user_id: int, handler: str) -> list | None:
+        limit = self.limits.get(handler, self.limits.get("*"))
+        if limit is None:
+            return None
+        key = (user_id, handler)
+        entry = self.buckets.get(key)
+        if entry is None:
+            entry = self.buckets[key] = [TokenBucket(*limit), False]
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        return entry
+
+    async def __call__(self, handler, event, data: dict[str, Any]):
+        user = data.get("event_from_user")
+        if user is None or user.id in self.exempt:
+            return await handler(event, data)
+        name = data["handler"].callback.__name__
+        entry = self._bucket(user.id, name)
+        if entry is None or entry[0].try_acquire():
+            if entry is not None:
+                entry[1] = False
+            return await handler(event, data)
+        THROTTLED.inc(name)
+        # Отвечаем один раз за серию, чтобы сам ответ не стал флудом
+        if not entry[1]:
+            entry[1] = True
+            if isinstance(event, CallbackQuery):
+                await event.answer("Слишком часто, подождите немного")
+            elif isinstance(event, Message):
+                await event.answer("Слишком много запросов. Подождите немного и повторите.")
+        return None
+
+class DuplicateDetector:
+    # Ключ — нормализованный телефон, устройство и проблема. Записи хранятся
+    # в порядке добавления, поэтому устаревшие снимаются с начала — O(1).
+    def __init__(self, window: float = DUPLICATE_WINDOW_MINUTES * 60, max_keys: int = DUPLICATE_MAX_KEYS):
+        self.window = window
+        self.max_keys = max_keys
+        self.seen: OrderedDict[tuple[str, str, str], tuple[int, float]] = OrderedDict()
+        self.keys_by_id: dict[int, tuple[str, str, str]] = {}
+
+    @staticmethod
+    def key(phone: str, device: str, problem: str) -> tuple[str, str, str]:
+        def text(value: str) -> str:
+            return " ".join(value.lower().replace("ё", "е").split())
+        return normalize_phone(phone), text(device), text(problem)
+
+    def _expire(self) -> None:
+        deadline = time.monotonic() - self.window
+        while self.seen:
+            _, (_, added) = next(iter(self.seen.items()))
+            if added >= deadline and len(self.seen) <= self.max_keys:
+                break
+            key, (rid, _) = self.seen.popitem(last=False)
+            self.keys_by_id.pop(rid, None)
+
+    def check(self, key: tuple[str, str, str]) -> int | None:
+        # id ранее принятой такой же заявки или None
+        self._expire()
+        entry = self.seen.get(key)
+        if entry is None:
+            return None
+        DUPLICATES.inc()
+        return entry[0]
+
+    def remember(self, key: tuple[str, str, str], rid: int) -> None:
+        previous = self.seen.pop(key, None)
+        if previous is not None:
+            self.keys_by_id.pop(previous[0], None)
+        self.seen[key] = (rid, time.monotonic())
+        self.keys_by_id[rid] = key
+        self._expire()
+
+    def forget(self, rid: int) -> None:
+        # Удалённая админом заявка не должна блокировать повторную подачу
+        key = self.keys_by_id.pop(rid, None)
+        if key is not None:
+            self.seen.pop(key, None)
@@ -1,20 +1,48 @@
 # web.py
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse
-import csv
-import os
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, Response
+from storage import CSV_HEADER, open_store
 
 app = FastAPI()
-CSV_FILE = "/data/repair_requests.csv"
+store = open_store()
+
+# ----------------------------------------------------------------------
+# Кэш страницы /requests
+# ----------------------------------------------------------------------
+# store.refresh() дочитывает только новые строки CSV (по размеру и mtime),
+# строки таблицы рендерятся один раз, готовая страница живёт до смены версии.
+_row_cache: dict[int, tuple[tuple, str]] = {}
+_page_cache: tuple[str, bytes] | None = None  # (etag, html)
+
+def _render_row(row: list) -> str:
+    key = tuple(row)
+    cached = _row_cache.get(row[0])
+    if cached is None or cached[0] != key:
+        cached = (key, "<tr>" + "".join(f"<td>{cell}</td>" for cell in row) + "</tr>")
+        _row_cache[row[0]] = cached
+    return cached[1]
+
+def _render_page() -> bytes:
+    seen = set()
+    parts = ["<h2>Заявки на ремонт</h2><table border='1' style='border-collapse: collapse;'><tr>" + "".join(f"<th>{h}</th>" for h in CSV_HEADER) + "</tr>"]
+    for row in store.rows():
+        seen.add(row[0])
+        parts.append(_render_row(row))
+    parts.append("</table>")
+    for rid in _row_cache.keys() - seen:
+        del _row_cache[rid]
+    return "".join(parts).encode('utf-8')
 
 @app.get("/requests", response_class=HTMLResponse)
-async def show_requests():
-    if not os.path.exists(CSV_FILE):
-        return "<h2>Нет заявок</h2>"
-    with open(CSV_FILE, encoding='utf-8') as f:
-        reader = csv.reader(f)
-        rows = list(reader)
-    html = "<h2>Заявки на ремонт</h2><table border='1' style='border-collapse: collapse;'><tr>" + "".join(f"<th>{h}</th>" for h in rows[0]) + "</tr>"
-    for row in rows[1:]:
-        html += "<tr>" + "".join(f"<td>{cell}</td>" for cell in row) + "</tr>"
-    return html + "</table>"
+async def show_requests(request: Request):
+    global _page_cache
+    await store.refresh_async()
+    etag = store.etag()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    if not len(store):
+        return HTMLResponse("<h2>Нет заявок</h2>", headers=headers)
+    if _page_cache is None or _page_cache[0] != etag:
+        _page_cache = (etag, _render_page())
+    return Response(content=_page_cache[1], media_type="text/html; charset=utf-8", headers=headers)
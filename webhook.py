@@ -0,0 +1,140 @@
+# webhook.py
+# Приём webhook с немедленным ответом Telegram и обработкой в ограниченном
+# пуле: апдейт уходит в очередь одного из WEBHOOK_WORKERS обработчиков по
+# id чата (порядок внутри чата сохраняется — FSM не путается), повторно
+# доставленные update_id отбрасываются по кольцевому буферу последних id.
+#
+# WEBHOOK_MODE: queue — так, как описано выше; inline — апдейт обрабатывается
+# до ответа Telegram, и одновременных апдейтов не больше, чем соединений
+# (max_connections у setWebhook). Порядок в чате и отсев повторов работают
+# только внутри процесса. При WORKERS > 1 ядро раздаёт соединения Telegram
+# между процессами, и апдейты одного чата могут идти одновременно в разных
+# процессах против общего FSM, а повтор, попавший в другой процесс,
+# обработается снова. Поэтому при нескольких процессах включается inline.
+from collections import deque
+from typing import Any
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+from decouple import config
+from metrics import WEBHOOK_UPDATES
+import asyncio
+import logging
+
+WEBHOOK_MODE = config("WEBHOOK_MODE", default="queue")  # queue | inline
+WEBHOOK_WORKERS = config("WEBHOOK_WORKERS", default=16, cast=int)
+WEBHOOK_QUEUE_SIZE = config("WEBHOOK_QUEUE_SIZE", default=1000, cast=int)  # на все очереди
+WEBHOOK_ENQUEUE_TIMEOUT = config("WEBHOOK_ENQUEUE_TIMEOUT", default=5.0, cast=float)
+WEBHOOK_DEDUP_SIZE = config("WEBHOOK_DEDUP_SIZE", default=10000, cast=int)
+
+def chat_key(update: dict[str, Any]) -> int:
+    # Чат (или пользователь), к которому относится апдейт любого типа
+    for name, event in update.items():
+        if name == "update_id" or not isinstance(event, dict):
+            continue
+        for holder in (event, event.get("message") or {}):
+            chat = holder.get("chat")
+            if isinstance(chat, dict) and "id" in chat:
+                return chat["id"]
+        user = event.get("from") or event.get("user")
+        if isinstance(user, dict) and "id" in user:
+            return user["id"]
+    return 0
+
+class RecentIds:
+    # Кольцевой буфер последних update_id и множество для проверки за O(1)
+    def __init__(self, size: int = WEBHOOK_DEDUP_SIZE):
+        self.ring: deque[int] = deque(maxlen=size)
+        self.ids: set[int] = set()
+
+    def __contains__(self, update_id: int) -> bool:
+        return update_id in self.ids
+
+    def add(self, update_id: int) -> None:
+        if len(self.ring) == self.ring.maxlen:
+            self.ids.discard(self.ring[0])
+        self.ring.append(update_id)
+        self.ids.add(update_id)
+
+class QueuedRequestHandler(SimpleRequestHandler):
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, workers: int = WEBHOOK_WORKERS,
+                 queue_size: int = WEBHOOK_QUEUE_SIZE, **kwargs: Any):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True, **kwargs)
+        per_worker = max(1, queue_size // workers)
+        self.queues: list[asyncio.Queue] = [asyncio.Queue(maxsize=per_worker) for _ in range(workers)]
+        self.recent = RecentIds()
+        self._workers: list[asyncio.Task] = []
+
+    def register(self, app: web.Application, /, path: str, **kwargs: Any) -> None:
+        super().register(app, path, **kwargs)
+        # Дообработать очередь раньше, чем приложение закроет запись и сессию
+        app.on_shutdown.insert(0, self._drain_on_shutdown)
+
+    @property
+    def pending(self) -> int:
+        return sum(q.qsize() for q in self.queues)
+
+    def _start(self) -> None:
+        if not self._workers:
+            loop = asyncio.get_running_loop()
+            self._workers = [loop.create_task(self._work(q)) for q in self.queues]
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        update = await request.json(loads=bot.session.json_loads)
+        update_id = update.get("update_id")
+        if update_id in self.recent:
+            logging.info(f"Повторная доставка апдейта {update_id} отброшена")
+            WEBHOOK_UPDATES.inc("duplicate")
+            return web.json_response({}, dumps=bot.session.json_dumps)
+        self._start()
+        queue = self.queues[hash(chat_key(update)) % len(self.queues)]
+        try:
+            # Полная очередь задерживает ответ — Telegram сам снижает темп;
+            # если места так и нет, 503: апдейт будет доставлен повторно
+            await asyncio.wait_for(queue.put((bot, update)), WEBHOOK_ENQUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logging.warning(f"Очередь webhook переполнена, апдейт {update_id} не принят")
+            WEBHOOK_UPDATES.inc("rejected")
+            return web.Response(status=503)
+        WEBHOOK_UPDATES.inc("queued")
+        if update_id is not None:
+            self.recent.add(update_id)
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def _work(self, queue: asyncio.Queue) -> None:
+        while True:
+            bot, update = await queue.get()
+            try:
+                await self._background_feed_update(bot=bot, update=update)
+            except Exception as e:
+                logging.error(f"Ошибка обработки апдейта {update.get('update_id')}: {e}")
+            finally:
+                queue.task_done()
+
+    async def join(self) -> None:
+        for queue in self.queues:
+            await queue.join()
+
+    async def close(self, timeout: float = 10.0) -> None:
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Не обработано апдейтов: {self.pending}")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _drain_on_shutdown(self, app: web.Application) -> None:
+        await self.close()
+
+def make_handler(dispatcher: Dispatcher, bot: Bot, mode: str = WEBHOOK_MODE,
+                 processes: int = 1) -> SimpleRequestHandler:
+    if mode == "queue" and processes > 1:
+        logging.warning("Очередь webhook работает в пределах процесса — при нескольких процессах inline")
+        mode = "inline"
+    if mode == "queue":
+        return QueuedRequestHandler(dispatcher=dispatcher, bot=bot)
+    if mode == "inline":
+        return SimpleRequestHandler(dispatcher=dispatcher, bot=bot, handle_in_background=False)
+    raise ValueError(f"Неизвестный режим webhook: {mode}")
@@ -0,0 +1,90 @@
+# writer.py
+# Фоновая запись в хранилище с групповой фиксацией: обработчики кладут
+# строки журнала в ограниченную очередь, отдельная задача собирает всё,
+# что накопилось за окно фиксации, и пишет одной пачкой в пуле потоков.
+from decouple import config
+from storage import RequestStore
+import asyncio
+import logging
+
+WRITE_QUEUE_SIZE = config("WRITE_QUEUE_SIZE", default=1000, cast=int)
+WRITE_WINDOW_MS = config("WRITE_WINDOW_MS", default=5, cast=int)
+WRITE_BATCH_MAX = config("WRITE_BATCH_MAX", default=500, cast=int)
+WRITE_RETRY_MAX_DELAY = config("WRITE_RETRY_MAX_DELAY", default=30.0, cast=float)
+WRITE_FSYNC = config("WRITE_FSYNC", default=False, cast=bool)
+# Ждать ли обработчику фактической записи на диск
+WRITE_DURABLE = config("WRITE_DURABLE", default=False, cast=bool)
+
+class GroupCommitWriter:
+    def __init__(self, store: RequestStore, queue_size: int = WRITE_QUEUE_SIZE,
+                 window_ms: int = WRITE_WINDOW_MS, fsync: bool = WRITE_FSYNC,
+                 durable: bool = WRITE_DURABLE):
+        self.store = store
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.window = window_ms / 1000
+        self.fsync = fsync
+        self.durable = durable
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, record: list) -> None:
+        await self.submit_many([record])
+
+    async def submit_many(self, records: list[list]) -> None:
+        # Записи одной операции (массовое удаление) попадают в одну пачку.
+        # При заполненной очереди обработчик ждёт здесь — это и есть backpressure
+        self.start()
+        fut = asyncio.get_running_loop().create_future() if self.durable else None
+        await self.queue.put((records, fut))
+        if fut is not None:
+            await fut
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self.queue.get()]
+            if self.window:
+                await asyncio.sleep(self.window)
+            while len(batch) < WRITE_BATCH_MAX and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            records = [record for group, _ in batch for record in group]
+            # Заявки уже видны в памяти, а клиенту сказано «отправлена»:
+            # пачка не отбрасывается, а повторяется, пока не ляжет на диск
+            delay = 0.1
+            while True:
+                try:
+                    await asyncio.to_thread(self.store.write_records, records, self.fsync)
+                    break
+                except Exception as e:
+                    logging.error(f"Ошибка записи заявок ({len(records)} шт.), повтор через {delay:.1f} с: {e}")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, WRITE_RETRY_MAX_DELAY)
+            try:
+                self.store.committed(records)
+            except Exception as e:
+                logging.error(f"Ошибка после записи заявок: {e}")
+            for _, fut in batch:
+                if fut is not None and not fut.done():
+                    fut.set_result(None)
+            for _ in batch:
+                self.queue.task_done()
+
+    async def flush(self) -> None:
+        if self._task is not None:
+            await self.queue.join()
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+async def run_read(func, *args):
+    # Блокирующие чтения хранилища — в пул потоков, чтобы не держать цикл
+    return await asyncio.to_thread(func, *args)